@@ -9,28 +9,53 @@ GitHub: https://github.com/ftoop17
 import os
 import sys
 import json
+import mmap
 import base64
 import time
 import random
 import string
 import hashlib
+import hmac
 import secrets
+import sqlite3
+from collections import OrderedDict
+from itertools import accumulate
 from datetime import datetime
 from pathlib import Path
 import threading
 import webbrowser
 import subprocess
 import zipfile
+import zlib
+import bz2
+import lzma
+import math
+import fnmatch
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED,
+    TimeoutError as FutureTimeoutError
+)
 
 # Криптография
 try:
-    from Crypto.Cipher import AES
+    from Crypto.Cipher import AES, ChaCha20, ChaCha20_Poly1305
+    from Crypto.Hash.Poly1305 import Poly1305_MAC
     from Crypto.Util.Padding import pad, unpad
     from Crypto.Random import get_random_bytes
     CRYPTO_AVAILABLE = True
 except ImportError:
     CRYPTO_AVAILABLE = False
 
+# Межпроцессная блокировка файлов (POSIX / Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
 # Графический интерфейс (опционально)
 GUI_AVAILABLE = False
 try:
@@ -41,390 +66,5162 @@ except ImportError:
     pass
 
 # ============================================================================
-# ЯДРО ШИФРОВАНИЯ MEGA-PRO
+# СЖАТИЕ
 # ============================================================================
 
-class SuperVaultX:
+# Кодеки сжатия тела контейнера (поле 'codec' заголовка)
+COMPRESSION_CODECS = ('none', 'zlib', 'bz2', 'lzma')
+
+# Профили: класс данных -> (кодек, уровень)
+# text - избыточные данные (текст, логи, дампы), mixed - слабо сжимаемые
+COMPRESSION_PROFILES = {
+    'fast': {'text': ('zlib', 1), 'mixed': ('zlib', 1)},
+    'balanced': {'text': ('zlib', 6), 'mixed': ('zlib', 1)},
+    'compact': {'text': ('bz2', 9), 'mixed': ('zlib', 9)},
+    'max': {'text': ('lzma', 9), 'mixed': ('lzma', 6)},
+}
+
+# Сигнатуры уже сжатых или зашифрованных форматов: (смещение, байты)
+INCOMPRESSIBLE_SIGNATURES = (
+    (0, b'\xff\xd8\xff'),                 # JPEG
+    (0, b'\x89PNG\r\n\x1a\n'),            # PNG
+    (0, b'GIF8'),                         # GIF
+    (0, b'RIFF'),                         # WEBP / AVI / WAV
+    (4, b'ftyp'),                         # MP4 / MOV / HEIC
+    (0, b'\x1a\x45\xdf\xa3'),             # MKV / WEBM
+    (0, b'ID3'),                          # MP3
+    (0, b'OggS'),                         # OGG
+    (0, b'fLaC'),                         # FLAC
+    (0, b'PK\x03\x04'),                   # ZIP / DOCX / XLSX / JAR / APK
+    (0, b'\x1f\x8b'),                     # GZIP
+    (0, b'BZh'),                          # BZIP2
+    (0, b'\xfd7zXZ\x00'),                 # XZ
+    (0, b'7z\xbc\xaf\x27\x1c'),           # 7-Zip
+    (0, b'Rar!\x1a\x07'),                 # RAR
+    (0, b'\x28\xb5\x2f\xfd'),             # Zstandard
+    (0, b'{"magic": "53555045525f5641'),  # Контейнер .svx (JSON заголовок)
+)
+
+# Порог энтропии (бит на байт): выше - сжимать бессмысленно
+ENTROPY_INCOMPRESSIBLE = 7.5
+# Ниже - данные хорошо сжимаются (текст, логи, дампы)
+ENTROPY_TEXT = 6.0
+
+SAMPLE_COUNT = 8
+SAMPLE_SIZE = 64 * 1024
+
+
+def sample_file(path, count=SAMPLE_COUNT, size=SAMPLE_SIZE):
     """
-    Супер-шифровальщик файлов с паролями из 10000 строк
-    Использует AES-256 + PBKDF2 + HMAC
+    Равномерная выборка кусков файла
+
+    Returns:
+        Кортеж (первые байты файла, объединенная выборка)
     """
-    
-    VERSION = "5.0.0"
-    AUTHOR = "thetemirbolatov"
-    YEAR = 2025
-    
-    def __init__(self, mega_password_lines=10000):
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if file_size <= count * size:
+            data = f.read()
+            return data[:64], data
+
+        samples = []
+        step = (file_size - size) // (count - 1)
+        for i in range(count):
+            f.seek(i * step)
+            samples.append(f.read(size))
+
+    return samples[0][:64], b''.join(samples)
+
+
+def shannon_entropy(data):
+    """Энтропия Шеннона в битах на байт"""
+    if not data:
+        return 0.0
+
+    total = len(data)
+    entropy = 0.0
+    for value in range(256):
+        count = data.count(value)
+        if count:
+            p = count / total
+            entropy -= p * math.log2(p)
+    return entropy
+
+
+def select_codec(path, profile='balanced'):
+    """
+    Выбор кодека по сигнатуре и энтропии выборки файла
+
+    Args:
+        path: Файл для сжатия
+        profile: Профиль из COMPRESSION_PROFILES
+
+    Returns:
+        Кортеж (кодек, уровень, энтропия выборки)
+    """
+    head, sample = sample_file(path)
+
+    for offset, signature in INCOMPRESSIBLE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return 'none', 0, None
+
+    entropy = shannon_entropy(sample)
+    if entropy > ENTROPY_INCOMPRESSIBLE:
+        return 'none', 0, entropy
+
+    data_class = 'text' if entropy < ENTROPY_TEXT else 'mixed'
+    codec, level = COMPRESSION_PROFILES[profile][data_class]
+    return codec, level, entropy
+
+
+def new_compressor(codec, level, executor=None, workers=1):
+    """
+    Инкрементальный компрессор кодека (None для 'none')
+
+    С пулом executor zlib сжимается блоками параллельно (ParallelZlibCompressor),
+    результат - обычный zlib поток.
+    """
+    if codec == 'zlib' and executor is not None:
+        return ParallelZlibCompressor(level, executor, workers)
+    if codec == 'zlib':
+        return zlib.compressobj(level)
+    if codec == 'bz2':
+        return bz2.BZ2Compressor(level)
+    if codec == 'lzma':
+        return lzma.LZMACompressor(preset=level)
+    if codec == 'none':
+        return None
+    raise ValueError(f'Неизвестный кодек: {codec}')
+
+
+def new_decompressor(codec):
+    """Инкрементальный декомпрессор кодека (None для 'none')"""
+    if codec == 'zlib':
+        return zlib.decompressobj()
+    if codec == 'bz2':
+        return bz2.BZ2Decompressor()
+    if codec == 'lzma':
+        return lzma.LZMADecompressor()
+    if codec == 'none':
+        return None
+    raise ValueError(f'Неизвестный кодек: {codec}')
+
+
+def compress_bytes(codec, level, data, executor=None, workers=1):
+    """Сжатие буфера целиком"""
+    compressor = new_compressor(codec, level, executor, workers)
+    if compressor is None:
+        return data
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress_bytes(codec, data):
+    """Распаковка буфера целиком"""
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'bz2':
+        return bz2.decompress(data)
+    if codec == 'lzma':
+        return lzma.decompress(data)
+    if codec == 'none':
+        return data
+    raise ValueError(f'Неизвестный кодек: {codec}')
+
+
+def _decompress_chunks(decompressor, data, chunk_size):
+    """
+    Распаковка порциями не больше chunk_size
+
+    zlib отдает непрочитанный вход через unconsumed_tail, bz2 и lzma
+    держат его внутри и сообщают needs_input.
+    """
+    try:
+        if hasattr(decompressor, 'unconsumed_tail'):
+            while data:
+                yield decompressor.decompress(data, chunk_size)
+                data = decompressor.unconsumed_tail
+            return
+
+        if decompressor.eof:
+            return
+        yield decompressor.decompress(data, chunk_size)
+        while not decompressor.eof and not decompressor.needs_input:
+            yield decompressor.decompress(b'', chunk_size)
+    except (zlib.error, lzma.LZMAError, OSError, EOFError) as e:
+        raise ValueError(f'Поврежден сжатый поток: {e}')
+
+# ----------------------------------------------------------------------------
+# Параллельный zlib (как pigz)
+#
+# Вход режется на блоки, каждый блок сжимается в raw deflate отдельно
+# с последними 32 КБ предыдущего блока в качестве словаря и завершается
+# Z_SYNC_FLUSH (последний - Z_FINISH). Склейка блоков с заголовком zlib
+# и общим Adler-32 - обычный zlib поток, который читает zlib.decompress
+# и любая прежняя версия. Распаковка такого потока остается
+# последовательной: границы блоков в нем не записаны.
+# ----------------------------------------------------------------------------
+
+ZLIB_WINDOW_SIZE = 32 * 1024
+PARALLEL_ZLIB_BLOCK_SIZE = 1024 * 1024
+ADLER_BASE = 65521
+
+
+def _deflate_block(level, data, dictionary, last):
+    """Сжатие блока в raw deflate; возвращает (сжатые данные, Adler-32 блока)"""
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(data)
+    compressed += compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(data)
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """Adler-32 склейки двух буферов по их Adler-32 (как adler32_combine в zlib)"""
+    remainder = length2 % ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (remainder * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xffff) + ADLER_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + ADLER_BASE - remainder
+    sum1 %= ADLER_BASE
+    sum2 %= ADLER_BASE
+    return (sum2 << 16) | sum1
+
+
+class ParallelZlibCompressor:
+    """
+    Сжатие zlib блоками в пуле потоков или процессов
+
+    Интерфейс как у zlib.compressobj: compress() и flush().
+    zlib отпускает GIL, поэтому достаточно пула потоков.
+    """
+
+    def __init__(self, level=9, executor=None, workers=1,
+                 block_size=PARALLEL_ZLIB_BLOCK_SIZE):
         """
-        Инициализация супер-шифровальщика
-        
         Args:
-            mega_password_lines: Количество строк в мега-пароле (по умолчанию 10000)
+            level: Уровень сжатия
+            executor: Пул для параллельного сжатия (None - последовательно)
+            workers: Сколько блоков отдавать в пул за раз
+            block_size: Размер открытых данных в одном блоке
         """
-        self.MAGIC_HEADER = b"SUPER_VAULT_X_V5\x00"
-        self.HEADER_SIZE = 2048  # Большой заголовок для метаданных
-        self.PASSWORD_LINES = mega_password_lines
-        self.ENCRYPTION_ALGO = "AES-256-CBC-PBKDF2-HMAC"
-        self.MIN_USER_WORDS = 1
-        
-        # Словари для генерации пароля
-        self.DICTIONARIES = {
-            "tech_words": [
-                "квантовый", "шифр", "алгоритм", "протокол", "нейронный",
-                "биометрический", "защита", "безопасность", "крипто",
-                "хэш", "блокчейн", "энтропия", "шифрование", "дешифровка",
-                "аутентификация", "авторизация", "инкапсуляция", "полиморфизм"
-            ],
-            "nature_words": [
-                "огонь", "вода", "земля", "воздух", "металл",
-                "дерево", "звезда", "планета", "галактика", "космос",
-                "океан", "вулкан", "тайфун", "торнадо", "землетрясение"
-            ],
-            "power_words": [
-                "сила", "мощь", "энергия", "поток", "заряд",
-                "импульс", "волна", "вибрация", "резонанс", "гравитация",
-                "магнетизм", "электричество", "плазма", "сингулярность"
-            ],
-            "secure_words": [
-                "тайна", "секрет", "пароль", "ключ", "замок",
-                "сейф", "хранилище", "убежище", "крепость", "бункер",
-                "броня", "щит", "доспех", "лабиринт", "головоломка"
-            ],
-            "mythology_words": [
-                "дракон", "феникс", "единорог", "грифон", "кентавр",
-                "пегас", "сатир", "циклоп", "гарпия", "минотавр",
-                "сирена", "василиск", "гидра", "химера", "левиафан"
-            ],
-            "science_words": [
-                "атом", "молекула", "ген", "клетка", "вирус",
-                "бактерия", "фермент", "гормон", "нейрон", "синапс",
-                "кварк", "бозон", "фермион", "лептон", "глюон"
-            ]
-        }
-        
-        # Спецсимволы для усиления пароля
-        self.SPECIAL_CHARS = "!@#$%^&*()_+-=[]{}|;:,.<>?/~`"
-        
-        # Логирование
-        self.log_messages = []
-        self.operation_start_time = None
-        
-    def log(self, message, level="INFO"):
-        """Логирование операций"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] [{level}] {message}"
-        self.log_messages.append(log_entry)
-        print(log_entry)
-        
-    def create_mega_password(self, user_words, user_dates=None, personal_info=None, 
-                            use_dictionaries=True, add_timestamps=True):
+        self.level = level
+        self._executor = executor
+        self.batch = max(1, workers)
+        self.block_size = block_size
+        self._pending = bytearray()
+        self._dictionary = b''
+        self._adler = 1
+        self._started = False
+
+    def compress(self, data):
+        """Добавить данные; возвращает готовую часть сжатого потока"""
+        self._pending += data
+        if len(self._pending) < self.block_size * self.batch:
+            return b''
+
+        usable = len(self._pending) - len(self._pending) % self.block_size
+        blocks = _split(self._pending[:usable], self.block_size)
+        del self._pending[:usable]
+        return self._deflate(blocks, last=False)
+
+    def flush(self):
+        """Сжатие остатка и завершение потока"""
+        blocks = _split(self._pending, self.block_size) or [b'']
+        self._pending = bytearray()
+        compressed = self._deflate(blocks, last=True)
+        return compressed + self._adler.to_bytes(4, 'big')
+
+    def _deflate(self, blocks, last):
+        """Сжатие пачки блоков; последний блок пачки завершает поток, если last"""
+        dictionaries = [self._dictionary] + [block[-ZLIB_WINDOW_SIZE:] for block in blocks[:-1]]
+        lasts = [last and i == len(blocks) - 1 for i in range(len(blocks))]
+        levels = [self.level] * len(blocks)
+
+        if self._executor is not None and len(blocks) > 1:
+            results = self._executor.map(_deflate_block, levels, blocks, dictionaries, lasts)
+        else:
+            results = map(_deflate_block, levels, blocks, dictionaries, lasts)
+
+        output = bytearray()
+        if not self._started:
+            # Заголовок zlib с тем же FLEVEL, что ставит zlib.compressobj
+            output += zlib.compressobj(self.level).flush()[:2]
+            self._started = True
+
+        for block, (compressed, adler) in zip(blocks, results):
+            output += compressed
+            self._adler = _adler32_combine(self._adler, adler, len(block))
+
+        self._dictionary = bytes(blocks[-1][-ZLIB_WINDOW_SIZE:])
+        return bytes(output)
+
+
+# ============================================================================
+# ПОТОКОВАЯ ОБРАБОТКА
+# ============================================================================
+
+# Пиковый RSS - величина на весь процесс: сброс через clear_refs и
+# VmHWM общие для всех потоков, поэтому замер приписывается операции,
+# только если за время ее работы других операций не было
+_PEAK_RSS_LOCK = threading.Lock()
+_PEAK_RSS_STATE = {'active': 0, 'started': 0}
+_PEAK_RSS_LOCAL = threading.local()
+
+
+def _reset_peak_rss():
+    """Сброс пикового RSS процесса (Linux >= 4.0), чтобы мерить одну операцию"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except Exception:
+        return False
+
+
+def _begin_peak_rss():
+    """
+    Начало замера пикового RSS операции в текущем потоке
+
+    Пик сбрасывается, только если других операций сейчас нет:
+    иначе сброс испортил бы замер уже идущей операции.
+    """
+    _end_peak_rss()  # Незавершенный замер этого потока
+    with _PEAK_RSS_LOCK:
+        exclusive = _PEAK_RSS_STATE['active'] == 0
+        _PEAK_RSS_STATE['active'] += 1
+        _PEAK_RSS_STATE['started'] += 1
+        serial = _PEAK_RSS_STATE['started']
+        reset = exclusive and _reset_peak_rss()
+    _PEAK_RSS_LOCAL.measure = (serial, reset)
+
+
+def _end_peak_rss():
+    """
+    Завершение замера пикового RSS операции текущего потока
+
+    Повторный вызов ничего не делает.
+
+    Returns:
+        Пиковый RSS в байтах или None, если пик нельзя приписать
+        операции: параллельно шли другие операции или платформа не
+        умеет сбрасывать пик (тогда VmHWM/ru_maxrss - пик за всю
+        жизнь процесса)
+    """
+    measure = getattr(_PEAK_RSS_LOCAL, 'measure', None)
+    if measure is None:
+        return None
+    _PEAK_RSS_LOCAL.measure = None
+    serial, reset = measure
+    with _PEAK_RSS_LOCK:
+        _PEAK_RSS_STATE['active'] -= 1
+        alone = _PEAK_RSS_STATE['started'] == serial
+    return _peak_rss_bytes() if reset and alone else None
+
+
+def _peak_rss_bytes():
+    """
+    Пиковый RSS процесса в байтах
+
+    Returns:
+        Количество байт или None, если платформа не позволяет узнать
+    """
+    # Linux
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+
+    # Windows
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return int(counters.PeakWorkingSetSize)
+        except Exception:
+            pass
+        return None
+
+    # macOS / BSD
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return None
+
+
+def _iter_file_chunks(f, offset, chunk_size, use_mmap=False, end=None):
+    """
+    Чтение файла кусками фиксированного размера начиная с offset
+
+    Args:
+        f: Открытый на чтение бинарный файл
+        offset: Смещение начала данных
+        chunk_size: Размер куска
+        use_mmap: Отдавать срезы mmap вместо read() (без копирования в буфер)
+        end: Смещение конца данных (None - конец файла)
+
+    Yields:
+        Куски данных (bytes или memoryview)
+    """
+    if not use_mmap:
+        f.seek(offset)
+        if end is None:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+            return
+        remaining = end - offset
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+        return
+
+    size = os.fstat(f.fileno()).st_size
+    if end is not None:
+        size = min(size, end)
+    if size <= offset:
+        return
+
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        try:
+            for position in range(offset, size, chunk_size):
+                chunk = view[position:min(position + chunk_size, size)]
+                yield chunk
+                chunk.release()
+        finally:
+            view.release()
+
+
+class V5TagAuthenticator:
+    """
+    Инкрементальный тег контейнера V5
+
+    Тег V5 - SHA-256(шифротекст | соль | IV | ключ). Шифротекст подается
+    кусками по мере чтения или записи, поэтому тег получается за тот же
+    проход, что и данные, без склейки полной копии шифротекста.
+    """
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.bytes_hashed = 0
+
+    def update(self, encrypted):
+        """Добавить кусок шифротекста"""
+        self._hash.update(encrypted)
+        self.bytes_hashed += len(encrypted)
+
+    def finalize(self, salt, iv, key):
         """
-        Создание мега-пароля из N строк
+        Завершение тега (объект можно финализировать повторно)
+
+        Returns:
+            Тег (32 байта)
+        """
+        tag = self._hash.copy()
+        tag.update(salt)
+        tag.update(iv)
+        tag.update(key)
+        return tag.digest()
+
+    def verify(self, stored_tag, salt, iv, key):
+        """Сравнение с сохраненным тегом за постоянное время"""
+        return hmac.compare_digest(self.finalize(salt, iv, key), stored_tag)
+
+
+class SVXStreamEncryptor:
+    """
+    Потоковый шифровальщик тела контейнера V5
+
+    Принимает открытые данные кусками через write() и сразу пишет в файл:
+    сжатие (инкрементально) → AES-256-CBC → SHA-256 тег.
+    Тело побайтно совпадает с телом обычного encrypt_file. Контейнер
+    со сжатием zlib (или без сжатия) и листьями дерева хэшей в
+    заголовке читается любой версией decrypt_file; остальные получают
+    магию V5C/V5T, которую прежние версии отвергают.
+    """
+
+    def __init__(self, out, key, iv, salt, codec='zlib', level=9, executor=None, batch=1):
+        """
+        Args:
+            out: Файл (открыт на запись), куда пишется шифротекст
+            key: Ключ AES-256
+            iv: Вектор инициализации CBC
+            salt: Соль PBKDF2 (входит в тег)
+            codec: Кодек сжатия из COMPRESSION_CODECS
+            level: Уровень сжатия
+            executor: Пул для параллельного сжатия zlib
+            batch: Сколько блоков сжатия отдавать в пул за раз
+        """
+        self.out = out
+        self._cipher = AES.new(key, AES.MODE_CBC, iv)
+        self._compressor = new_compressor(codec, level, executor, batch)
+        self._tag = V5TagAuthenticator()
+        self._salt = salt
+        self._iv = iv
+        self._key = key
+        self._pending = bytearray()
+        self.bytes_in = 0
+        self.bytes_compressed = 0
+        self.bytes_out = 0
+        self.closed = False
+
+    def write(self, data):
+        """Добавить кусок открытых данных"""
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        self.bytes_in += len(data)
+        if self._compressor is not None:
+            self._feed(self._compressor.compress(data))
+        else:
+            self._feed(data)
+        return len(data)
+
+    def _feed(self, data):
+        """Шифрование всех полных блоков AES из буфера"""
+        if not data:
+            return
+
+        self.bytes_compressed += len(data)
+        self._pending += data
+
+        usable = len(self._pending) - len(self._pending) % AES.block_size
+        if usable:
+            self._emit(self._cipher.encrypt(bytes(self._pending[:usable])))
+            del self._pending[:usable]
+
+    def _emit(self, encrypted):
+        self._tag.update(encrypted)
+        self.out.write(encrypted)
+        self.bytes_out += len(encrypted)
+
+    def close(self):
+        """
+        Завершение потока: сброс компрессора и padding последнего блока
+
+        Returns:
+            HMAC тег (32 байта) в формате V5
+        """
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        if self._compressor is not None:
+            self._feed(self._compressor.flush())
+
+        self._emit(self._cipher.encrypt(pad(bytes(self._pending), AES.block_size)))
+        self._pending = bytearray()
+        self.closed = True
+
+        return self._tag.finalize(self._salt, self._iv, self._key)
+
+
+def _cbc_decrypt_segment(key, iv, data):
+    """Дешифрование одного сегмента AES-CBC"""
+    return AES.new(key, AES.MODE_CBC, iv).decrypt(data)
+
+
+def parallel_cbc_decrypt(key, iv, data, executor=None, segment_size=1024 * 1024):
+    """
+    Параллельное дешифрование AES-CBC
+
+    В CBC блок открытого текста зависит только от своего блока шифротекста
+    и предыдущего, поэтому данные режутся по границам блоков на сегменты,
+    IV каждого сегмента - последний блок шифротекста перед ним. Сегменты
+    расшифровываются в пуле потоков (pycryptodome отпускает GIL)
+    и склеиваются в исходном порядке.
+
+    Args:
+        key: Ключ AES
+        iv: IV для первого блока
+        data: Шифротекст (длина кратна 16)
+        executor: Пул потоков (None - последовательно)
+        segment_size: Размер сегмента на одну задачу
+
+    Returns:
+        Открытые данные (с padding, если он был)
+    """
+    segment_size -= segment_size % AES.block_size
+    if executor is None or segment_size <= 0 or len(data) <= segment_size:
+        return _cbc_decrypt_segment(key, iv, data)
+
+    view = memoryview(data)
+    offsets = range(0, len(data), segment_size)
+    ivs = [iv] + [bytes(view[o - AES.block_size:o]) for o in offsets[1:]]
+    segments = [view[o:o + segment_size] for o in offsets]
+    if isinstance(executor, ProcessPoolExecutor):
+        # memoryview не сериализуется для передачи в другой процесс
+        segments = [bytes(segment) for segment in segments]
+
+    return b''.join(executor.map(_cbc_decrypt_segment, [key] * len(segments), ivs, segments))
+
+
+class HashingWriter:
+    """
+    Запись в файл с попутным хэшированием
+
+    Хэш открытых данных считается при записи, без повторного
+    чтения готового файла с диска.
+    """
+
+    def __init__(self, out, hasher):
+        """
+        Args:
+            out: Файл (открыт на запись)
+            hasher: Объект hashlib
+        """
+        self.out = out
+        self.hasher = hasher
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self.out.write(data)
+
+    def flush(self):
+        flush = getattr(self.out, 'flush', None)
+        if flush is not None:
+            flush()
+
+
+class BoundedDecompressor:
+    """
+    Распаковка потока с ограничением объема вывода
+
+    Данные распаковываются порциями не больше chunk_size и сразу пишутся
+    в out. Суммарный объем вывода ограничен max_output, поэтому "zip-бомба"
+    внутри контейнера не раздувает ни память, ни диск.
+    """
+
+    def __init__(self, out, codec='zlib', max_output=None, chunk_size=1024 * 1024):
+        """
+        Args:
+            out: Файл (открыт на запись) для открытых данных
+            codec: Кодек сжатия потока из COMPRESSION_CODECS
+            max_output: Максимальный размер открытых данных (None - без ограничения)
+            chunk_size: Максимальный размер одной порции распаковки
+        """
+        self.out = out
+        self._decompressor = new_decompressor(codec)
+        self.max_output = max_output
+        self.chunk_size = chunk_size
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def write(self, data):
+        """Распаковка и запись очередной порции"""
+        self.bytes_in += len(data)
+
+        if self._decompressor is None:
+            self._emit(data)
+            return len(data)
+
+        for plain in _decompress_chunks(self._decompressor, data, self.chunk_size):
+            self._emit(plain)
+        return len(data)
+
+    def _emit(self, data):
+        if not data:
+            return
+
+        self.bytes_out += len(data)
+        if self.max_output is not None and self.bytes_out > self.max_output:
+            raise ValueError('Распакованные данные больше размера из заголовка')
+        if self.out is not None:
+            self.out.write(data)
+
+    def close(self):
+        """Завершение распаковки"""
+        if self._decompressor is not None:
+            # Остаток буфера есть только у zlib, bz2 и lzma отдают все сразу
+            if hasattr(self._decompressor, 'flush'):
+                self._emit(self._decompressor.flush())
+            if not self._decompressor.eof:
+                raise ValueError('Сжатый поток оборван')
+
+
+class SVXStreamDecryptor:
+    """
+    Потоковый дешифровальщик тела контейнера V5
+
+    Шифротекст подается кусками через write(), открытые данные
+    распаковываются через BoundedDecompressor и сразу пишутся в out.
+    """
+
+    def __init__(self, out, key, iv, codec='zlib', max_output=None,
+                 chunk_size=1024 * 1024, executor=None):
+        """
+        Args:
+            out: Файл (открыт на запись) для открытых данных
+            key: Ключ AES-256
+            iv: Вектор инициализации CBC
+            codec: Кодек сжатия потока из COMPRESSION_CODECS
+            max_output: Максимальный размер открытых данных (None - без ограничения)
+            chunk_size: Максимальный размер одной порции распаковки
+            executor: Пул потоков для параллельного дешифрования CBC
+        """
+        self._key = key
+        self._iv = iv
+        self._executor = executor
+        self._writer = BoundedDecompressor(out, codec, max_output, chunk_size)
+        self._pending = bytearray()
+        self.chunk_size = chunk_size
+        self.bytes_in = 0
+        self.closed = False
+
+    @property
+    def bytes_decrypted(self):
+        return self._writer.bytes_in
+
+    @property
+    def bytes_out(self):
+        return self._writer.bytes_out
+
+    def write(self, data):
+        """Добавить кусок шифротекста"""
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        self.bytes_in += len(data)
+        self._pending += data
+
+        # Последний блок придерживаем до close() - в нем padding
+        usable = len(self._pending) - len(self._pending) % AES.block_size
+        if usable == len(self._pending):
+            usable -= AES.block_size
+        if usable > 0:
+            self._writer.write(self._decrypt(bytes(self._pending[:usable])))
+            del self._pending[:usable]
+        return len(data)
+
+    def _decrypt(self, data):
+        """Дешифрование очередной порции с переносом цепочки CBC"""
+        plain = parallel_cbc_decrypt(self._key, self._iv, data,
+                                     self._executor, self.chunk_size)
+        self._iv = data[-AES.block_size:]
+        return plain
+
+    def close(self):
+        """Снятие padding с последнего блока и завершение распаковки"""
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        if len(self._pending) != AES.block_size:
+            raise ValueError('Длина шифротекста не кратна размеру блока AES')
+
+        self._writer.write(unpad(self._decrypt(bytes(self._pending)), AES.block_size))
+        self._pending = bytearray()
+        self.closed = True
+        self._writer.close()
+
+
+# ----------------------------------------------------------------------------
+# Контейнер V6: независимые AEAD-сегменты
+#
+# Тело V6 - последовательность записей [шифротекст сегмента | тег 16 байт].
+# Nonce сегмента = префикс (7 байт из заголовка) | номер (4 байта) | флаг
+# последнего сегмента (1 байт). Номер не дает переставить сегменты, флаг -
+# незаметно обрезать файл. Каждая запись шифруется и проверяется
+# независимо, поэтому сегменты раскладываются по пулу потоков или процессов.
+#
+# Сегменты шифруются AEAD (AES-256-GCM или ChaCha20-Poly1305): шифрование
+# и тег получаются за один проход по данным, в отличие от CBC + SHA-256.
+# ----------------------------------------------------------------------------
+
+V6_TAG_SIZE = 16
+V6_NONCE_PREFIX_SIZE = 7
+V6_DEFAULT_AEAD = "AES-256-GCM"
+
+
+def _v6_nonce(nonce_prefix, index, final):
+    """Nonce сегмента V6"""
+    return nonce_prefix + index.to_bytes(4, 'big') + (b'\x01' if final else b'\x00')
+
+
+def _v6_cipher(aead, key, nonce):
+    """Объект AEAD для сегмента V6"""
+    if aead == "AES-256-GCM":
+        return AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=V6_TAG_SIZE)
+    if aead == "CHACHA20-POLY1305":
+        return ChaCha20_Poly1305.new(key=key, nonce=nonce)
+    raise ValueError(f'Неизвестный алгоритм AEAD: {aead}')
+
+
+def _v6_seal_segment(aead, key, nonce, aad, data):
+    """Шифрование сегмента V6: шифротекст + тег"""
+    cipher = _v6_cipher(aead, key, nonce)
+    cipher.update(aad)
+    encrypted, tag = cipher.encrypt_and_digest(data)
+    return encrypted + tag
+
+
+def _v6_open_segment(aead, key, nonce, aad, record):
+    """Проверка и дешифрование записи V6 (ValueError при неверном теге)"""
+    cipher = _v6_cipher(aead, key, nonce)
+    cipher.update(aad)
+    return cipher.decrypt_and_verify(record[:-V6_TAG_SIZE], record[-V6_TAG_SIZE:])
+
+
+def _v6_check_segment(aead, key, nonce, aad, record):
+    """
+    Проверка тега записи V6 без получения открытых данных
+    (ValueError при неверном теге)
+
+    Для ChaCha20-Poly1305 тег считается напрямую по шифротексту (RFC 8439),
+    без прохода ChaCha20 по данным. Для AES-GCM pycryptodome не дает
+    посчитать GHASH отдельно, поэтому шифротекст расшифровывается
+    во временный буфер, который сразу отбрасывается.
+
+    Returns:
+        Длина открытых данных сегмента
+    """
+    encrypted, tag = record[:-V6_TAG_SIZE], record[-V6_TAG_SIZE:]
+
+    if aead == "CHACHA20-POLY1305":
+        one_time_key = ChaCha20.new(key=key, nonce=nonce).encrypt(b'\x00' * 32)
+        mac = Poly1305_MAC(one_time_key[:16], one_time_key[16:], data=None)
+        mac.update(aad)
+        mac.update(b'\x00' * (-len(aad) % 16))
+        mac.update(encrypted)
+        mac.update(b'\x00' * (-len(encrypted) % 16))
+        mac.update(len(aad).to_bytes(8, 'little') + len(encrypted).to_bytes(8, 'little'))
+        mac.verify(tag)
+    else:
+        cipher = _v6_cipher(aead, key, nonce)
+        cipher.update(aad)
+        cipher.decrypt(encrypted, output=bytearray(len(encrypted)))
+        cipher.verify(tag)
+
+    return len(encrypted)
+
+
+def _split(data, size):
+    """Нарезка буфера на куски заданного размера (последний может быть короче)"""
+    return [bytes(data[i:i + size]) for i in range(0, len(data), size)]
+
+
+class SVXSegmentEncryptor:
+    """
+    Потоковый шифровальщик тела контейнера V6
+
+    Открытые данные принимаются через write(), сжимаются кодеком
+    и режутся на сегменты по segment_size. Пачка из batch сегментов
+    шифруется параллельно в executor и пишется в out по порядку.
+    Последний сегмент придерживается до close(), чтобы пометить его флагом.
+    """
+
+    def __init__(self, out, key, nonce_prefix, aad, codec='zlib', level=9,
+                 segment_size=1024 * 1024, executor=None, batch=1,
+                 aead=V6_DEFAULT_AEAD):
+        """
+        Args:
+            out: Файл (открыт на запись), куда пишутся записи
+            key: Ключ (256 бит)
+            nonce_prefix: Случайный префикс nonce (7 байт)
+            aad: Дополнительные аутентифицируемые данные каждого сегмента
+            codec: Кодек сжатия из COMPRESSION_CODECS
+            level: Уровень сжатия
+            segment_size: Размер открытых данных в одном сегменте
+            executor: Пул для параллельного шифрования и сжатия zlib
+            batch: Сколько сегментов (блоков сжатия) отдавать в пул за раз
+            aead: Алгоритм сегментов (AES-256-GCM или CHACHA20-POLY1305)
+        """
+        self.out = out
+        self._aead = aead
+        self._key = key
+        self._nonce_prefix = nonce_prefix
+        self._aad = aad
+        self._compressor = new_compressor(codec, level, executor, batch)
+        self._executor = executor
+        self.segment_size = segment_size
+        self.batch = max(1, batch)
+        self._pending = bytearray()
+        self.segments = 0
+        self.bytes_in = 0
+        self.bytes_compressed = 0
+        self.bytes_out = 0
+        self.closed = False
+
+    def write(self, data):
+        """Добавить кусок открытых данных"""
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        self.bytes_in += len(data)
+        if self._compressor is not None:
+            self._feed(self._compressor.compress(data))
+        else:
+            self._feed(data)
+        return len(data)
+
+    def _feed(self, data):
+        if not data:
+            return
+
+        self.bytes_compressed += len(data)
+        self._pending += data
+
+        # Хотя бы байт остается в буфере - он уйдет в последний сегмент
+        if len(self._pending) > self.segment_size * self.batch:
+            count = (len(self._pending) - 1) // self.segment_size
+            usable = count * self.segment_size
+            self._seal(_split(self._pending[:usable], self.segment_size), final=False)
+            del self._pending[:usable]
+
+    def _seal(self, segments, final):
+        """Шифрование пачки сегментов; final - последний в пачке завершает поток"""
+        first = self.segments
+        nonces = [
+            _v6_nonce(self._nonce_prefix, first + i, final and i == len(segments) - 1)
+            for i in range(len(segments))
+        ]
+        aeads = [self._aead] * len(segments)
+        keys = [self._key] * len(segments)
+        aads = [self._aad] * len(segments)
+
+        if self._executor is not None and len(segments) > 1:
+            records = self._executor.map(_v6_seal_segment, aeads, keys, nonces, aads, segments)
+        else:
+            records = map(_v6_seal_segment, aeads, keys, nonces, aads, segments)
+
+        for record in records:
+            self.out.write(record)
+            self.bytes_out += len(record)
+        self.segments += len(segments)
+
+    def close(self):
+        """
+        Завершение потока: последние сегменты с флагом конца
+
+        Returns:
+            Количество записанных сегментов
+        """
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        if self._compressor is not None:
+            self._feed(self._compressor.flush())
+
+        segments = _split(self._pending, self.segment_size) or [b'']
+        self._seal(segments, final=True)
+        self._pending = bytearray()
+        self.closed = True
+        return self.segments
+
+
+class SVXSegmentDecryptor:
+    """
+    Потоковый дешифровальщик тела контейнера V6
+
+    Записи подаются через write() в любом разбиении, проверяются
+    и расшифровываются пачками в executor, открытые данные идут в writer.
+    При writer=None проверяются только теги, открытые данные не создаются.
+    Последняя запись придерживается до close() и обязана нести флаг конца.
+    """
+
+    def __init__(self, writer, key, nonce_prefix, aad, segment_size=1024 * 1024,
+                 executor=None, batch=1, aead=V6_DEFAULT_AEAD):
+        """
+        Args:
+            writer: Приемник открытых данных с методом write() или None
+            key: Ключ (256 бит)
+            nonce_prefix: Префикс nonce из заголовка
+            aad: Дополнительные аутентифицируемые данные
+            segment_size: Размер открытых данных в одном сегменте
+            executor: Пул для параллельного дешифрования
+            batch: Сколько записей отдавать в пул за раз
+            aead: Алгоритм сегментов из заголовка
+        """
+        self._writer = writer
+        self._aead = aead
+        self._key = key
+        self._nonce_prefix = nonce_prefix
+        self._aad = aad
+        self._executor = executor
+        self.record_size = segment_size + V6_TAG_SIZE
+        self.batch = max(1, batch)
+        self._pending = bytearray()
+        self.segments = 0
+        self.bytes_in = 0
+        self.bytes_decrypted = 0
+        self.closed = False
+
+    def write(self, data):
+        """Добавить кусок тела контейнера"""
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        self.bytes_in += len(data)
+        self._pending += data
+
+        if len(self._pending) > self.record_size * self.batch:
+            count = (len(self._pending) - 1) // self.record_size
+            usable = count * self.record_size
+            self._open(_split(self._pending[:usable], self.record_size), final=False)
+            del self._pending[:usable]
+        return len(data)
+
+    def _open(self, records, final):
+        first = self.segments
+        nonces = [
+            _v6_nonce(self._nonce_prefix, first + i, final and i == len(records) - 1)
+            for i in range(len(records))
+        ]
+        aeads = [self._aead] * len(records)
+        keys = [self._key] * len(records)
+        aads = [self._aad] * len(records)
+
+        for record in records:
+            if len(record) < V6_TAG_SIZE:
+                raise ValueError('Запись сегмента обрезана')
+
+        worker = _v6_check_segment if self._writer is None else _v6_open_segment
+        if self._executor is not None and len(records) > 1:
+            plains = self._executor.map(worker, aeads, keys, nonces, aads, records)
+        else:
+            plains = map(worker, aeads, keys, nonces, aads, records)
+
+        for plain in plains:
+            if self._writer is None:
+                self.bytes_decrypted += plain
+            else:
+                self.bytes_decrypted += len(plain)
+                self._writer.write(plain)
+        self.segments += len(records)
+
+    def close(self):
+        """
+        Проверка последних записей и завершение распаковки
+
+        Returns:
+            Количество проверенных сегментов
+        """
+        if self.closed:
+            raise ValueError('Поток уже закрыт')
+
+        if not self._pending:
+            raise ValueError('Контейнер не содержит сегментов')
+
+        self._open(_split(self._pending, self.record_size), final=True)
+        self._pending = bytearray()
+        self.closed = True
+
+        if self._writer is not None:
+            self._writer.close()
+        return self.segments
+
+# ============================================================================
+# ДЕРЕВО ХЭШЕЙ
+# ============================================================================
+#
+# Тело контейнера (шифротекст после заголовка) режется на куски
+# фиксированного размера; лист - BLAKE2 куска, узел - BLAKE2 пары детей.
+# Префиксы 0x00/0x01 разделяют листья и узлы, непарный узел поднимается
+# на уровень выше без изменений. Дерево ловит порчу носителя без пароля
+# и позволяет проверять выборку кусков вместо чтения всего архива.
+# Подлинность данных по-прежнему обеспечивает тег V5 или AEAD V6.
+
+MERKLE_ALGORITHMS = ('blake2b', 'blake2s')
+MERKLE_DIGEST_SIZE = 32
+
+
+def _merkle_leaf(algorithm, chunk):
+    """Хэш листа дерева"""
+    hasher = hashlib.new(algorithm, digest_size=MERKLE_DIGEST_SIZE)
+    hasher.update(b'\x00')
+    hasher.update(chunk)
+    return hasher.digest()
+
+
+def merkle_root(algorithm, leaves):
+    """Корень дерева по списку хэшей листьев"""
+    if not leaves:
+        return _merkle_leaf(algorithm, b'')
+
+    level = list(leaves)
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level) - 1, 2):
+            hasher = hashlib.new(algorithm, digest_size=MERKLE_DIGEST_SIZE)
+            hasher.update(b'\x01')
+            hasher.update(level[i])
+            hasher.update(level[i + 1])
+            parents.append(hasher.digest())
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0]
+
+
+class MerkleTreeHasher:
+    """
+    Инкрементальное построение дерева хэшей
+
+    Данные подаются через update() (подходит для HashingWriter),
+    полные куски пачками по batch хэшируются в executor.
+    """
+
+    def __init__(self, algorithm='blake2b', chunk_size=1024 * 1024, executor=None, batch=1):
+        """
+        Args:
+            algorithm: 'blake2b' или 'blake2s'
+            chunk_size: Размер куска (листа)
+            executor: Пул для параллельного хэширования
+            batch: Сколько кусков отдавать в пул за раз
+        """
+        if algorithm not in MERKLE_ALGORITHMS:
+            raise ValueError(f'Неизвестный алгоритм дерева: {algorithm}')
+
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+        self._executor = executor
+        self.batch = max(1, batch)
+        self._pending = bytearray()
+        self.leaves = []
+        self.bytes_hashed = 0
+
+    def update(self, data):
+        """Добавить данные тела"""
+        self.bytes_hashed += len(data)
+        self._pending += data
+        if len(self._pending) >= self.chunk_size * self.batch:
+            usable = len(self._pending) - len(self._pending) % self.chunk_size
+            self._hash(_split(self._pending[:usable], self.chunk_size))
+            del self._pending[:usable]
+
+    def _hash(self, chunks):
+        algorithms = [self.algorithm] * len(chunks)
+        if self._executor is not None and len(chunks) > 1:
+            self.leaves.extend(self._executor.map(_merkle_leaf, algorithms, chunks))
+        else:
+            self.leaves.extend(map(_merkle_leaf, algorithms, chunks))
+
+    def finalize(self):
+        """
+        Хэширование остатка
+
+        Returns:
+            Корень дерева (bytes)
+        """
+        if self._pending:
+            self._hash([bytes(self._pending)])
+            self._pending = bytearray()
+        return merkle_root(self.algorithm, self.leaves)
+
+# ============================================================================
+# КЛЮЧИ
+# ============================================================================
+
+def _zeroize(buffer):
+    """Затирание изменяемого буфера нулями на месте"""
+    buffer[:] = bytes(len(buffer))
+
+
+class PasswordHandle:
+    """
+    Мега-пароль, закодированный один раз
+
+    Принимается везде вместо текста пароля. Хранит UTF-8 байты
+    в одном буфере и лениво вычисляет (и запоминает) SHA3-512 для
+    заголовка и пре-хэш для PBKDF2. Пакетная обработка тысяч файлов
+    одним паролем перестает заново кодировать и хэшировать мегабайты.
+    """
+
+    # Размер блока SHA-512: более длинный ключ HMAC сначала хэшируется
+    HMAC_BLOCK_SIZE = 128
+
+    def __init__(self, password):
+        """
+        Args:
+            password: Текст пароля (str) или его UTF-8 байты
+        """
+        if isinstance(password, str):
+            password = password.encode('utf-8')
+        self._data = bytearray(password)
+        self._size = len(self._data)
+        self._in_memory = True
+        self._source = None
+        self._sha3_512_hex = None
+        self._pbkdf2_prehash = None
+
+    @classmethod
+    def of(cls, password):
+        """Дескриптор для пароля (уже готовый возвращается как есть)"""
+        if isinstance(password, cls):
+            return password
+        return cls(password)
+
+    @classmethod
+    def from_digests(cls, size, sha3_512_hex, sha512_digest, source=None):
+        """
+        Дескриптор пароля, который целиком лежит только в файле
+
+        Для шифрования и проверки нужны лишь SHA3-512 и пре-хэш PBKDF2,
+        поэтому мега-пароль, посчитанный потоково, в память не грузится.
+
+        Args:
+            size: Длина пароля в байтах UTF-8 (больше HMAC_BLOCK_SIZE)
+            sha3_512_hex: SHA3-512 пароля (hex)
+            sha512_digest: SHA-512 пароля (bytes)
+            source: (путь, смещение) байтов пароля в файле - для
+                    потокового копирования в файл ключа
+        """
+        if size <= cls.HMAC_BLOCK_SIZE:
+            raise ValueError("Короткий пароль нужно передавать целиком")
+        handle = cls(b'')
+        handle._size = size
+        handle._in_memory = False
+        handle._source = source
+        handle._sha3_512_hex = sha3_512_hex
+        handle._pbkdf2_prehash = bytes(sha512_digest)
+        return handle
+
+    @property
+    def in_memory(self):
+        """Есть ли сами байты пароля (а не только его хэши)"""
+        return self._in_memory
+
+    @property
+    def source(self):
+        """(путь, смещение) байтов пароля в файле или None"""
+        return self._source
+
+    @property
+    def data(self):
+        """UTF-8 байты пароля"""
+        if not self._in_memory:
+            raise ValueError("Пароль хранится только в файле")
+        return self._data
+
+    @property
+    def text(self):
+        """Текст пароля (декодируется при каждом обращении)"""
+        return self.data.decode('utf-8')
+
+    @property
+    def sha3_512_hex(self):
+        """SHA3-512 пароля - поле password_hash заголовка"""
+        if self._sha3_512_hex is None:
+            self._sha3_512_hex = hashlib.sha3_512(self._data).hexdigest()
+        return self._sha3_512_hex
+
+    @property
+    def pbkdf2_prehash(self):
+        """
+        Ключ HMAC, эквивалентный паролю для PBKDF2-HMAC-SHA512
+
+        HMAC заменяет ключ длиннее блока на его SHA-512, поэтому
+        PBKDF2 от 64-байтного пре-хэша дает тот же ключ, что и от
+        мегабайтного пароля, но без его повторного хэширования.
+        """
+        if self._pbkdf2_prehash is None:
+            if len(self._data) > self.HMAC_BLOCK_SIZE:
+                self._pbkdf2_prehash = hashlib.sha512(self._data).digest()
+            else:
+                self._pbkdf2_prehash = bytes(self._data)
+        return self._pbkdf2_prehash
+
+    def wipe(self):
+        """Затереть пароль в памяти"""
+        _zeroize(self._data)
+        self._data = bytearray()
+        self._size = 0
+        self._source = None
+        self._sha3_512_hex = None
+        self._pbkdf2_prehash = None
+
+    def __len__(self):
+        return self._size
+
+
+class KeyDerivationContext:
+    """
+    Вывод ключей PBKDF2 с кэшем
+
+    Ключ для пары (пароль, соль) вычисляется один раз и хранится
+    в ограниченном LRU-кэше с временем жизни. Сам пароль в кэше
+    не хранится - только HMAC от него на случайном ключе контекста.
+    Вытесненные и просроченные ключи затираются нулями. Размер и
+    время жизни меняются на ходу через configure().
+    """
+
+    def __init__(self, max_entries=32, ttl=600, iterations=100000, dklen=32):
+        """
+        Args:
+            max_entries: Максимум ключей в кэше (0 - без кэша)
+            ttl: Время жизни ключа в секундах
+            iterations: Итераций PBKDF2
+            dklen: Длина ключа в байтах
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.iterations = iterations
+        self.dklen = dklen
+        self._secret = secrets.token_bytes(32)
+        self._entries = OrderedDict()  # отпечаток → (ключ, время вывода)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fingerprint(self, password_key, salt):
+        """Ключ кэша: HMAC пароля и соли на секрете контекста"""
+        mac = hmac.new(self._secret, digestmod='sha256')
+        mac.update(password_key)
+        mac.update(b'\x00' + salt)
+        return mac.digest()
+
+    def derive(self, password_text, salt):
+        """
+        Получение ключа (из кэша или через PBKDF2-SHA512)
+
+        Args:
+            password_text: Мега-пароль (текст или PasswordHandle)
+            salt: Соль
+
+        Returns:
+            Ключ (bytes)
+        """
+        password_key = PasswordHandle.of(password_text).pbkdf2_prehash
+        fingerprint = self._fingerprint(password_key, salt)
+        now = time.time()
+
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+                return bytes(entry[0])
+            self.misses += 1
+
+        key = hashlib.pbkdf2_hmac('sha512', password_key, salt, self.iterations, dklen=self.dklen)
+
+        if self.max_entries > 0 and self.ttl > 0:
+            with self._lock:
+                old = self._entries.pop(fingerprint, None)
+                if old is not None:
+                    _zeroize(old[0])
+                self._entries[fingerprint] = (bytearray(key), now)
+                self._trim()
+
+        return key
+
+    def configure(self, max_entries=None, ttl=None):
+        """
+        Изменение размера кэша и времени жизни ключей
+
+        Лишние и ставшие просроченными ключи затираются сразу.
+
+        Args:
+            max_entries: Максимум ключей в кэше (None - не менять)
+            ttl: Время жизни ключа в секундах (None - не менять)
+        """
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttl is not None:
+                self.ttl = ttl
+            self._expire(time.time())
+            self._trim()
+
+    def _trim(self):
+        """Вытеснение старейших ключей сверх max_entries (вызывается под блокировкой)"""
+        while len(self._entries) > max(self.max_entries, 0):
+            _, (evicted, _) = self._entries.popitem(last=False)
+            _zeroize(evicted)
+
+    def _expire(self, now):
+        """Удаление просроченных ключей (вызывается под блокировкой)"""
+        expired = [fp for fp, (_, created) in self._entries.items() if created + self.ttl <= now]
+        for fp in expired:
+            _zeroize(self._entries.pop(fp)[0])
+
+    def clear(self):
+        """Затереть и удалить все ключи"""
+        with self._lock:
+            for key, _ in self._entries.values():
+                _zeroize(key)
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self._entries)
+
+# Двоичный файл ключа: MAGIC | длина пароля (8 байт LE) | SHA3-512 | SHA-512 |
+# пароль UTF-8 | CRC32 всего предыдущего (4 байта LE). Хэши посчитаны заранее,
+# поэтому загрузка - одно чтение и CRC, без поиска пароля в тексте.
+KEYFILE_MAGIC = b"SUPER_VAULT_X_KEY\x00"
+KEYFILE_SUFFIX = ".svxkey"
+KEYFILE_PREFIX_SIZE = len(KEYFILE_MAGIC) + 8 + 64 + 64
+
+
+def write_keyfile(path, password):
+    """
+    Запись двоичного файла ключа (атомарно, через временный файл)
+
+    Пароль, который хранится только в файле (PasswordHandle.from_digests
+    с source), копируется оттуда потоково со сверкой SHA3-512.
+
+    Args:
+        path: Путь к файлу ключа
+        password: Текст пароля или PasswordHandle
+
+    Raises:
+        ValueError: У дескриптора нет ни байтов пароля, ни файла-источника,
+                    или файл-источник изменился
+    """
+    handle = PasswordHandle.of(password)
+    if not handle.in_memory and handle.source is None:
+        raise ValueError("Пароль известен только по хэшам: нет файла, из которого его скопировать")
+
+    size = len(handle)
+    if size > PasswordHandle.HMAC_BLOCK_SIZE:
+        sha512 = handle.pbkdf2_prehash
+    else:
+        sha512 = hashlib.sha512(handle.data).digest()
+
+    prefix = (KEYFILE_MAGIC + size.to_bytes(8, 'little')
+              + bytes.fromhex(handle.sha3_512_hex) + sha512)
+    checksum = zlib.crc32(prefix)
+
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(prefix)
+            if handle.in_memory:
+                f.write(handle.data)
+                checksum = zlib.crc32(handle.data, checksum)
+            else:
+                checksum = _copy_password_source(handle, f, checksum)
+            f.write(checksum.to_bytes(4, 'little'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _copy_password_source(handle, out, checksum, chunk_size=1024 * 1024):
+    """
+    Потоковое копирование байтов пароля из файла-источника
+
+    Returns:
+        CRC32, продолженный по байтам пароля
+    """
+    path, offset = handle.source
+    hasher = hashlib.sha3_512()
+    remaining = len(handle)
+    with open(path, 'rb') as src:
+        src.seek(offset)
+        while remaining > 0:
+            chunk = src.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            checksum = zlib.crc32(chunk, checksum)
+            out.write(chunk)
+            remaining -= len(chunk)
+    if remaining or hasher.hexdigest() != handle.sha3_512_hex:
+        raise ValueError(f"Файл пароля изменился: {path}")
+    return checksum
+
+
+def is_keyfile(path):
+    """Начинается ли файл с сигнатуры двоичного файла ключа"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(KEYFILE_MAGIC)) == KEYFILE_MAGIC
+    except OSError:
+        return False
+
+
+def read_keyfile(path):
+    """
+    Загрузка двоичного файла ключа одним чтением
+
+    Args:
+        path: Путь к файлу ключа
+
+    Returns:
+        PasswordHandle с готовыми SHA3-512 и пре-хэшем PBKDF2
+
+    Raises:
+        ValueError: Не файл ключа, обрезан или поврежден
+    """
+    with open(path, 'rb') as f:
+        buffer = bytearray(os.fstat(f.fileno()).st_size)
+        read = f.readinto(buffer)
+
+    try:
+        with memoryview(buffer) as view:
+            return _parse_keyfile(view, read)
+    finally:
+        _zeroize(buffer)
+
+
+def _parse_keyfile(view, read):
+    """Разбор содержимого файла ключа (см. read_keyfile)"""
+    if read != len(view) or read < KEYFILE_PREFIX_SIZE + 4:
+        raise ValueError("Файл ключа обрезан")
+    if view[:len(KEYFILE_MAGIC)] != KEYFILE_MAGIC:
+        raise ValueError("Не файл ключа SuperVaultX")
+
+    offset = len(KEYFILE_MAGIC)
+    size = int.from_bytes(view[offset:offset + 8], 'little')
+    if KEYFILE_PREFIX_SIZE + size + 4 != len(view):
+        raise ValueError("Длина пароля не совпадает с размером файла ключа")
+    checksum = int.from_bytes(view[-4:], 'little')
+    if zlib.crc32(view[:-4]) != checksum:
+        raise ValueError("Контрольная сумма файла ключа не совпадает")
+
+    handle = PasswordHandle(view[KEYFILE_PREFIX_SIZE:-4])
+    handle._sha3_512_hex = view[offset + 8:offset + 72].hex()
+    if size > PasswordHandle.HMAC_BLOCK_SIZE:
+        handle._pbkdf2_prehash = bytes(view[offset + 72:KEYFILE_PREFIX_SIZE])
+    return handle
+
+# ============================================================================
+# ГЕНЕРАЦИЯ ПАРОЛЕЙ
+# ============================================================================
+
+class BulkRandom:
+    """
+    Случайные значения пачками из одного буфера CSPRNG (os.urandom)
+
+    Вместо вызова random/secrets на каждый символ и каждое решение
+    буфер берется сразу на всю пачку строк.
+    """
+
+    def __init__(self, alphabet):
+        """
+        Args:
+            alphabet: Алфавит случайной части строки (только ASCII)
+        """
+        self.alphabet = alphabet.encode('ascii')
+        size = len(self.alphabet)
+        if not 0 < size <= 256:
+            raise ValueError('Алфавит должен содержать от 1 до 256 символов')
+
+        # Байт b -> alphabet[b % size] для b < limit, остальные отбрасываются:
+        # без смещения распределения (rejection sampling)
+        limit = 256 - 256 % size
+        self._table = bytes(self.alphabet[b % size] if b < limit else 0 for b in range(256))
+        self._rejected = bytes(range(limit, 256))
+        self._acceptance = limit / 256
+
+    def chars(self, count):
+        """Строка из count случайных символов алфавита"""
+        result = bytearray()
+        while len(result) < count:
+            need = count - len(result)
+            raw = os.urandom(int(need / self._acceptance) + 16)
+            result += raw.translate(self._table, self._rejected)
+        return result[:count].decode('ascii')
+
+    def words(self, count):
+        """Массив count случайных 32-битных чисел"""
+        return memoryview(os.urandom(count * 4)).cast('I')
+
+    def raw(self, count):
+        return os.urandom(count)
+
+
+class MegaPasswordGenerator:
+    """
+    Генератор строк мега-пароля пачками
+
+    Формат строк как у прежнего построчного генератора, но все случайные
+    решения, длины, индексы и символы одной пачки берутся из общего
+    буфера os.urandom.
+    """
+
+    MATH_OPS = ["+", "-", "*", "/", "=", "≈", "≠", ">", "<"]
+    SEPARATORS = ["_", "-", ".", "|", ":", "#", "~", "•", "→", "⇨"]
+
+    # Пороги для 32-битных чисел: вероятность p -> value < p * 2**32
+    THRESHOLD_40 = int(0.4 * 2 ** 32)
+    THRESHOLD_20 = int(0.2 * 2 ** 32)
+    THRESHOLD_30 = int(0.3 * 2 ** 32)
+    THRESHOLD_50 = int(0.5 * 2 ** 32)
+
+    def __init__(self, user_words, user_dates=None, personal_info=None,
+                 dictionaries=None, special_chars='', add_timestamps=True):
+        """
+        Args:
+            user_words: Слова пользователя (непустой список)
+            user_dates: Даты пользователя
+            personal_info: Словарь с персональной информацией
+            dictionaries: Встроенные словари (None - не использовать)
+            special_chars: Спецсимволы случайной части
+            add_timestamps: Добавлять временные метки
+        """
+        self.user_words = user_words
+        self.user_dates = user_dates or []
+        self.personal_items = [f"{key}_{value}" for key, value in (personal_info or {}).items()]
+        self.dictionaries = list((dictionaries or {}).values())
+        self.add_timestamps = add_timestamps
+        self.random = BulkRandom(string.ascii_letters + string.digits + special_chars)
+        self.stats = {
+            "dictionary_words_used": 0,
+            "special_chars_used": 0,
+            "timestamps_added": 0
+        }
+
+    def batches(self, total, batch_size=1024, start=0):
+        """
+        Строки пароля пачками
+
+        Args:
+            total: Общее количество строк
+            batch_size: Строк в пачке
+            start: Номер первой строки (с нуля)
+
+        Yields:
+            Списки строк
+        """
+        for first in range(start, total, batch_size):
+            yield self._batch(first, min(batch_size, total - first))
+
+    def _batch(self, first, count):
+        """
+        Пачка строк, собранная по столбцам
+
+        Каждая часть строки (слово, дата, словари, случайная часть, ...)
+        вычисляется списком сразу для всей пачки, затем строки склеиваются.
+        """
+        dictionaries = self.dictionaries
+        personal = self.personal_items
+        words = self.user_words
+        dates = self.user_dates
+        indices = range(first, first + count)
+
+        # Чисел на строку: словари (флаг + индекс), персональные флаги,
+        # выражение (флаг, 2 числа, операция), hex (флаг), разделитель,
+        # длина hex, длина случайной части
+        per_line = 2 * len(dictionaries) + len(personal) + 8
+        values = self.random.words(per_line * count)
+        column = iter(range(per_line))
+
+        def take():
+            return values[next(column)::per_line].tolist()
+
+        columns = [[words[i % len(words)] for i in indices]]
+
+        if dates:
+            columns.append([dates[i % len(dates)] if i % 3 == 0 else None for i in indices])
+
+        dictionary_words = 0
+        for dictionary in dictionaries:
+            flags, choices = take(), take()
+            picked = [dictionary[c % len(dictionary)] if f < self.THRESHOLD_40 else None
+                      for f, c in zip(flags, choices)]
+            dictionary_words += count - picked.count(None)
+            columns.append(picked)
+
+        for item in personal:
+            columns.append([item if f < self.THRESHOLD_20 else None for f in take()])
+
+        math_flags, numbers1, numbers2, ops = take(), take(), take(), take()
+        hex_flags, separators = take(), take()
+        hex_lengths = [2 * (2 + x % 7) for x in take()]
+        lengths = [12 + x % 21 for x in take()]
+
+        # Случайная часть: один буфер символов, нарезанный по длинам
+        chars = self.random.chars(sum(lengths))
+        ends = list(accumulate(lengths))
+        columns.append([chars[end - length:end] for end, length in zip(ends, lengths)])
+
+        math_ops = self.MATH_OPS
+        columns.append([
+            f"{1 + a % 9999}{math_ops[o % len(math_ops)]}{1 + b % 9999}" if f < self.THRESHOLD_30 else None
+            for f, a, b, o in zip(math_flags, numbers1, numbers2, ops)
+        ])
+
+        hex_digits = self.random.raw(sum(hex_lengths) // 2).hex()
+        hex_ends = list(accumulate(hex_lengths))
+        columns.append([
+            f"0x{hex_digits[end - length:end]}" if f < self.THRESHOLD_50 else None
+            for f, end, length in zip(hex_flags, hex_ends, hex_lengths)
+        ])
+
+        seps = self.SEPARATORS
+        bodies = [
+            seps[sep % len(seps)].join(filter(None, row))
+            for sep, row in zip(separators, zip(*columns))
+        ]
+
+        if self.add_timestamps:
+            timestamp_base = int(time.time() * 1000000)
+            nano_times = memoryview(self.random.raw(8 * count)).cast('Q').tolist()
+            lines = [
+                f"L{i+1:06d}_T{timestamp_base + i}_N{nano}_{body}"
+                for i, nano, body in zip(indices, nano_times, bodies)
+            ]
+            self.stats["timestamps_added"] += count
+        else:
+            lines = [f"L{i+1:06d}_{body}" for i, body in zip(indices, bodies)]
+
+        self.stats["dictionary_words_used"] += dictionary_words
+        self.stats["special_chars_used"] += count
+        return lines
+
+# ============================================================================
+# КАТАЛОГ АРХИВОВ
+# ============================================================================
+
+class VaultCatalog:
+    """
+    Индекс метаданных .svx файлов в SQLite
+
+    Хранит открытые поля заголовков (имя, размер, дата, алгоритм),
+    ключом служит путь архива. Обновление инкрементальное: заголовок
+    перечитывается только если изменились размер или время изменения.
+    Имя хранится еще и в виде str.casefold() (LIKE в SQLite не различает
+    регистр только для ASCII, а имена здесь чаще кириллические). Поиск
+    по подстроке имени идет через триграммный индекс FTS5 по этой
+    колонке (SQLite >= 3.34); без него - полным просмотром таблицы.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS vaults (
+            path TEXT PRIMARY KEY,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL,
+            original_name TEXT,
+            original_size INTEGER,
+            timestamp TEXT,
+            algorithm TEXT,
+            was_compressed INTEGER,
+            header TEXT,
+            name_folded TEXT
+        );
+        CREATE INDEX IF NOT EXISTS vaults_timestamp ON vaults (timestamp);
+        -- Индекс NOCASE не помогал поиску по подстроке (LIKE '%x%')
+        DROP INDEX IF EXISTS vaults_name;
+    """
+
+    # Триграммы имен для LIKE '%x%'; триггеры держат индекс в согласии с vaults
+    NAME_INDEX_SCHEMA = """
+        CREATE VIRTUAL TABLE vaults_names USING fts5(
+            name_folded, content='vaults', content_rowid='rowid', tokenize='trigram'
+        );
+        CREATE TRIGGER vaults_names_insert AFTER INSERT ON vaults BEGIN
+            INSERT INTO vaults_names (rowid, name_folded) VALUES (new.rowid, new.name_folded);
+        END;
+        CREATE TRIGGER vaults_names_delete AFTER DELETE ON vaults BEGIN
+            INSERT INTO vaults_names (vaults_names, rowid, name_folded)
+            VALUES ('delete', old.rowid, old.name_folded);
+        END;
+        CREATE TRIGGER vaults_names_update AFTER UPDATE OF name_folded ON vaults BEGIN
+            INSERT INTO vaults_names (vaults_names, rowid, name_folded)
+            VALUES ('delete', old.rowid, old.name_folded);
+            INSERT INTO vaults_names (rowid, name_folded) VALUES (new.rowid, new.name_folded);
+        END;
+        INSERT INTO vaults_names (vaults_names) VALUES ('rebuild');
+    """
+
+    COLUMNS = ('path', 'mtime', 'size', 'original_name', 'original_size',
+               'timestamp', 'algorithm', 'was_compressed')
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path)
+        # INSERT OR REPLACE удаляет прежнюю строку - триггер индекса имен должен это видеть
+        self._db.execute("PRAGMA recursive_triggers = ON")
+        self._db.executescript(self.SCHEMA)
+        self._add_folded_names()
+        self._name_index = self._create_name_index()
+
+    def _add_folded_names(self):
+        """Колонка name_folded для каталогов прежней схемы (заполняется из original_name)"""
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(vaults)")}
+        if 'name_folded' in columns:
+            return
+        with self._db:
+            # Прежний индекс имен строился по original_name - пересоздается заново
+            for statement in ("DROP TRIGGER IF EXISTS vaults_names_insert",
+                              "DROP TRIGGER IF EXISTS vaults_names_delete",
+                              "DROP TRIGGER IF EXISTS vaults_names_update",
+                              "DROP TABLE IF EXISTS vaults_names"):
+                self._db.execute(statement)
+            self._db.execute("ALTER TABLE vaults ADD COLUMN name_folded TEXT")
+            rows = [
+                (name.casefold(), path)
+                for path, name in self._db.execute("SELECT path, original_name FROM vaults")
+                if name
+            ]
+            self._db.executemany("UPDATE vaults SET name_folded = ? WHERE path = ?", rows)
+
+    def _create_name_index(self):
+        """
+        Создание триграммного индекса имен (существующие записи индексируются)
+
+        Returns:
+            True - индекс есть, False - SQLite собран без FTS5/trigram
+        """
+        exists = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'vaults_names'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            self._db.executescript(self.NAME_INDEX_SCHEMA)
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM vaults").fetchone()[0]
+
+    def update(self, root_dir, paths, inspect):
+        """
+        Синхронизация поддерева каталога с набором файлов
+
+        Args:
+            root_dir: Абсолютный путь просканированного поддерева
+            paths: Абсолютные пути всех .svx файлов поддерева
+            inspect: Функция path -> (сведения из заголовка, ошибка)
+
+        Returns:
+            Словарь счетчиков added/updated/unchanged/removed/errors
+        """
+        stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'errors': 0}
+
+        known = {
+            path: (mtime, size)
+            for path, mtime, size in self._db.execute("SELECT path, mtime, size FROM vaults")
+        }
+
+        rows = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stats['errors'] += 1
+                continue
+
+            previous = known.pop(path, None)
+            if previous == (stat.st_mtime, stat.st_size):
+                stats['unchanged'] += 1
+                continue
+
+            info, error = inspect(path)
+            if error:
+                stats['errors'] += 1
+                continue
+
+            name = info.get('original_name')
+            rows.append((
+                path, stat.st_mtime, stat.st_size,
+                name, info.get('original_size'),
+                info.get('timestamp'), info.get('algorithm'),
+                int(bool(info.get('was_compressed'))),
+                json.dumps(info, ensure_ascii=False),
+                name.casefold() if name else None
+            ))
+            stats['updated' if previous else 'added'] += 1
+
+        # Удаляем записи исчезнувших файлов только внутри просканированного поддерева
+        removed = [
+            (path,) for path in known
+            if os.path.commonpath([root_dir, path]) == root_dir
+        ]
+        stats['removed'] = len(removed)
+
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vaults (" + ", ".join(self.COLUMNS) +
+                ", header, name_folded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.executemany("DELETE FROM vaults WHERE path = ?", removed)
+
+        return stats
+
+    def search(self, name=None, date_from=None, date_to=None, limit=None):
+        """
+        Поиск архивов по имени оригинала и дате шифрования
+
+        Args:
+            name: Подстрока или шаблон с * и ? (без учета регистра, в том
+                  числе для кириллицы)
+            date_from: Начало периода в ISO формате ('2025-03', '2025-03-01')
+            date_to: Конец периода включительно в ISO формате
+            limit: Максимум результатов
+
+        Returns:
+            Список словарей с полями каталога
+        """
+        conditions, params = [], []
+
+        if name:
+            name = name.casefold()
+            wildcard = '*' in name or '?' in name
+            # Триграммный индекс не принимает ESCAPE: отбор по шаблону без
+            # экранирования (% и _ из имени лишь расширяют выборку), точное
+            # сравнение - условием ниже. Куски короче трех символов индекс
+            # не ускоряет (а SQLite 3.40 теряет на них кириллицу) - тогда
+            # просмотр таблицы
+            loose = name.replace('*', '%').replace('?', '_') if wildcard else f'%{name}%'
+            longest_run = max(len(run) for run in loose.replace('_', '%').split('%'))
+            if self._name_index and longest_run >= 3:
+                conditions.append("rowid IN (SELECT rowid FROM vaults_names WHERE name_folded LIKE ?)")
+                params.append(loose)
+
+            pattern = name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            if wildcard:
+                pattern = pattern.replace('*', '%').replace('?', '_')
+            else:
+                pattern = f'%{pattern}%'
+            conditions.append("name_folded LIKE ? ESCAPE '\\'")
+            params.append(pattern)
+
+        if date_from:
+            conditions.append("timestamp >= ?")
+            params.append(date_from)
+
+        if date_to:
+            # '2025-03' должен включать весь март: сравниваем с верхней границей префикса
+            conditions.append("timestamp < ?")
+            params.append(date_to + '\uffff')
+
+        query = "SELECT " + ", ".join(self.COLUMNS) + " FROM vaults"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY timestamp"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        return [dict(zip(self.COLUMNS, row)) for row in self._db.execute(query, params)]
+
+# ============================================================================
+# ФОНОВОЕ УДАЛЕНИЕ
+# ============================================================================
+
+def _lock_file(f, blocking=True):
+    """
+    Исключительная блокировка открытого файла между процессами
+
+    Returns:
+        True - блокировка получена, False - файл занят (только blocking=False)
+    """
+    if fcntl is not None:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        return True
+    if msvcrt is not None:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.05)
+    return True
+
+
+def _unlock_file(f):
+    """Снятие блокировки _lock_file"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _fsync_directory(path):
+    """fsync каталога: созданный или переименованный файл переживет сбой питания (POSIX)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ShredQueue:
+    """
+    Очередь безопасного удаления в фоне с журналом на диске
+
+    Каждое задание записывается в журнал (JSONL, fsync) до запуска,
+    отметка о завершении - после. При создании очереди незавершенные
+    задания упавших процессов из журнала запускаются заново, поэтому
+    сбой процесса не оставляет оригиналы неудаленными.
+
+    Задание хранит st_dev/st_ino/st_size/st_mtime_ns файла: файл,
+    изменившийся после постановки в очередь (пользователь продолжил
+    с ним работать), не удаляется. Журнал читается, сжимается и
+    дополняется под межпроцессной блокировкой <журнал>.lock, а каждая
+    очередь держит блокировку своего файла владельца: задания живого
+    процесса (GUI и CLI одновременно) другая очередь не трогает.
+    """
+
+    def __init__(self, journal_path, shred, workers=1, log=None):
+        """
+        Args:
+            journal_path: Файл журнала
+            shred: Функция (путь, проходы) -> bool, выполняющая удаление
+            workers: Количество параллельных удалений
+            log: Функция (сообщение, уровень) для журнала приложения
+        """
+        self.journal_path = Path(journal_path)
+        self._shred = shred
+        self._log = log or (lambda message, level="INFO": None)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._futures = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._owner = secrets.token_hex(8)
+        self._lock_path = self.journal_path.with_name(self.journal_path.name + '.lock')
+
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Блокировка владельца держится, пока очередь жива (и снимается ОС при сбое)
+        self._owner_file = open(self._owner_path(self._owner), 'wb')
+        _lock_file(self._owner_file)
+
+        with self._lock:
+            journal_lock = self._lock_journal()
+            try:
+                pending = self._replay()
+                adopted = []
+                for job in pending:
+                    if not self._owner_alive(job.get('owner')):
+                        job['owner'] = self._owner
+                        adopted.append(job)
+
+                # Журнал сжимается до незавершенных заданий (и чужих живых)
+                temp_path = self.journal_path.with_name(self.journal_path.name + '.tmp')
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    for job in pending:
+                        f.write(json.dumps(dict(job, op='add'), ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.journal_path)
+                _fsync_directory(self.journal_path.parent)
+            finally:
+                self._unlock_journal(journal_lock)
+
+        for job in adopted:
+            self._log(f"Продолжение фонового удаления после сбоя: {job['path']}")
+            self._start(job)
+
+    def _owner_path(self, owner):
+        return self.journal_path.with_name(f"{self.journal_path.name}.{owner}.owner")
+
+    def _owner_alive(self, owner):
+        """Держит ли очередь-владелец (в этом или другом процессе) свою блокировку"""
+        if not owner:
+            return False
+        path = self._owner_path(owner)
+        try:
+            f = open(path, 'r+b')
+        except FileNotFoundError:
+            return False
+        with f:
+            if not _lock_file(f, blocking=False):
+                return True
+            _unlock_file(f)
+        # Владелец упал: его задания переходят к этой очереди
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+
+    def _lock_journal(self):
+        f = open(self._lock_path, 'a+b')
+        _lock_file(f)
+        return f
+
+    @staticmethod
+    def _unlock_journal(f):
+        try:
+            _unlock_file(f)
+        finally:
+            f.close()
+
+    def _replay(self):
+        """Незавершенные задания из журнала (вызывается под блокировкой журнала)"""
+        jobs = OrderedDict()
+        if not self.journal_path.exists():
+            return []
+
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после сбоя
+                    continue
+                if entry.get('op') == 'add':
+                    jobs[entry['id']] = {
+                        'id': entry['id'],
+                        'path': entry['path'],
+                        'passes': entry['passes'],
+                        'created': entry.get('created'),
+                        'owner': entry.get('owner'),
+                        'stat': entry.get('stat'),
+                        'started': entry.get('started', False)
+                    }
+                elif entry.get('op') == 'start':
+                    if entry.get('id') in jobs:
+                        jobs[entry['id']]['started'] = True
+                elif entry.get('op') == 'done':
+                    jobs.pop(entry.get('id'), None)
+        return list(jobs.values())
+
+    def _append(self, entry):
+        with self._lock:
+            journal_lock = self._lock_journal()
+            try:
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                self._unlock_journal(journal_lock)
+
+    @staticmethod
+    def _identity(path):
+        """[st_dev, st_ino, st_size, st_mtime_ns] файла (None - файла нет)"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def _same_file(self, job, current):
+        expected = job.get('stat')
+        if not expected:
+            # Задание без отпечатка (старый журнал): не удалять вслепую
+            return False
+        if job.get('started'):
+            # Проходы перезаписи меняют mtime, но не устройство, inode и размер
+            return current[:3] == expected[:3]
+        return current == expected
+
+    def _start(self, job):
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._futures[job['id']] = self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        current = self._identity(job['path'])
+        if current is None:
+            self._log(f"Файл уже удален: {job['path']}")
+            self._append({'op': 'done', 'id': job['id'], 'ok': True})
+            return True
+        if not self._same_file(job, current):
+            self._log(f"Файл изменился после постановки в очередь, удаление пропущено: "
+                      f"{job['path']}", "WARNING")
+            self._append({'op': 'done', 'id': job['id'], 'ok': False, 'skipped': True})
+            return False
+
+        self._append({'op': 'start', 'id': job['id']})
+        try:
+            ok = bool(self._shred(job['path'], job['passes']))
+        except Exception:
+            ok = False
+        self._append({'op': 'done', 'id': job['id'], 'ok': ok})
+        return ok
+
+    def submit(self, path, passes=7):
+        """
+        Поставить файл в очередь удаления
+
+        Returns:
+            ID задания
+        """
+        path = os.path.abspath(path)
+        job = {
+            'id': secrets.token_hex(8),
+            'path': path,
+            'passes': passes,
+            'created': datetime.now().isoformat(),
+            'owner': self._owner,
+            'stat': self._identity(path),
+            'started': False
+        }
+        self._append(dict(job, op='add'))
+        self._start(job)
+        return job['id']
+
+    def pending(self):
+        """ID незавершенных заданий"""
+        with self._lock:
+            return [job_id for job_id, future in self._futures.items() if not future.done()]
+
+    def wait(self, job_id, timeout=None):
+        """
+        Ожидание задания
+
+        Returns:
+            True/False - результат удаления, None - задание неизвестно или не успело
+        """
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            return None
+
+    def drain(self, timeout=None):
+        """
+        Ожидание всех заданий очереди
+
+        Returns:
+            Словарь {ID задания: результат}
+        """
+        with self._lock:
+            futures = dict(self._futures)
+        wait(list(futures.values()), timeout=timeout)
+        return {
+            job_id: future.result() if future.done() else None
+            for job_id, future in futures.items()
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if wait and not self._owner_file.closed:
+            # Все задания завершены: файл владельца больше не нужен
+            self._owner_file.close()
+            try:
+                os.remove(self._owner_path(self._owner))
+            except OSError:
+                pass
+
+# ============================================================================
+# ДЕДУПЛИКАЦИЯ
+# ============================================================================
+#
+# Вход режется на куски по содержимому (content-defined chunking): граница
+# ставится там, где rolling-хэш окна последних байтов попадает под маску.
+# Вставка или удаление байтов сдвигает только соседние границы, остальные
+# куски совпадают с прежней версией файла и хранятся один раз.
+#
+# Хэш - gear (как в FastCDC): h_i = (h_{i-1} << 1) ^ G[b_i] по модулю 2**32,
+# G - таблица 32-битных случайных значений, окно 32 байта. Цикл Python по
+# байтам дает единицы МБ/с, поэтому хэши всех позиций блока считаются
+# сразу: G[b] раскладывается в 4-байтные дорожки через bytes.translate,
+# дорожки складываются в одно целое, и окно 1 → 32 удваивается сдвигом на
+# L дорожек и L бит: h(L*2) = h(L) ^ (h(L) со сдвигом L). Кандидаты в
+# границы (нулевой старший байт хэша) ищутся bytes.find, полная маска
+# проверяется только у них. Таблица G определяет границы кусков и не
+# должна меняться, иначе пропадет дедупликация со старыми версиями.
+
+GEAR_TABLE = [int.from_bytes(hashlib.sha256(b"svx-gear" + bytes([b])).digest()[:4], 'little')
+              for b in range(256)]
+GEAR_BYTE_TABLES = [bytes((g >> (8 * k)) & 0xFF for g in GEAR_TABLE) for k in range(4)]
+GEAR_WINDOW = 32
+GEAR_BLOCK_SIZE = 256 * 1024  # Блок хэширования: целые в пределах кэша процессора
+_GEAR_LANE_MASKS = {}
+
+
+def _gear_lane_mask(count, shift):
+    """Маска count 32-битных дорожек без младших shift бит каждой"""
+    key = (count, shift)
+    mask = _GEAR_LANE_MASKS.get(key)
+    if mask is None:
+        lane = 0xFFFFFFFF ^ ((1 << shift) - 1)
+        mask = int.from_bytes(lane.to_bytes(4, 'little') * count, 'little')
+        # Кэшируются только маски полного блока (остальные - хвосты потоков)
+        if count == GEAR_BLOCK_SIZE + GEAR_WINDOW - 1:
+            _GEAR_LANE_MASKS[key] = mask
+    return mask
+
+
+def gear_hashes(data):
+    """
+    Gear-хэш каждой позиции данных
+
+    Позиции в начале данных считаются с нулевой историей; для точных
+    хэшей передайте в начале GEAR_WINDOW - 1 предшествующих байтов.
+
+    Returns:
+        bytes длиной 4 * len(data): хэш позиции i - data[4*i:4*i+4] (LE)
+    """
+    count = len(data)
+    lanes = bytearray(4 * count)
+    for k in range(4):
+        lanes[k::4] = data.translate(GEAR_BYTE_TABLES[k])
+    x = int.from_bytes(lanes, 'little')
+    shift = 1
+    while shift < GEAR_WINDOW:
+        x ^= (x << (33 * shift)) & _gear_lane_mask(count, shift)
+        shift *= 2
+    return x.to_bytes(4 * count, 'little')
+
+
+class ContentDefinedChunker:
+    """
+    Нарезка потока на куски переменной длины по содержимому
+
+    Нормализованная нарезка (как FastCDC): до среднего размера маска
+    длиннее (граница реже), после - короче, поэтому размеры кучнее
+    вокруг среднего. Куски не короче min_size и не длиннее max_size.
+    Граница - после позиции, где старшие биты gear-хэша нулевые.
+    """
+
+    def __init__(self, avg_size=1024 * 1024, min_size=None, max_size=None, read_size=None):
+        """
+        Args:
+            avg_size: Средний размер куска (степень двойки от 1 КБ до 16 МБ)
+            min_size: Минимальный размер (по умолчанию avg_size / 4)
+            max_size: Максимальный размер (по умолчанию avg_size * 4)
+            read_size: Сколько читать за раз (по умолчанию max_size)
+        """
+        bits = avg_size.bit_length() - 1
+        if avg_size != 1 << bits or not 10 <= bits <= 24:
+            raise ValueError("Средний размер куска должен быть степенью двойки от 1 КБ до 16 МБ")
+        self.avg_size = avg_size
+        self.min_size = min_size or avg_size // 4
+        self.max_size = max_size or avg_size * 4
+        self.read_size = read_size or self.max_size
+        # Маска - старшие биты хэша; обе длиннее 8 бит, поэтому граница
+        # всегда среди позиций с нулевым старшим байтом
+        self._strict_shift = 32 - bits
+        self._loose_shift = 32 - (bits - 2)
+
+    @staticmethod
+    def _hashes(history, data):
+        """
+        Gear-хэши позиций data блоками GEAR_BLOCK_SIZE
+
+        Args:
+            history: До GEAR_WINDOW - 1 байтов потока перед data
+        """
+        parts = []
+        for offset in range(0, len(data), GEAR_BLOCK_SIZE):
+            block = data[offset:offset + GEAR_BLOCK_SIZE]
+            context = history if offset == 0 else data[max(0, offset - GEAR_WINDOW + 1):offset]
+            padding = GEAR_BLOCK_SIZE - len(block)
+            if padding and len(context) == GEAR_WINDOW - 1:
+                # Хвост дополняется до полного блока ради кэша масок;
+                # хэши позиций зависят только от предыдущих байтов
+                hashes = gear_hashes(context + block + bytes(padding))[:-4 * padding]
+            else:
+                hashes = gear_hashes(context + block)
+            parts.append(hashes[4 * len(context):])
+        return b''.join(parts)
+
+    @staticmethod
+    def _find(top, hashes, start, end, shift):
+        """Первая позиция в [start, end), где хэш >> shift == 0 (-1 - нет)"""
+        position = top.find(b'\x00', start, end)
+        while position >= 0:
+            if int.from_bytes(hashes[4 * position:4 * position + 4], 'little') >> shift == 0:
+                return position
+            position = top.find(b'\x00', position + 1, end)
+        return -1
+
+    def _cut(self, top, hashes, start, end):
+        """Конец куска, начинающегося в start (end - конец данных)"""
+        if end - start <= self.min_size:
+            return end
+        limit = min(end, start + self.max_size)
+        normal = min(start + self.avg_size, limit)
+
+        # Граница после позиции p - кусок заканчивается на p + 1
+        found = self._find(top, hashes, start + self.min_size - 1, normal - 1, self._strict_shift)
+        if found >= 0:
+            return found + 1
+        found = self._find(top, hashes, normal - 1, limit - 1, self._loose_shift)
+        if found >= 0:
+            return found + 1
+        return limit
+
+    def chunks(self, f):
+        """
+        Куски файла по порядку
+
+        Args:
+            f: Файл (открыт на чтение в двоичном режиме)
+
+        Yields:
+            Куски (bytes)
+        """
+        buffer = hashes = top = b''
+        history = b''
+        position = 0
+        eof = False
+        while True:
+            # Хэш причинный (зависит только от прошлых байтов), поэтому
+            # достаточно max_size данных впереди, чтобы решить о границе
+            while not eof and len(buffer) - position < self.max_size:
+                data = f.read(self.read_size)
+                if not data:
+                    eof = True
+                    break
+                data_hashes = self._hashes(history, data)
+                history = (history + data)[-(GEAR_WINDOW - 1):]
+                buffer = buffer[position:] + data
+                hashes = hashes[4 * position:] + data_hashes
+                top = top[position:] + data_hashes[3::4]
+                position = 0
+
+            if position >= len(buffer):
+                return
+            cut = self._cut(top, hashes, position, len(buffer))
+            yield buffer[position:cut]
+            position = cut
+
+
+class ChunkStore:
+    """
+    Хранилище зашифрованных кусков: objects/<ид[:2]>/<ид>
+
+    Идентификатор - HMAC-SHA256 куска на ключе хранилища: одинаковые
+    куски дают один объект, но по имени объекта нельзя проверить
+    догадку о содержимом без ключа. Объект: флаг сжатия (1 байт) |
+    nonce (12) | AES-256-GCM (данные) | тег (16), AAD - идентификатор.
+
+    Объект записывается во временный файл, fsync, переименовывается и
+    fsync каталога - к записи рецепта все его куски уже на диске.
+    Поэтому существующий объект считается целым и повторно не читается;
+    повреждение обнаружит get() при восстановлении.
+    """
+
+    NONCE_SIZE = 12
+    TAG_SIZE = 16
+
+    def __init__(self, root, key, level=6):
+        """
+        Args:
+            root: Каталог хранилища
+            key: Ключ хранилища (из пароля и соли хранилища)
+            level: Уровень zlib (0 - не сжимать)
+        """
+        self.root = Path(root)
+        self.level = level
+        self._id_key = hmac.new(key, b"SVX-CHUNK-ID", 'sha256').digest()
+        self._enc_key = hmac.new(key, b"SVX-CHUNK-KEY", 'sha256').digest()
+
+    def chunk_id(self, data):
+        """Идентификатор куска (hex)"""
+        return hmac.new(self._id_key, data, 'sha256').hexdigest()
+
+    def path(self, chunk_id):
+        """Путь объекта куска"""
+        return self.root / 'objects' / chunk_id[:2] / chunk_id
+
+    def put(self, data):
+        """
+        Сохранение куска, если такого еще нет
+
+        Returns:
+            Кортеж (идентификатор, записано байт - 0 для уже известного куска)
+        """
+        chunk_id = self.chunk_id(data)
+        path = self.path(chunk_id)
+        if path.exists():
+            return chunk_id, 0
+
+        flag, body = b'\x00', data
+        if self.level:
+            compressed = zlib.compress(data, self.level)
+            if len(compressed) < len(data):
+                flag, body = b'\x01', compressed
+
+        nonce = get_random_bytes(self.NONCE_SIZE)
+        cipher = AES.new(self._enc_key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(bytes.fromhex(chunk_id))
+        ciphertext, tag = cipher.encrypt_and_digest(body)
+        record = flag + nonce + ciphertext + tag
+
+        # Атомарно: параллельная запись того же куска не оставит обрывок
+        created = not path.parent.exists()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if created:
+            _fsync_directory(path.parent.parent)
+        temp_path = path.with_name(f"{chunk_id}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        _fsync_directory(path.parent)
+        return chunk_id, len(record)
+
+    def get(self, chunk_id):
+        """
+        Чтение и расшифровка куска
+
+        Raises:
+            ValueError: Объекта нет, он поврежден или подменен
+        """
+        flag, body = self._open(chunk_id)
+        if flag == b'\x01':
+            body = zlib.decompress(body)
+        if not hmac.compare_digest(self.chunk_id(body), chunk_id):
+            raise ValueError(f"Кусок {chunk_id} не совпадает со своим идентификатором")
+        return body
+
+    def _open(self, chunk_id):
+        """
+        Чтение объекта и проверка тега GCM
+
+        Returns:
+            Кортеж (флаг сжатия, расшифрованное тело)
+
+        Raises:
+            ValueError: Объекта нет, он обрезан или поврежден
+        """
+        try:
+            with open(self.path(chunk_id), 'rb') as f:
+                record = f.read()
+        except FileNotFoundError:
+            raise ValueError(f"Нет куска {chunk_id}")
+
+        if len(record) < 1 + self.NONCE_SIZE + self.TAG_SIZE:
+            raise ValueError(f"Кусок {chunk_id} обрезан")
+        nonce = record[1:1 + self.NONCE_SIZE]
+        cipher = AES.new(self._enc_key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(bytes.fromhex(chunk_id))
+        try:
+            body = cipher.decrypt_and_verify(record[1 + self.NONCE_SIZE:-self.TAG_SIZE],
+                                             record[-self.TAG_SIZE:])
+        except ValueError:
+            raise ValueError(f"Кусок {chunk_id} поврежден")
+        return record[:1], body
+
+# ============================================================================
+# ЯДРО ШИФРОВАНИЯ MEGA-PRO
+# ============================================================================
+
+class SuperVaultX:
+    """
+    Супер-шифровальщик файлов с паролями из 10000 строк
+    Использует AES-256 + PBKDF2 + HMAC
+    """
+    
+    VERSION = "5.0.0"
+    AUTHOR = "thetemirbolatov"
+    YEAR = 2025
+    
+    def __init__(self, mega_password_lines=10000):
+        """
+        Инициализация супер-шифровальщика
+        
+        Args:
+            mega_password_lines: Количество строк в мега-пароле (по умолчанию 10000)
+        """
+        self.MAGIC_HEADER = b"SUPER_VAULT_X_V5\x00"
+        self.MAGIC_HEADER_V6 = b"SUPER_VAULT_X_V6\x00"  # Сегментированный AEAD контейнер
+        # Те же форматы с телом bz2/lzma: прежние версии знают только zlib и
+        # по флагу was_compressed выдали бы сжатые байты как открытый текст,
+        # поэтому такие контейнеры получают магию, которую они отвергают
+        self.MAGIC_HEADER_V5C = b"SUPER_VAULT_X_V5C\x00"
+        self.MAGIC_HEADER_V6C = b"SUPER_VAULT_X_V6C\x00"
+        # Контейнеры с листьями дерева хэшей в хвосте после тела: прежние
+        # версии считали бы хвост шифротекстом и сообщали о неверном пароле
+        self.MAGIC_HEADER_V5T = b"SUPER_VAULT_X_V5T\x00"
+        self.MAGIC_HEADER_V6T = b"SUPER_VAULT_X_V6T\x00"
+        self.MAGIC_MANIFEST = b"SUPER_VAULT_X_MAN\x00"  # Манифест инкрементального хранилища
+        self.MANIFEST_NAME = "MANIFEST.svxm"
+        
+        # Хранилище кусков с дедупликацией
+        self.MAGIC_CHUNK_STORE = b"SUPER_VAULT_X_CAS\x00"
+        self.MAGIC_RECIPE = b"SUPER_VAULT_X_RCP\x00"
+        self.CHUNK_STORE_NAME = "STORE.svxs"
+        self.CHUNK_AVG_SIZE = 1024 * 1024  # Средний размер куска
+        self.HEADER_SIZE = 2048  # Большой заголовок для метаданных
+        self.PASSWORD_LINES = mega_password_lines
+        self.ENCRYPTION_ALGO = "AES-256-CBC-PBKDF2-HMAC"
+        
+        # AEAD для контейнера V6: короткое имя → название в заголовке
+        self.AEAD_ALGORITHMS = {
+            "AES-256-GCM": "AES-256-GCM-PBKDF2-SEGMENTED",
+            "CHACHA20-POLY1305": "CHACHA20-POLY1305-PBKDF2-SEGMENTED"
+        }
+        self.AEAD_ALGORITHM = V6_DEFAULT_AEAD  # AEAD по умолчанию для V6
+        self.MIN_USER_WORDS = 1
+        self.PASSWORD_BATCH_SIZE = 1000  # Строк пароля в одной пачке генерации
+        self.PASSWORD_STREAM_LINES = 100000  # С какого числа строк писать пароль сразу на диск
+        self.PASSWORD_MMAP_THRESHOLD = 1024 * 1024  # С какого размера файл пароля читается через mmap
+        # Кэш разобранных файлов пароля - только по явному включению:
+        # пароль в нем живет до истечения TTL или clear_password_cache()
+        self.PASSWORD_CACHE_SIZE = 0  # Файлов пароля в кэше (0 - не кэшировать)
+        self.PASSWORD_CACHE_TTL = 300  # Секунд жизни пароля в кэше
+        self._password_cache = OrderedDict()  # (путь, размер, mtime) → (PasswordHandle, срок)
+        self._password_cache_lock = threading.Lock()
+
+        # Потоковый режим
+        self.STREAM_CHUNK_SIZE = 1024 * 1024  # Размер куска чтения/записи
+        self.STREAMING_THRESHOLD = 64 * 1024 * 1024  # С какого размера включать автоматически
+        self.DECRYPT_WORKERS = os.cpu_count() or 1  # Потоков для дешифрования CBC
+        
+        # Контейнер V6
+        self.CONTAINER_VERSION = 5  # Версия по умолчанию для новых файлов
+        self.SEGMENT_SIZE = 1024 * 1024  # Открытых данных в одном сегменте
+        self.ENCRYPT_WORKERS = os.cpu_count() or 1  # Параллельное шифрование сегментов и сжатие zlib
+        self.DIRECTORY_WORKERS = os.cpu_count() or 1  # Файлов каталога, шифруемых одновременно
+        self.USE_PROCESS_POOL = False  # Процессы вместо потоков
+        
+        # Хэш открытых данных в заголовке (original_hash)
+        self.FILE_HASH_ALGORITHM = 'sha3_512'
+        
+        # Буфер перезаписи при безопасном удалении
+        self.SHRED_BUFFER_SIZE = 1024 * 1024
+        
+        # Фоновое удаление оригиналов: журнал переживает сбой процесса
+        self.ASYNC_SHRED = False  # По умолчанию encrypt_file ждет удаления
+        self.SHRED_WORKERS = 1
+        self.SHRED_JOURNAL = Path.home() / '.supervaultx' / 'shred_journal.jsonl'
+        self._shred_queue = None
+        self._shred_queue_lock = threading.Lock()
+        
+        # Дерево хэшей шифротекста для проверки без пароля и выборочной проверки
+        self.INTEGRITY_HASH = 'blake2b'  # 'blake2b', 'blake2s' или None
+        self.MERKLE_CHUNK_SIZE = 1024 * 1024
+        
+        # Адаптивное сжатие: профиль из COMPRESSION_PROFILES
+        self.COMPRESSION_PROFILE = 'balanced'
+        
+        # Кэш ключей PBKDF2: проверка и дешифрование одного архива
+        # не повторяют 100000 итераций. KEY_CACHE_SIZE и KEY_CACHE_TTL -
+        # свойства key_context, их изменение действует сразу
+        self.key_context = KeyDerivationContext()
+        self.KEY_CACHE_SIZE = 32
+        self.KEY_CACHE_TTL = 600  # секунд
+
+        # Словари для генерации пароля
+        self.DICTIONARIES = {
+            "tech_words": [
+                "квантовый", "шифр", "алгоритм", "протокол", "нейронный",
+                "биометрический", "защита", "безопасность", "крипто",
+                "хэш", "блокчейн", "энтропия", "шифрование", "дешифровка",
+                "аутентификация", "авторизация", "инкапсуляция", "полиморфизм"
+            ],
+            "nature_words": [
+                "огонь", "вода", "земля", "воздух", "металл",
+                "дерево", "звезда", "планета", "галактика", "космос",
+                "океан", "вулкан", "тайфун", "торнадо", "землетрясение"
+            ],
+            "power_words": [
+                "сила", "мощь", "энергия", "поток", "заряд",
+                "импульс", "волна", "вибрация", "резонанс", "гравитация",
+                "магнетизм", "электричество", "плазма", "сингулярность"
+            ],
+            "secure_words": [
+                "тайна", "секрет", "пароль", "ключ", "замок",
+                "сейф", "хранилище", "убежище", "крепость", "бункер",
+                "броня", "щит", "доспех", "лабиринт", "головоломка"
+            ],
+            "mythology_words": [
+                "дракон", "феникс", "единорог", "грифон", "кентавр",
+                "пегас", "сатир", "циклоп", "гарпия", "минотавр",
+                "сирена", "василиск", "гидра", "химера", "левиафан"
+            ],
+            "science_words": [
+                "атом", "молекула", "ген", "клетка", "вирус",
+                "бактерия", "фермент", "гормон", "нейрон", "синапс",
+                "кварк", "бозон", "фермион", "лептон", "глюон"
+            ]
+        }
+        
+        # Спецсимволы для усиления пароля
+        self.SPECIAL_CHARS = "!@#$%^&*()_+-=[]{}|;:,.<>?/~`"
+        
+        # Логирование
+        self.log_messages = []
+        self._operation = threading.local()  # Время начала - свое у каждого потока
+        
+    @property
+    def operation_start_time(self):
+        """Начало текущей операции (в потоке, который ее выполняет)"""
+        return getattr(self._operation, 'start_time', None)
+    
+    @operation_start_time.setter
+    def operation_start_time(self, value):
+        self._operation.start_time = value
+    
+    @property
+    def KEY_CACHE_SIZE(self):
+        """Максимум ключей PBKDF2 в кэше key_context (0 - без кэша)"""
+        return self.key_context.max_entries
+    
+    @KEY_CACHE_SIZE.setter
+    def KEY_CACHE_SIZE(self, value):
+        self.key_context.configure(max_entries=value)
+    
+    @property
+    def KEY_CACHE_TTL(self):
+        """Время жизни ключа PBKDF2 в кэше key_context (секунд)"""
+        return self.key_context.ttl
+    
+    @KEY_CACHE_TTL.setter
+    def KEY_CACHE_TTL(self, value):
+        self.key_context.configure(ttl=value)
+    
+    def log(self, message, level="INFO"):
+        """Логирование операций"""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log_entry = f"[{timestamp}] [{level}] {message}"
+        self.log_messages.append(log_entry)
+        print(log_entry)
+        
+    def create_mega_password(self, user_words, user_dates=None, personal_info=None, 
+                            use_dictionaries=True, add_timestamps=True):
+        """
+        Создание мега-пароля из N строк
+        
+        Args:
+            user_words: Список слов от пользователя
+            user_dates: Список дат от пользователя
+            personal_info: Словарь с персональной информацией
+            use_dictionaries: Использовать встроенные словари
+            add_timestamps: Добавлять временные метки
+            
+        Returns:
+            Кортеж (пароль_текст, хэш_пароля, статистика)
+        """
+        self.log(f"Создание мега-пароля из {self.PASSWORD_LINES} строк...")
+        
+        if not user_words or len(user_words) < self.MIN_USER_WORDS:
+            raise ValueError(f"Нужно минимум {self.MIN_USER_WORDS} слово от пользователя")
+        
+        user_words = [str(w).strip() for w in user_words if str(w).strip()]
+        if user_dates:
+            user_dates = [str(d).strip() for d in user_dates if str(d).strip()]
+        
+        stats = {
+            "total_lines": self.PASSWORD_LINES,
+            "user_words": len(user_words),
+            "user_dates": len(user_dates) if user_dates else 0,
+            "dictionary_words_used": 0,
+            "special_chars_used": 0,
+            "timestamps_added": 0
+        }
+        
+        # Генерация пароля пачками из общего буфера CSPRNG
+        generator = MegaPasswordGenerator(
+            user_words, user_dates, personal_info,
+            dictionaries=self.DICTIONARIES if use_dictionaries else None,
+            special_chars=self.SPECIAL_CHARS,
+            add_timestamps=add_timestamps
+        )
+        
+        password_lines = []
+        for batch in generator.batches(self.PASSWORD_LINES, self.PASSWORD_BATCH_SIZE):
+            password_lines.extend(batch)
+            
+            # Прогресс
+            self.log(f"Сгенерировано строк: {len(password_lines)}/{self.PASSWORD_LINES}")
+        
+        stats.update(generator.stats)
+        
+        password_text = "\n".join(password_lines)
+        
+        # Мульти-хэширование для безопасности
+        sha512_hash = hashlib.sha512(password_text.encode('utf-8')).hexdigest()
+        blake2b_hash = hashlib.blake2b(password_text.encode('utf-8')).hexdigest()
+        
+        # Комбинированный хэш
+        combined_hash = self._combined_password_hash(sha512_hash, blake2b_hash)
+        
+        self.log(f"Мега-пароль создан! Всего символов: {len(password_text):,}")
+        self.log(f"Статистика: {stats}")
+        
+        return password_text, combined_hash, stats
+    
+    def _combined_password_hash(self, sha512_hash, blake2b_hash):
+        """Комбинированный хэш мега-пароля из SHA-512 и BLAKE2b (hex)"""
+        return hashlib.sha3_512(
+            (sha512_hash + blake2b_hash).encode('utf-8')
+        ).hexdigest()
+    
+    def create_mega_password_file(self, original_filename, user_words, user_dates=None,
+                                  personal_info=None, use_dictionaries=True,
+                                  add_timestamps=True):
+        """
+        Потоковое создание мега-пароля сразу в файле пароля
+        
+        Строки генерируются пачками и тут же пишутся в файл, а SHA-512,
+        BLAKE2b и SHA3-512 считаются по ходу записи, поэтому память не
+        зависит от числа строк. Файл того же формата, что и у
+        save_password_to_file, только статистика идет после маркера
+        конца пароля (до генерации она неизвестна).
+        
+        Args:
+            original_filename: Исходный файл (имя и папка файла пароля)
+            user_words: Список слов от пользователя
+            user_dates: Список дат от пользователя
+            personal_info: Словарь с персональной информацией
+            use_dictionaries: Использовать встроенные словари
+            add_timestamps: Добавлять временные метки
+            
+        Returns:
+            Кортеж (путь_к_файлу, PasswordHandle, хэш_пароля, статистика)
+        """
+        self.log(f"Потоковое создание мега-пароля из {self.PASSWORD_LINES} строк...")
+        
+        if not user_words or len(user_words) < self.MIN_USER_WORDS:
+            raise ValueError(f"Нужно минимум {self.MIN_USER_WORDS} слово от пользователя")
+        
+        user_words = [str(w).strip() for w in user_words if str(w).strip()]
+        if user_dates:
+            user_dates = [str(d).strip() for d in user_dates if str(d).strip()]
+        
+        stats = {
+            "total_lines": self.PASSWORD_LINES,
+            "user_words": len(user_words),
+            "user_dates": len(user_dates) if user_dates else 0,
+            "dictionary_words_used": 0,
+            "special_chars_used": 0,
+            "timestamps_added": 0
+        }
+        
+        generator = MegaPasswordGenerator(
+            user_words, user_dates, personal_info,
+            dictionaries=self.DICTIONARIES if use_dictionaries else None,
+            special_chars=self.SPECIAL_CHARS,
+            add_timestamps=add_timestamps
+        )
+        
+        hashers = [hashlib.sha512(), hashlib.blake2b(), hashlib.sha3_512()]
+        head = bytearray()  # Начало пароля: короткий пароль нужен целиком
+        size = 0
+        written = 0
+        
+        password_path = self._password_file_path(original_filename)
+        try:
+            with open(password_path, 'wb') as f:
+                self._write_password_preamble(f, original_filename)
+                password_offset = f.tell()
+                
+                for batch in generator.batches(self.PASSWORD_LINES, self.PASSWORD_BATCH_SIZE):
+                    chunk = "\n".join(batch).encode('utf-8')
+                    if written:
+                        chunk = b"\n" + chunk
+                    for hasher in hashers:
+                        hasher.update(chunk)
+                    if size <= PasswordHandle.HMAC_BLOCK_SIZE:
+                        head += chunk[:PasswordHandle.HMAC_BLOCK_SIZE + 1 - size]
+                    f.write(chunk)
+                    size += len(chunk)
+                    written += len(batch)
+                    
+                    self.log(f"Сгенерировано строк: {written}/{self.PASSWORD_LINES}")
+                
+                stats.update(generator.stats)
+                self._write_password_ending(f, stats)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(password_path):
+                os.remove(password_path)
+            raise
+        
+        sha512, blake2b, sha3_512 = hashers
+        if size <= PasswordHandle.HMAC_BLOCK_SIZE:
+            password = PasswordHandle(bytes(head))
+        else:
+            password = PasswordHandle.from_digests(size, sha3_512.hexdigest(), sha512.digest(),
+                                                   source=(str(password_path), password_offset))
+        _zeroize(head)
+        
+        combined_hash = self._combined_password_hash(sha512.hexdigest(), blake2b.hexdigest())
+        
+        self.log(f"Мега-пароль создан! Всего байт: {size:,}")
+        self.log(f"Файл с паролем сохранен: {password_path}")
+        self.log(f"Статистика: {stats}")
+        
+        return str(password_path), password, combined_hash, stats
+    
+    def _legacy_password_lines(self, user_words, user_dates=None, personal_info=None,
+                               use_dictionaries=True, add_timestamps=True):
+        """
+        Прежний построчный генератор (random.choice на каждый символ)
+        
+        Оставлен только как точка отсчета для benchmark_password_generation.
+        """
+        for i in range(self.PASSWORD_LINES):
+            line_parts = [user_words[i % len(user_words)]]
+            
+            if user_dates and i % 3 == 0:
+                line_parts.append(user_dates[i % len(user_dates)])
+            
+            if use_dictionaries:
+                for dict_name, words in self.DICTIONARIES.items():
+                    if random.random() > 0.6:
+                        line_parts.append(random.choice(words))
+            
+            if personal_info:
+                for key, value in personal_info.items():
+                    if random.random() > 0.8:
+                        line_parts.append(f"{key}_{value}")
+            
+            random_len = random.randint(12, 32)
+            line_parts.append(''.join(
+                random.choice(string.ascii_letters + string.digits + self.SPECIAL_CHARS)
+                for _ in range(random_len)
+            ))
+            
+            if random.random() > 0.7:
+                math_ops = ["+", "-", "*", "/", "=", "≈", "≠", ">", "<"]
+                line_parts.append(f"{random.randint(1, 9999)}{random.choice(math_ops)}{random.randint(1, 9999)}")
+            
+            if random.random() > 0.5:
+                line_parts.append(f"0x{secrets.token_hex(random.randint(2, 8))}")
+            
+            separator = random.choice(["_", "-", ".", "|", ":", "#", "~", "•", "→", "⇨"])
+            line = separator.join(line_parts)
+            
+            if add_timestamps:
+                timestamp = int(time.time() * 1000000) + i
+                yield f"L{i+1:06d}_T{timestamp}_N{secrets.randbits(64)}_{line}"
+            else:
+                yield f"L{i+1:06d}_{line}"
+    
+    def benchmark_password_generation(self, lines=None, repeats=3):
+        """
+        Сравнение пакетного генератора с прежним построчным
+        
+        Args:
+            lines: Количество строк (None - PASSWORD_LINES)
+            repeats: Повторов, берется лучшее время
+        
+        Returns:
+            Словарь со временем обоих генераторов и ускорением
+        """
+        user_words = ["alpha", "beta", "gamma"]
+        user_dates = ["2025-01-01", "2025-12-31"]
+        personal_info = {"city": "Moscow"}
+        
+        saved_lines = self.PASSWORD_LINES
+        if lines is not None:
+            self.PASSWORD_LINES = lines
+        
+        try:
+            def best_time(run):
+                times = []
+                for _ in range(max(1, repeats)):
+                    started = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - started)
+                return min(times)
+            
+            def legacy():
+                "\n".join(self._legacy_password_lines(user_words, user_dates, personal_info))
+            
+            def bulk():
+                generator = MegaPasswordGenerator(
+                    user_words, user_dates, personal_info,
+                    dictionaries=self.DICTIONARIES, special_chars=self.SPECIAL_CHARS
+                )
+                "\n".join(line for batch in generator.batches(self.PASSWORD_LINES, self.PASSWORD_BATCH_SIZE)
+                          for line in batch)
+            
+            legacy_time = best_time(legacy)
+            bulk_time = best_time(bulk)
+            
+            return {
+                'lines': self.PASSWORD_LINES,
+                'legacy_time': legacy_time,
+                'bulk_time': bulk_time,
+                'speedup': legacy_time / bulk_time if bulk_time > 0 else 0,
+                'lines_per_sec': self.PASSWORD_LINES / bulk_time if bulk_time > 0 else 0
+            }
+        finally:
+            self.PASSWORD_LINES = saved_lines
+    
+    def read_password_from_file(self, password_file):
+        """
+        Чтение пароля из файла
+        
+        При PASSWORD_CACHE_SIZE > 0 результат кэшируется по (путь,
+        размер, mtime) на PASSWORD_CACHE_TTL секунд: пакетное
+        дешифрование с одним файлом пароля разбирает его один раз.
+        Пароль в кэше хранится в PasswordHandle и затирается при
+        вытеснении, истечении срока и clear_password_cache().
+        
+        Args:
+            password_file: Путь к файлу с паролем
+            
+        Returns:
+            Текст пароля или None в случае ошибки
+        """
+        try:
+            if not os.path.exists(password_file):
+                self.log(f"Файл пароля не существует: {password_file}", "ERROR")
+                return None
+            
+            st = os.stat(password_file)
+            cache_key = (os.path.realpath(password_file), st.st_size, st.st_mtime_ns)
+            
+            password = None
+            with self._password_cache_lock:
+                self._expire_password_cache()
+                cached = self._password_cache.get(cache_key)
+                if cached is not None:
+                    self._password_cache.move_to_end(cache_key)
+                    password = cached[0].text
+            
+            if password is None:
+                password = self._parse_password_file(password_file, st.st_size)
+                
+                if not password:
+                    self.log("Не удалось найти пароль в файле", "ERROR")
+                    return None
+                
+                if self.PASSWORD_CACHE_SIZE > 0 and self.PASSWORD_CACHE_TTL > 0:
+                    expires = time.monotonic() + self.PASSWORD_CACHE_TTL
+                    with self._password_cache_lock:
+                        previous = self._password_cache.pop(cache_key, None)
+                        if previous is not None:
+                            previous[0].wipe()
+                        self._password_cache[cache_key] = (PasswordHandle(password), expires)
+                        while len(self._password_cache) > self.PASSWORD_CACHE_SIZE:
+                            self._password_cache.popitem(last=False)[1][0].wipe()
+            
+            # Проверяем количество строк
+            line_count = password.count('\n') + 1
+            self.log(f"Прочитан пароль из {line_count} строк")
+            
+            if line_count < 100:
+                self.log(f"Внимание: пароль содержит только {line_count} строк (ожидается 10000)", "WARNING")
+            
+            return password
+            
+        except Exception as e:
+            self.log(f"Ошибка чтения пароля: {str(e)}", "ERROR")
+            return None
+    
+    def clear_password_cache(self):
+        """Забыть все разобранные файлы пароля (пароли затираются)"""
+        with self._password_cache_lock:
+            for handle, _ in self._password_cache.values():
+                handle.wipe()
+            self._password_cache.clear()
+    
+    def _expire_password_cache(self):
+        """Затирание просроченных паролей кэша (под _password_cache_lock)"""
+        now = time.monotonic()
+        for key in [key for key, (_, expires) in self._password_cache.items() if expires <= now]:
+            self._password_cache.pop(key)[0].wipe()
+    
+    def _parse_password_file(self, password_file, size):
+        """
+        Разбор файла пароля за один проход
+        
+        Находит байтовые смещения маркеров START и END и декодирует
+        только пароль между ними (большие файлы - через mmap). Если
+        маркеров нет, применяются прежние эвристики по всему файлу.
+        
+        Returns:
+            Текст пароля ('' если не найден)
+        """
+        with open(password_file, 'rb') as f:
+            if size >= self.PASSWORD_MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    password = self._extract_marked_password(mm)
+                    if password is None:
+                        password = self._find_password_heuristic(self._decode_password_text(mm[:]))
+            else:
+                data = f.read()
+                password = self._extract_marked_password(data)
+                if password is None:
+                    password = self._find_password_heuristic(self._decode_password_text(data))
+        
+        # Убираем конечные разделители
+        while password.endswith("=" * 80):
+            password = password[:-(80)].strip()
+        
+        return password
+    
+    @staticmethod
+    def _decode_password_text(data):
+        """Байты файла пароля → текст с переводами строк '\\n'"""
+        text = bytes(data).decode('utf-8', errors='ignore')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+    
+    def _extract_marked_password(self, data):
+        """
+        Пароль между маркерами START и END
+        
+        Args:
+            data: Содержимое файла (bytes или mmap)
+            
+        Returns:
+            Текст пароля или None, если маркер начала не найден
+            либо между маркерами пусто
+        """
+        start = data.find(b"START OF PASSWORD")
+        if start < 0:
+            return None
+        start = data.find(b"\n", start)
+        if start < 0:
+            return None
+        start += 1
+        
+        # Конец - первая строка с END, которая не разделитель
+        # и не повторный маркер начала
+        end = len(data)
+        position = start
+        while True:
+            marker = data.find(b"END OF PASSWORD", position)
+            if marker < 0:
+                break
+            line_start = data.rfind(b"\n", start, marker) + 1 or start
+            line_end = data.find(b"\n", marker)
+            if line_end < 0:
+                line_end = len(data)
+            line = data[line_start:line_end]
+            if not line.startswith(b"=" * 20) and b"START OF PASSWORD" not in line:
+                end = line_start
+                break
+            position = line_end
+        
+        lines = self._decode_password_text(data[start:end]).split('\n')
+        separator = "=" * 20
+        password = '\n'.join(
+            line for line in lines
+            if line.strip() and not line.startswith(separator) and "START OF PASSWORD" not in line
+        ).strip()
+        return password or None
+    
+    def _find_password_heuristic(self, content):
+        """Поиск пароля в файле без маркеров (старые и поврежденные файлы)"""
+        lines = content.split('\n')
+        
+        # Ищем строки, похожие на пароль (содержат L000001_T и т.д.)
+        password_lines = [line for line in lines if "L000001_" in line and len(line) > 20]
+        
+        # Если все еще нет, берем все строки после определенной точки
+        if not password_lines:
+            # Ищем любые строки, которые выглядят как пароль
+            for i, line in enumerate(lines):
+                if len(line) > 10 and not line.startswith("File:") and not line.startswith("Size:") and not line.startswith("Created:"):
+                    # Проверяем, содержит ли строка типичные элементы пароля
+                    if any(marker in line for marker in ["_T", "_N", "L0", "|", ":", "#"]):
+                        password_lines = lines[i:]
+                        break
+        
+        return '\n'.join(password_lines).strip()
+    
+    def save_password_to_file(self, password_text, original_filename, stats=None):
+        """
+        Сохранение пароля в файл
+        
+        Args:
+            password_text: Текст пароля или PasswordHandle
+            original_filename: Исходный файл
+            stats: Статистика генерации
+            
+        Returns:
+            Путь к сохраненному файлу
+        """
+        if isinstance(password_text, PasswordHandle):
+            password_text = password_text.text
+        
+        password_path = self._password_file_path(original_filename)
+        
+        with open(password_path, 'wb') as f:
+            self._write_password_preamble(f, original_filename, stats)
+            
+            # Сам пароль - ВАЖНО: без дополнительных символов!
+            f.write(password_text.encode('utf-8'))
+            
+            self._write_password_ending(f)
+        
+        self.log(f"Файл с паролем сохранен: {password_path}")
+        return str(password_path)
+    
+    def _password_file_path(self, original_filename):
+        """Путь SUPER_PASSWORD_<имя>_<время>.txt рядом с исходным файлом"""
+        original_path = Path(original_filename)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")  # С микросекундами
+        
+        # Имя файла с паролем
+        password_filename = f"SUPER_PASSWORD_{original_path.stem}_{timestamp}.txt"
+        return original_path.parent / password_filename
+    
+    def _write_password_stats(self, f, stats):
+        """Блок статистики генерации в файле пароля"""
+        lines = ["", "📊 PASSWORD GENERATION STATISTICS:"]
+        lines += [f"{key}: {value}" for key, value in stats.items()]
+        lines += ["", "=" * 80, ""]
+        f.write("\n".join(lines).encode('utf-8'))
+    
+    def _write_password_preamble(self, f, original_filename, stats=None):
+        """Шапка файла пароля до маркера начала (f открыт в режиме 'wb')"""
+        original_path = Path(original_filename)
+        
+        # Метаданные
+        file_size = os.path.getsize(original_filename) if os.path.exists(original_filename) else 0
+        
+        # Более простой формат без рамок, чтобы легче было читать
+        lines = [
+            "=" * 80,
+            "SUPER PASSWORD FILE",
+            "=" * 80,
+            f"File: {original_path.name}",
+            f"Size: {file_size:,} bytes",
+            f"Created: {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}",
+            f"Author: {self.AUTHOR} © {self.YEAR}",
+            f"Version: {self.VERSION}",
+            "=" * 80,
+            "",
+        ]
+        
+        # Предупреждения
+        lines += [
+            "⚠️ IMPORTANT WARNINGS:",
+            "1. SAVE THIS FILE IN A SECURE PLACE!",
+            "2. Without this file, recovery is IMPOSSIBLE!",
+            "3. Never store the password with the encrypted file!",
+            "4. Make multiple copies on different media!",
+            "5. Password consists of 10000 unique lines!",
+            "6. Each line contains a timestamp and unique ID!",
+            "",
+            "🚨 LOST PASSWORD = LOST DATA 🚨",
+            "",
+            "=" * 80,
+            "",
+        ]
+        f.write("\n".join(lines).encode('utf-8'))
+        
+        # Статистика
+        if stats:
+            self._write_password_stats(f, stats)
+        
+        # Маркер начала пароля
+        f.write(("\n🚀 START OF PASSWORD 🚀\n" + "=" * 80 + "\n\n").encode('utf-8'))
+    
+    def _write_password_ending(self, f, stats=None, lines=None):
+        """Маркер конца пароля (и статистика потоковой генерации после него)"""
+        f.write((
+            f"\n\n{'=' * 80}\n"
+            f"🎯 END OF PASSWORD - {lines or self.PASSWORD_LINES} LINES GENERATED 🎯\n"
+            f"{'=' * 80}\n"
+        ).encode('utf-8'))
+        if stats:
+            self._write_password_stats(f, stats)
+    
+    def save_password_keyfile(self, password_text, original_filename):
+        """
+        Сохранение пароля в компактный двоичный файл ключа
+        
+        Пароль из create_mega_password_file (в памяти только хэши)
+        копируется потоково из его текстового файла.
+        
+        Args:
+            password_text: Текст пароля или PasswordHandle
+            original_filename: Исходный файл
+            
+        Returns:
+            Путь к сохраненному файлу (SUPER_PASSWORD_*.svxkey)
+        
+        Raises:
+            ValueError: Байтов пароля нет ни в памяти, ни в файле
+        """
+        keyfile_path = self._password_file_path(original_filename).with_suffix(KEYFILE_SUFFIX)
+        write_keyfile(keyfile_path, password_text)
+        
+        self.log(f"Файл ключа сохранен: {keyfile_path}")
+        return str(keyfile_path)
+    
+    def load_password_keyfile(self, keyfile_path):
+        """
+        Загрузка пароля из двоичного файла ключа
+        
+        Args:
+            keyfile_path: Путь к файлу ключа
+            
+        Returns:
+            PasswordHandle или None в случае ошибки
+        """
+        try:
+            password = read_keyfile(keyfile_path)
+        except (OSError, ValueError) as e:
+            self.log(f"Ошибка чтения файла ключа: {str(e)}", "ERROR")
+            return None
+        
+        self.log(f"Прочитан файл ключа: {len(password):,} байт пароля")
+        return password
+    
+    def load_password(self, password_file):
+        """
+        Загрузка пароля из файла ключа или текстового файла пароля
+        
+        Args:
+            password_file: Путь к .svxkey или SUPER_PASSWORD_*.txt
+            
+        Returns:
+            PasswordHandle или None в случае ошибки
+        """
+        if is_keyfile(password_file):
+            return self.load_password_keyfile(password_file)
+        
+        password = self.read_password_from_file(password_file)
+        return PasswordHandle(password) if password else None
+    
+    def convert_password_to_keyfile(self, password_file, keyfile_path=None):
+        """
+        Текстовый файл пароля → двоичный файл ключа
+        
+        Args:
+            password_file: Путь к SUPER_PASSWORD_*.txt
+            keyfile_path: Куда сохранить (по умолчанию рядом, с расширением .svxkey)
+            
+        Returns:
+            Путь к файлу ключа или None в случае ошибки
+        """
+        password = self.read_password_from_file(password_file)
+        if not password:
+            return None
+        
+        if keyfile_path is None:
+            keyfile_path = Path(password_file).with_suffix(KEYFILE_SUFFIX)
+        write_keyfile(keyfile_path, password)
+        
+        self.log(f"Файл ключа сохранен: {keyfile_path}")
+        return str(keyfile_path)
+    
+    def convert_keyfile_to_password(self, keyfile_path, password_file=None):
+        """
+        Двоичный файл ключа → текстовый файл пароля
+        
+        Args:
+            keyfile_path: Путь к .svxkey
+            password_file: Куда сохранить (по умолчанию рядом, с расширением .txt)
+            
+        Returns:
+            Путь к файлу пароля или None в случае ошибки
+        """
+        password = self.load_password_keyfile(keyfile_path)
+        if password is None:
+            return None
+        
+        if password_file is None:
+            password_file = Path(keyfile_path).with_suffix('.txt')
+        
+        try:
+            data = password.data
+            with open(password_file, 'wb') as f:
+                self._write_password_preamble(f, Path(keyfile_path).with_suffix(''))
+                f.write(data)
+                self._write_password_ending(f, lines=data.count(b'\n') + 1)
+        finally:
+            password.wipe()
+        
+        self.log(f"Файл с паролем сохранен: {password_file}")
+        return str(password_file)
+    
+    def calculate_file_hash(self, filepath, algorithm='sha3_512'):
+        """Расчет хэша файла"""
+        if not os.path.exists(filepath):
+            return "FILE_NOT_FOUND"
+        
+        hasher = hashlib.new(algorithm)
+        try:
+            with open(filepath, 'rb') as f:
+                # Читаем большими блоками для больших файлов
+                for chunk in iter(lambda: f.read(self.STREAM_CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+            return hasher.hexdigest()
+        except Exception as e:
+            return f"ERROR_{str(e)}"
+    
+    def encrypt_file(self, input_file, password_text, delete_original=True, 
+                    secure_delete_passes=7, compress_before_encrypt=True,
+                    streaming=None, container_version=None, workers=None,
+                    algorithm=None, compression_profile=None, async_delete=None,
+                    salt=None):
+        """
+        Шифрование файла
+        
+        Args:
+            input_file: Путь к файлу для шифрования
+            password_text: Мега-пароль (текст или PasswordHandle)
+            delete_original: Удалить оригинал после шифрования
+            secure_delete_passes: Количество проходов безопасного удаления
+            compress_before_encrypt: Сжать перед шифрованием
+            streaming: Потоковый режим с постоянным расходом памяти
+                       (None - автоматически для файлов больше STREAMING_THRESHOLD)
+            container_version: 5 (AES-CBC) или 6 (сегменты AEAD, всегда потоково)
+                               (None - CONTAINER_VERSION, или 6 если задан algorithm)
+            workers: Потоков для шифрования сегментов V6 и сжатия zlib
+                     (None - ENCRYPT_WORKERS)
+            algorithm: AEAD для V6 - "AES-256-GCM" или "CHACHA20-POLY1305"
+                       (None - AEAD_ALGORITHM)
+            compression_profile: Профиль сжатия fast/balanced/compact/max
+                                 (None - COMPRESSION_PROFILE). Кодек выбирается
+                                 по выборке файла, несжимаемые данные не сжимаются
+            async_delete: Удалять оригинал в фоне через shred_queue, ID задания
+                          возвращается в shred_job_id (None - ASYNC_SHRED)
+            salt: Соль PBKDF2 (None - новая случайная). Общая соль пакета файлов
+                  дает один вывод ключа на весь пакет; шифротексты различаются
+                  за счет случайного IV/nonce каждого файла
+            
+        Returns:
+            Словарь с результатами
+        """
+        self.operation_start_time = time.time()
+        self.log(f"НАЧАЛО ШИФРОВАНИЯ: {input_file}")
+        _begin_peak_rss()
+        password_text = PasswordHandle.of(password_text)
+        encrypted_path = None
+        
+        try:
+            # Проверки
+            if not CRYPTO_AVAILABLE:
+                return {
+                    'success': False,
+                    'error': 'Криптографические библиотеки не установлены. Установите: pip install pycryptodome'
+                }
+            
+            if not os.path.exists(input_file):
+                return {'success': False, 'error': 'Файл не существует'}
+            
+            if algorithm is not None and algorithm not in self.AEAD_ALGORITHMS:
+                return {'success': False, 'error': f'Неизвестный алгоритм: {algorithm}'}
+            
+            if container_version is None:
+                container_version = 6 if algorithm else self.CONTAINER_VERSION
+            if container_version not in (5, 6):
+                return {'success': False, 'error': f'Неизвестная версия контейнера: {container_version}'}
+            if algorithm and container_version != 6:
+                return {'success': False, 'error': 'Алгоритмы AEAD доступны только в контейнере V6'}
+            
+            if algorithm is None:
+                algorithm = self.AEAD_ALGORITHM
+            
+            if compression_profile is None:
+                compression_profile = self.COMPRESSION_PROFILE
+            if compression_profile not in COMPRESSION_PROFILES:
+                return {'success': False, 'error': f'Неизвестный профиль сжатия: {compression_profile}'}
+            
+            if workers is None:
+                workers = self.ENCRYPT_WORKERS
+            
+            if streaming is None:
+                streaming = os.path.getsize(input_file) > self.STREAMING_THRESHOLD
+            
+            # Сегменты V6 всегда обрабатываются потоково
+            if container_version == 6:
+                streaming = True
+            
+            # Выбор кодека по сигнатуре и энтропии выборки
+            codec, level = 'none', 0
+            if compress_before_encrypt and os.path.getsize(input_file) > 1024:
+                codec, level, entropy = select_codec(input_file, compression_profile)
+                if entropy is None:
+                    self.log("Сжатие: пропущено (формат уже сжат)")
+                else:
+                    self.log(f"Сжатие: {codec} (уровень {level}), энтропия {entropy:.2f} бит/байт")
+            
+            # Имя зашифрованного файла
+            original_path = Path(input_file)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            encrypted_filename = f"ENCRYPTED_{original_path.stem}_{timestamp}.svx"
+            encrypted_path = self._reserve_output_path(original_path.parent / encrypted_filename)
+            
+            if streaming:
+                stream_result = self._encrypt_file_streaming(
+                    input_file, encrypted_path, password_text,
+                    secure_delete_passes, codec, level,
+                    container_version, workers, algorithm, salt
+                )
+                if not stream_result['success']:
+                    self._release_output_path(encrypted_path)
+                    return stream_result
+                
+                header = stream_result['header']
+                original_size = header['original_size']
+                encrypted_size = stream_result['encrypted_size']
+                codec = header['codec']
+                compression_ratio = header['compression_ratio']
+            else:
+                # Чтение исходного файла
+                with open(input_file, 'rb') as f:
+                    original_data = f.read()
+                
+                original_size = len(original_data)
+                self.log(f"Размер файла: {original_size:,} байт")
+                
+                if original_size == 0:
+                    self._release_output_path(encrypted_path)
+                    return {'success': False, 'error': 'Файл пустой'}
+                
+                # Сжатие (опционально)
+                data_to_encrypt = original_data
+                compression_ratio = 1.0
+                if codec != 'none':
+                    try:
+                        executor = self._make_executor(workers)
+                        try:
+                            compressed_data = compress_bytes(codec, level, original_data,
+                                                             executor, workers)
+                        finally:
+                            if executor is not None:
+                                executor.shutdown()
+                        compression_ratio = len(compressed_data) / original_size if original_size > 0 else 1
+                        self.log(f"Сжатие: {original_size:,} → {len(compressed_data):,} байт ({compression_ratio:.2%})")
+                        data_to_encrypt = compressed_data
+                    except:
+                        codec = 'none'
+                        compression_ratio = 1.0
+                    
+                    # Выборка ошиблась - храним как есть
+                    if len(data_to_encrypt) >= original_size:
+                        data_to_encrypt = original_data
+                        codec = 'none'
+                        compression_ratio = 1.0
+                
+                # Генерация криптографических параметров
+                if salt is None:
+                    salt = secrets.token_bytes(32)  # 256 бит соли
+                iv = get_random_bytes(16)       # 128 бит IV
+                
+                # Создание ключа через PBKDF2 (100000 итераций, 256 бит)
+                key = self.derive_key(password_text, salt)
+                
+                # Шифрование AES-256 CBC
+                cipher = AES.new(key, AES.MODE_CBC, iv)
+                padded_data = pad(data_to_encrypt, AES.block_size)
+                encrypted_data = cipher.encrypt(padded_data)
+                
+                # HMAC для аутентификации
+                authenticator = V5TagAuthenticator()
+                authenticator.update(encrypted_data)
+                hmac_tag = authenticator.finalize(salt, iv, key)
+                
+                # Дерево хэшей шифротекста
+                tree = None
+                executor = self._make_executor(workers)
+                try:
+                    tree = self._new_merkle_tree(executor, workers)
+                    if tree is not None:
+                        view = memoryview(encrypted_data)
+                        for i in range(0, len(view), self.STREAM_CHUNK_SIZE):
+                            tree.update(view[i:i + self.STREAM_CHUNK_SIZE])
+                finally:
+                    if executor is not None:
+                        executor.shutdown()
+                
+                # Создание заголовка
+                header = self._build_header(
+                    input_file, password_text, original_size, len(encrypted_data),
+                    codec, compression_ratio, secure_delete_passes,
+                    {
+                        'salt': base64.b64encode(salt).decode('ascii'),
+                        'iv': base64.b64encode(iv).decode('ascii'),
+                        'hmac_tag': base64.b64encode(hmac_tag).decode('ascii')
+                    },
+                    original_hash=hashlib.new(self.FILE_HASH_ALGORITHM, original_data).hexdigest()
+                )
+                
+                leaves_tail = b''
+                if tree is not None:
+                    leaves_tail = self._attach_merkle(
+                        header, tree, self.HEADER_SIZE + len(hmac_tag) + len(encrypted_data))
+                
+                # Сериализация заголовка
+                padded_header = self._encode_header(header)
+                if padded_header is None:
+                    self._release_output_path(encrypted_path)
+                    return {'success': False, 'error': 'Заголовок слишком большой'}
+                
+                # Сборка финального файла
+                final_data = padded_header + hmac_tag + encrypted_data + leaves_tail
+                
+                # Сохранение зашифрованного файла
+                with open(encrypted_path, 'wb') as f:
+                    f.write(final_data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                encrypted_size = len(final_data)
+            
+            self.log(f"Файл зашифрован: {encrypted_path}")
+            self.log(f"Итоговый размер: {encrypted_size:,} байт (x{encrypted_size / original_size:.2f})")
+            
+            # Безопасное удаление оригинала (контейнер уже на диске после fsync)
+            shred_job_id = None
+            if async_delete is None:
+                async_delete = self.ASYNC_SHRED
+            if delete_original and async_delete:
+                shred_job_id = self.shred_queue.submit(input_file, secure_delete_passes)
+                self.log(f"Оригинал поставлен в очередь удаления: {shred_job_id}")
+            elif delete_original:
+                self.log(f"Безопасное удаление оригинала ({secure_delete_passes} проходов)...")
+                self.secure_delete_file(input_file, passes=secure_delete_passes)
+            
+            return self._encryption_result(encrypted_path, header, encrypted_size,
+                                           streaming, container_version, shred_job_id)
+            
+        except Exception as e:
+            self.log(f"Ошибка шифрования: {str(e)}", "ERROR")
+            if encrypted_path is not None:
+                self._release_output_path(encrypted_path)
+            import traceback
+            traceback.print_exc()
+            return {
+                'success': False,
+                'error': f'Ошибка шифрования: {str(e)}'
+            }
+        finally:
+            _end_peak_rss()
+    
+    def _reserve_output_path(self, path):
+        """
+        Занять имя выходного файла (создать пустой файл с O_EXCL)
+        
+        Одновременные шифрования файлов с одинаковым именем в одну
+        секунду получают разные имена (_1, _2, ...) вместо перезаписи.
+        
+        Returns:
+            Занятый путь (Path)
+        """
+        path = Path(path)
+        candidate = path
+        counter = 1
+        while True:
+            try:
+                os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                return candidate
+            except FileExistsError:
+                candidate = path.with_name(f"{path.stem}_{counter}{path.suffix}")
+                counter += 1
+    
+    def _release_output_path(self, path):
+        """Освободить занятое имя, если в файл так ничего и не записано"""
+        try:
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+        except OSError:
+            pass
+    
+    def _encryption_result(self, encrypted_path, header, encrypted_size, streaming,
+                           container_version, shred_job_id=None):
+        """Словарь результата шифрования по заголовку готового контейнера"""
+        original_size = header['original_size']
+        codec = header['codec']
+        
+        # Расчет времени
+        elapsed_time = time.time() - self.operation_start_time
+        
+        result = {
+            'success': True,
+            'encrypted_file': str(encrypted_path),
+            'password_file': None,  # Будет заполнено позже
+            'original_size': original_size,
+            'encrypted_size': encrypted_size,
+            'compression_ratio': header['compression_ratio'] if codec != 'none' else 1.0,
+            'encryption_ratio': encrypted_size / original_size if original_size > 0 else 1,
+            'was_compressed': codec != 'none',
+            'codec': codec,
+            'shred_job_id': shred_job_id,
+            'streaming': streaming,
+            'container_version': container_version,
+            'peak_rss_bytes': _end_peak_rss(),
+            'elapsed_time': elapsed_time,
+            'speed_mbps': (original_size / elapsed_time / 1024 / 1024) if elapsed_time > 0 else 0,
+            'header_info': {
+                'algorithm': header['algorithm'],
+                'timestamp': header['timestamp'],
+                'hash': header['password_hash'][:32] + '...'
+            }
+        }
+        
+        self.log(f"Шифрование завершено за {elapsed_time:.2f} секунд")
+        return result
+    
+    def _encrypt_file_streaming(self, input_file, encrypted_path, password_text,
+                                secure_delete_passes, codec='zlib', level=9,
+                                container_version=5, workers=1, aead=V6_DEFAULT_AEAD,
+                                salt=None):
+        """
+        Потоковое шифрование: файл читается кусками по STREAM_CHUNK_SIZE,
+        сжимается, шифруется и сразу пишется в .svx. Заголовок
+        дописывается в начало файла после обработки всех данных.
+        
+        Returns:
+            Словарь с заголовком и итоговым размером
+        """
+        original_size = os.path.getsize(input_file)
+        self.log(f"Размер файла: {original_size:,} байт (потоковый режим, V{container_version})")
+        
+        if original_size == 0:
+            return {'success': False, 'error': 'Файл пустой'}
+        
+        def feed(sink):
+            with open(input_file, 'rb') as src:
+                for chunk in iter(lambda: src.read(self.STREAM_CHUNK_SIZE), b''):
+                    sink.write(chunk)
+        
+        result = self._encrypt_stream(
+            feed, input_file, encrypted_path, password_text, secure_delete_passes,
+            codec, level, container_version, workers, aead, salt
+        )
+        
+        if result['header']['original_size'] != original_size:
+            self.log(f"Внимание: файл изменился во время чтения ({result['header']['original_size']} != {original_size})", "WARNING")
+        
+        return result
+    
+    def _encrypt_stream(self, feed, source_file, encrypted_path, password_text,
+                        secure_delete_passes, codec='zlib', level=9,
+                        container_version=5, workers=1, aead=V6_DEFAULT_AEAD,
+                        salt=None):
+        """
+        Конвейер сжатие → шифрование → запись в .svx для любого источника
+        
+        Args:
+            feed: Функция feed(sink), которая пишет все открытые данные
+                  в sink.write() (файл, ZIP-поток каталога, ...)
+            source_file: Путь, имя которого записывается в заголовок
+                         (original_name - имя восстановленного файла)
+            salt: Соль PBKDF2 (None - новая случайная)
+        
+        Returns:
+            Словарь с заголовком и итоговым размером
+        """
+        # Генерация криптографических параметров
+        if salt is None:
+            salt = secrets.token_bytes(32)
+        
+        key = self.derive_key(password_text, salt)
+        
+        executor = self._make_executor(workers)
+        
+        # Дерево хэшей строится по шифротексту по мере записи
+        tree = self._new_merkle_tree(executor, workers)
+        
+        try:
+            with open(encrypted_path, 'wb') as out:
+                body = HashingWriter(out, tree) if tree is not None else out
+                
+                if container_version == 6:
+                    # Место под заголовок, дальше - записи сегментов
+                    out.write(b'\x00' * self.HEADER_SIZE)
+                    
+                    nonce_prefix = get_random_bytes(V6_NONCE_PREFIX_SIZE)
+                    encryptor = SVXSegmentEncryptor(
+                        body, key, nonce_prefix, self.MAGIC_HEADER_V6 + salt,
+                        codec=codec,
+                        level=level,
+                        segment_size=self.SEGMENT_SIZE,
+                        executor=executor,
+                        batch=workers,
+                        aead=aead
+                    )
+                else:
+                    # Место под заголовок и HMAC
+                    out.write(b'\x00' * (self.HEADER_SIZE + 32))
+                    
+                    iv = get_random_bytes(16)
+                    encryptor = SVXStreamEncryptor(body, key, iv, salt, codec=codec, level=level,
+                                                   executor=executor, batch=workers)
+                
+                # Хэш оригинала считается по тем же кускам, без второго чтения
+                hasher = hashlib.new(self.FILE_HASH_ALGORITHM)
+                feed(HashingWriter(encryptor, hasher))
+                
+                if container_version == 6:
+                    segments = encryptor.close()
+                    trailer = b''
+                    magic = self.MAGIC_HEADER_V6
+                    algorithm = self.AEAD_ALGORITHMS[aead]
+                    crypto_fields = {
+                        'salt': base64.b64encode(salt).decode('ascii'),
+                        'nonce_prefix': base64.b64encode(nonce_prefix).decode('ascii'),
+                        'segment_size': self.SEGMENT_SIZE,
+                        'segments': segments
+                    }
+                    self.log(f"Сегментов V6: {segments:,} ({aead}, потоков: {workers})")
+                else:
+                    hmac_tag = encryptor.close()
+                    trailer = hmac_tag
+                    magic = self.MAGIC_HEADER
+                    algorithm = self.ENCRYPTION_ALGO
+                    crypto_fields = {
+                        'salt': base64.b64encode(salt).decode('ascii'),
+                        'iv': base64.b64encode(iv).decode('ascii'),
+                        'hmac_tag': base64.b64encode(hmac_tag).decode('ascii')
+                    }
+                
+                original_size = encryptor.bytes_in
+                if original_size == 0:
+                    raise ValueError('Нет данных для шифрования')
+                
+                compression_ratio = encryptor.bytes_compressed / original_size if codec != 'none' else 1.0
+                if codec != 'none':
+                    self.log(f"Сжатие: {original_size:,} → {encryptor.bytes_compressed:,} байт ({compression_ratio:.2%})")
+                
+                header = self._build_header(
+                    source_file, password_text, original_size, encryptor.bytes_out,
+                    codec, compression_ratio, secure_delete_passes,
+                    crypto_fields, magic=magic, algorithm=algorithm,
+                    original_hash=hasher.hexdigest()
+                )
+                
+                body_end = self.HEADER_SIZE + len(trailer) + encryptor.bytes_out
+                leaves_tail = b''
+                if tree is not None:
+                    leaves_tail = self._attach_merkle(header, tree, body_end)
+                
+                padded_header = self._encode_header(header)
+                if padded_header is None:
+                    raise ValueError('Заголовок слишком большой')
+                
+                # Листья дерева, не поместившиеся в заголовок - сразу за телом
+                out.write(leaves_tail)
+                out.seek(0)
+                out.write(padded_header + trailer)
+                out.flush()
+                os.fsync(out.fileno())
+                encrypted_size = body_end + len(leaves_tail)
+        except Exception:
+            # Не оставляем недописанный контейнер
+            if os.path.exists(encrypted_path):
+                os.remove(encrypted_path)
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        return {
+            'success': True,
+            'header': header,
+            'encrypted_size': encrypted_size
+        }
+    
+    def _build_header(self, input_file, password_text, original_size, encrypted_size,
+                      codec, compression_ratio, secure_delete_passes,
+                      crypto_fields, magic=None, algorithm=None, original_hash=None):
+        """
+        Создание заголовка контейнера
+        
+        Args:
+            codec: Кодек сжатия тела. Для кодеков кроме zlib магия V5/V6
+                   заменяется на V5C/V6C, которую прежние версии не открывают
+            crypto_fields: Параметры шифрования версии (соль, IV/nonce, тег...)
+            magic: Магическое число (по умолчанию V5)
+            algorithm: Название алгоритма (по умолчанию ENCRYPTION_ALGO)
+            original_hash: Хэш, посчитанный при чтении (None - прочитать файл заново)
+        """
+        if original_hash is None:
+            original_hash = self.calculate_file_hash(input_file, self.FILE_HASH_ALGORITHM)
+        
+        magic = magic or self.MAGIC_HEADER
+        if codec not in ('none', 'zlib'):
+            magic = self.MAGIC_HEADER_V6C if magic == self.MAGIC_HEADER_V6 else self.MAGIC_HEADER_V5C
+        
+        header = {
+            'magic': magic.hex(),
+            'version': self.VERSION,
+            'algorithm': algorithm or self.ENCRYPTION_ALGO,
+            'original_size': original_size,
+            'encrypted_size': encrypted_size
+        }
+        header.update(crypto_fields)
+        header.update({
+            'password_hash': PasswordHandle.of(password_text).sha3_512_hex,
+            'timestamp': datetime.now().isoformat(),
+            'original_name': Path(input_file).name,
+            'original_path': str(Path(input_file).absolute()),
+            'original_hash': original_hash,
+            'hash_algorithm': self.FILE_HASH_ALGORITHM,
+            'was_compressed': codec != 'none',
+            'codec': codec,
+            'compression_ratio': compression_ratio if codec != 'none' else 1.0,
+            'secure_delete_passes': secure_delete_passes,
+            'author': self.AUTHOR,
+            'year': self.YEAR
+        })
+        return header
+    
+    def derive_key(self, password_text, salt):
+        """Ключ AES-256 из пароля и соли через общий кэш key_context"""
+        return self.key_context.derive(password_text, salt)
+    
+    def _make_executor(self, workers):
+        """Пул для параллельной обработки (None - работать последовательно)"""
+        if not workers or workers <= 1:
+            return None
+        if self.USE_PROCESS_POOL:
+            return ProcessPoolExecutor(max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers)
+    
+    def _encode_header(self, header):
+        """
+        Сериализация заголовка в блок фиксированного размера
+        
+        Returns:
+            Байты длиной HEADER_SIZE или None, если заголовок не помещается
+        """
+        header_json = json.dumps(header, ensure_ascii=False, indent=2)
+        header_encoded = header_json.encode('utf-8')
+        
+        # Проверка размера заголовка
+        if len(header_encoded) > self.HEADER_SIZE:
+            return None
+        
+        # Дополнение заголовка
+        return header_encoded.ljust(self.HEADER_SIZE, b'\x00')
+    
+    def _new_merkle_tree(self, executor=None, workers=1):
+        """Дерево хэшей тела по настройкам INTEGRITY_HASH (None - выключено)"""
+        if not self.INTEGRITY_HASH:
+            return None
+        return MerkleTreeHasher(self.INTEGRITY_HASH, self.MERKLE_CHUNK_SIZE, executor, workers)
+    
+    def _attach_merkle(self, header, tree, body_end):
+        """
+        Запись дерева хэшей в заголовок
+        
+        Корень всегда в заголовке. Листья тоже, если помещаются
+        в HEADER_SIZE, иначе - в хвост контейнера сразу после тела
+        (смещение leaves_offset в заголовке): листья копируются,
+        переносятся и удаляются вместе с архивом. Контейнер с хвостом
+        получает магию V5T/V6T, чтобы прежние версии его отвергали.
+        
+        Args:
+            body_end: Смещение конца тела в контейнере
+        
+        Returns:
+            Байты хвоста для записи после тела (b'' - листья в заголовке)
+        """
+        root = tree.finalize()
+        leaves = b''.join(tree.leaves)
+        header['merkle'] = {
+            'algorithm': tree.algorithm,
+            'chunk_size': tree.chunk_size,
+            'chunks': len(tree.leaves),
+            'root': root.hex(),
+            'leaves': base64.b64encode(leaves).decode('ascii')
+        }
+        
+        if self._encode_header(header) is None:
+            del header['merkle']['leaves']
+            header['merkle']['leaves_offset'] = body_end
+            if self._container_version(header) == 6:
+                header['magic'] = self.MAGIC_HEADER_V6T.hex()
+            else:
+                header['magic'] = self.MAGIC_HEADER_V5T.hex()
+            return leaves
+        return b''
+    
+    def _body_end(self, header, file_size):
+        """Конец тела контейнера: начало хвоста с листьями дерева или конец файла"""
+        merkle = header.get('merkle') or {}
+        return int(merkle.get('leaves_offset', file_size))
+    
+    
+    def decrypt_file(self, encrypted_file, password_text, verify_integrity=True,
+                     streaming=None, workers=None):
+        """
+        Дешифрование файла
+        
+        Args:
+            encrypted_file: Зашифрованный файл (.svx)
+            password_text: Мега-пароль (текст или PasswordHandle)
+            verify_integrity: Проверять целостность
+            streaming: Потоковый режим с постоянным расходом памяти
+                       (None - автоматически для файлов больше STREAMING_THRESHOLD)
+            workers: Потоков для параллельного дешифрования
+                     (None - по числу ядер, 1 - последовательно)
+            
+        Контейнеры V6 всегда читаются потоково, теги сегментов
+        проверяются независимо от verify_integrity.
+            
+        Returns:
+            Словарь с результатами
+        """
+        self.operation_start_time = time.time()
+        self.log(f"НАЧАЛО ДЕШИФРОВАНИЯ: {encrypted_file}")
+        _begin_peak_rss()
+        password_text = PasswordHandle.of(password_text)
+        
+        try:
+            if not CRYPTO_AVAILABLE:
+                return {
+                    'success': False,
+                    'error': 'Криптографические библиотеки не установлены'
+                }
+            
+            if not os.path.exists(encrypted_file):
+                return {'success': False, 'error': 'Файл не существует'}
+            
+            if streaming is None:
+                streaming = os.path.getsize(encrypted_file) > self.STREAMING_THRESHOLD
+            
+            if workers is None:
+                workers = self.DECRYPT_WORKERS
+            
+            # Версия контейнера определяется по заголовку
+            header, error = self._read_header(encrypted_file)
+            if error:
+                return {'success': False, 'error': error}
+            
+            if self._container_version(header) == 6:
+                return self._decrypt_file_v6(encrypted_file, header, password_text, workers)
+            
+            if streaming:
+                return self._decrypt_file_streaming(encrypted_file, password_text,
+                                                    verify_integrity, workers)
+            
+            # Чтение зашифрованного файла
+            with open(encrypted_file, 'rb') as f:
+                file_data = f.read()
+            
+            if len(file_data) < self.HEADER_SIZE + 32 + 16:
+                return {'success': False, 'error': 'Файл поврежден или не является .svx файлом'}
+            
+            # Извлечение заголовка
+            header, error = self._parse_header(file_data[:self.HEADER_SIZE])
+            if error:
+                return {'success': False, 'error': error}
+            
+            # Проверка магического числа
+            if self._container_version(header) != 5:
+                return {'success': False, 'error': 'Неверный формат файла .svx'}
+            
+            # Проверка хэша пароля
+            password_hash = PasswordHandle.of(password_text).sha3_512_hex
+            if header.get('password_hash') != password_hash:
+                return {'success': False, 'error': 'Неверный пароль'}
+            
+            # Извлечение параметров
+            salt = base64.b64decode(header['salt'])
+            iv = base64.b64decode(header['iv'])
+            stored_hmac = base64.b64decode(header['hmac_tag'])
+            original_size = header['original_size']
+            codec = self._header_codec(header)
+            if codec is None:
+                return {'success': False, 'error': f"Неизвестный кодек сжатия: {header.get('codec')}"}
+            hash_algorithm = self._header_hash_algorithm(header)
+            if hash_algorithm is None:
+                return {'success': False, 'error': f"Неизвестный алгоритм хэша: {header.get('hash_algorithm')}"}
+            
+            # Извлечение зашифрованных данных (без копирования)
+            body_end = self._body_end(header, len(file_data))
+            encrypted_data = memoryview(file_data)[self.HEADER_SIZE + 32:body_end]  # Пропускаем HMAC
+            
+            # Ключ вычисляется один раз для проверки и дешифрования
+            key = self.derive_key(password_text, salt)
+            
+            # Проверка HMAC
+            if verify_integrity:
+                authenticator = V5TagAuthenticator()
+                authenticator.update(encrypted_data)
+                
+                if not authenticator.verify(stored_hmac, salt, iv, key):
+                    return {'success': False, 'error': 'Нарушена целостность файла'}
+            
+            # Дешифрование
+            executor = self._make_executor(workers)
+            try:
+                decrypted_padded = parallel_cbc_decrypt(key, iv, encrypted_data, executor,
+                                                        self.STREAM_CHUNK_SIZE)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            
+            try:
+                decrypted_data = unpad(decrypted_padded, AES.block_size)
+            except ValueError as e:
+                return {'success': False, 'error': f'Ошибка удаления padding: {str(e)}'}
+            
+            # Распаковка если нужно
+            if codec != 'none':
+                try:
+                    decompressed_data = decompress_bytes(codec, decrypted_data)
+                    self.log(f"Данные распакованы: {len(decrypted_data):,} → {len(decompressed_data):,} байт")
+                    decrypted_data = decompressed_data
+                except Exception as e:
+                    self.log(f"Ошибка распаковки: {str(e)}", "WARNING")
+            
+            # Восстановление имени файла
+            decrypted_path = self._decrypted_output_path(encrypted_file, header)
+            
+            # Сохранение дешифрованного файла
+            with open(decrypted_path, 'wb') as f:
+                f.write(decrypted_data)
+            
+            return self._finish_decrypt(
+                decrypted_path, header, len(decrypted_data), streaming=False,
+                decrypted_hash=hashlib.new(hash_algorithm, decrypted_data).hexdigest()
+            )
+            
+        except Exception as e:
+            self.log(f"Ошибка дешифрования: {str(e)}", "ERROR")
+            import traceback
+            traceback.print_exc()
+            return {
+                'success': False,
+                'error': f'Ошибка дешифрования: {str(e)}'
+            }
+        finally:
+            _end_peak_rss()
+    
+    def _decrypt_file_streaming(self, encrypted_file, password_text, verify_integrity,
+                                workers=1):
+        """
+        Потоковое дешифрование за один проход: каждый прочитанный кусок
+        одновременно идет в тег и в дешифровальщик. Открытые данные пишутся
+        во временный .part файл, который становится результатом только
+        после совпадения тега. Объем распакованных данных ограничен
+        размером из заголовка.
+        
+        Returns:
+            Словарь с результатами
+        """
+        file_size = os.path.getsize(encrypted_file)
+        if file_size < self.HEADER_SIZE + 32 + 16:
+            return {'success': False, 'error': 'Файл поврежден или не является .svx файлом'}
+        
+        with open(encrypted_file, 'rb') as f:
+            header_data = f.read(self.HEADER_SIZE)
+        
+        header, error = self._parse_header(header_data)
+        if error:
+            return {'success': False, 'error': error}
+        
+        # Проверка магического числа
+        if self._container_version(header) != 5:
+            return {'success': False, 'error': 'Неверный формат файла .svx'}
+        
+        # Проверка хэша пароля
+        password_hash = PasswordHandle.of(password_text).sha3_512_hex
+        if header.get('password_hash') != password_hash:
+            return {'success': False, 'error': 'Неверный пароль'}
+        
+        # Извлечение параметров
+        salt = base64.b64decode(header['salt'])
+        iv = base64.b64decode(header['iv'])
+        stored_hmac = base64.b64decode(header['hmac_tag'])
+        original_size = header['original_size']
+        codec = self._header_codec(header)
+        if codec is None:
+            return {'success': False, 'error': f"Неизвестный кодек сжатия: {header.get('codec')}"}
+        hash_algorithm = self._header_hash_algorithm(header)
+        if hash_algorithm is None:
+            return {'success': False, 'error': f"Неизвестный алгоритм хэша: {header.get('hash_algorithm')}"}
+        
+        self.log(f"Размер контейнера: {file_size:,} байт (потоковый режим)")
+        
+        # Ключ вычисляется один раз для проверки и дешифрования
+        key = self.derive_key(password_text, salt)
+        
+        decrypted_path = self._decrypted_output_path(encrypted_file, header)
+        partial_path = decrypted_path.with_name(decrypted_path.name + '.part')
+        
+        # Каждому потоку - по куску STREAM_CHUNK_SIZE за одно чтение
+        read_size = self.STREAM_CHUNK_SIZE * max(1, workers)
+        executor = self._make_executor(workers)
+        authenticator = V5TagAuthenticator() if verify_integrity else None
+        failure = None
+        
+        try:
+            with open(encrypted_file, 'rb') as src, open(partial_path, 'wb') as out:
+                chunks = _iter_file_chunks(src, self.HEADER_SIZE + 32, read_size,
+                                           end=self._body_end(header, file_size))
+                hashing_out = HashingWriter(out, hashlib.new(hash_algorithm))
+                decryptor = SVXStreamDecryptor(
+                    hashing_out, key, iv,
+                    codec=codec,
+                    max_output=original_size,
+                    chunk_size=self.STREAM_CHUNK_SIZE,
+                    executor=executor
+                )
+                try:
+                    for chunk in chunks:
+                        if authenticator is not None:
+                            authenticator.update(chunk)
+                        decryptor.write(chunk)
+                    decryptor.close()
+                except (ValueError, zlib.error) as e:
+                    failure = e
+                    # Дочитываем остаток, чтобы отличить подделку от сбоя
+                    if authenticator is not None:
+                        for chunk in chunks:
+                            authenticator.update(chunk)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        if authenticator is not None and not authenticator.verify(stored_hmac, salt, iv, key):
+            os.remove(partial_path)
+            return {'success': False, 'error': 'Нарушена целостность файла'}
+        
+        if failure is not None:
+            # Недописанный файл не оставляем
+            os.remove(partial_path)
+            return {'success': False, 'error': f'Ошибка потокового дешифрования: {str(failure)}'}
+        
+        os.replace(partial_path, decrypted_path)
+        
+        if codec != 'none':
+            self.log(f"Данные распакованы: {decryptor.bytes_decrypted:,} → {decryptor.bytes_out:,} байт")
+        
+        return self._finish_decrypt(decrypted_path, header, decryptor.bytes_out, streaming=True,
+                                    decrypted_hash=hashing_out.hasher.hexdigest())
+    
+    def _decrypt_file_v6(self, encrypted_file, header, password_text, workers=1):
+        """
+        Дешифрование контейнера V6: записи сегментов читаются пачками
+        по одной на поток, проверяются и расшифровываются параллельно,
+        открытые данные распаковываются с ограничением размера.
+        
+        Returns:
+            Словарь с результатами
+        """
+        # Проверка хэша пароля
+        password_hash = PasswordHandle.of(password_text).sha3_512_hex
+        if header.get('password_hash') != password_hash:
+            return {'success': False, 'error': 'Неверный пароль'}
+        
+        salt = base64.b64decode(header['salt'])
+        nonce_prefix = base64.b64decode(header['nonce_prefix'])
+        segment_size = int(header['segment_size'])
+        original_size = header['original_size']
+        codec = self._header_codec(header)
+        aead = self._v6_aead(header)
+        
+        if segment_size <= 0:
+            return {'success': False, 'error': 'Неверный размер сегмента в заголовке'}
+        if codec is None:
+            return {'success': False, 'error': f"Неизвестный кодек сжатия: {header.get('codec')}"}
+        if aead is None:
+            return {'success': False, 'error': f"Неизвестный алгоритм: {header.get('algorithm')}"}
+        hash_algorithm = self._header_hash_algorithm(header)
+        if hash_algorithm is None:
+            return {'success': False, 'error': f"Неизвестный алгоритм хэша: {header.get('hash_algorithm')}"}
+        
+        self.log(f"Контейнер V6: {header.get('segments', '?')} сегментов (потоков: {workers})")
+        
+        key = self.derive_key(password_text, salt)
+        
+        decrypted_path = self._decrypted_output_path(encrypted_file, header)
+        partial_path = decrypted_path.with_name(decrypted_path.name + '.part')
+        read_size = (segment_size + V6_TAG_SIZE) * max(1, workers)
+        executor = self._make_executor(workers)
+        
+        try:
+            body_end = self._body_end(header, os.path.getsize(encrypted_file))
+            with open(encrypted_file, 'rb') as src, open(partial_path, 'wb') as out:
+                hashing_out = HashingWriter(out, hashlib.new(hash_algorithm))
+                writer = BoundedDecompressor(hashing_out, codec, original_size, self.STREAM_CHUNK_SIZE)
+                decryptor = SVXSegmentDecryptor(
+                    writer, key, nonce_prefix, self.MAGIC_HEADER_V6 + salt,
+                    segment_size=segment_size,
+                    executor=executor,
+                    batch=workers,
+                    aead=aead
+                )
+                for chunk in _iter_file_chunks(src, self.HEADER_SIZE, read_size, end=body_end):
+                    decryptor.write(chunk)
+                decryptor.close()
+        except (ValueError, zlib.error) as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return {'success': False, 'error': f'Нарушена целостность файла: {str(e)}'}
+        except BaseException:
+            # Ошибка диска, пула или прерывание - недописанный файл не оставляем
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        os.replace(partial_path, decrypted_path)
+        
+        if codec != 'none':
+            self.log(f"Данные распакованы: {writer.bytes_in:,} → {writer.bytes_out:,} байт")
+        
+        return self._finish_decrypt(decrypted_path, header, writer.bytes_out, streaming=True,
+                                    decrypted_hash=hashing_out.hasher.hexdigest())
+    
+    def _finish_decrypt(self, decrypted_path, header, decrypted_size, streaming,
+                        decrypted_hash=None):
+        """
+        Проверка размера и хэша восстановленного файла, сборка результата
+        
+        Args:
+            decrypted_hash: Хэш, посчитанный при записи (None - прочитать файл заново)
+        
+        Returns:
+            Словарь с результатами
+        """
+        original_size = header['original_size']
+        
+        # Проверка размера
+        if decrypted_size != original_size:
+            self.log(f"Предупреждение: размер не совпадает ({decrypted_size} != {original_size})", "WARNING")
+        
+        # Проверка хэша
+        if decrypted_hash is None:
+            decrypted_hash = self.calculate_file_hash(str(decrypted_path), self._header_hash_algorithm(header))
+        original_hash = header.get('original_hash', '')
+        
+        if original_hash and decrypted_hash != original_hash:
+            self.log(f"Внимание: хэши не совпадают! Файл может быть поврежден.", "WARNING")
+        
+        elapsed_time = time.time() - self.operation_start_time
+        
+        result = {
+            'success': True,
+            'decrypted_file': str(decrypted_path),
+            'original_size': original_size,
+            'decrypted_size': decrypted_size,
+            'hash_match': decrypted_hash == original_hash if original_hash else None,
+            'hash_algorithm': self._header_hash_algorithm(header),
+            'original_hash': original_hash,
+            'decrypted_hash': decrypted_hash,
+            'elapsed_time': elapsed_time,
+            'was_compressed': self._header_codec(header) != 'none',
+            'codec': self._header_codec(header),
+            'streaming': streaming,
+            'peak_rss_bytes': _end_peak_rss(),
+            'header_info': {
+                'original_name': header.get('original_name'),
+                'timestamp': header.get('timestamp'),
+                'algorithm': header.get('algorithm')
+            }
+        }
+        
+        self.log(f"Дешифрование завершено за {elapsed_time:.2f} секунд")
+        return result
+    
+    def _read_header(self, encrypted_file):
+        """
+        Чтение и разбор только заголовка контейнера
+        
+        Returns:
+            Кортеж (заголовок, ошибка) - одно из значений None
+        """
+        with open(encrypted_file, 'rb') as f:
+            header_data = f.read(self.HEADER_SIZE)
+        
+        if len(header_data) < self.HEADER_SIZE:
+            return None, 'Файл поврежден или не является .svx файлом'
+        
+        return self._parse_header(header_data)
+    
+    def _parse_header(self, header_data):
+        """
+        Разбор JSON заголовка контейнера
+        
+        Returns:
+            Кортеж (заголовок, ошибка) - одно из значений None
+        """
+        null_pos = header_data.find(b'\x00')
+        if null_pos == -1:
+            null_pos = len(header_data)
+        
+        try:
+            return json.loads(header_data[:null_pos].decode('utf-8')), None
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return None, f'Неверный формат заголовка: {str(e)}'
+    
+    def _container_version(self, header):
+        """Версия контейнера по магии заголовка: 5, 6 или None"""
+        magic = header.get('magic')
+        if magic in (self.MAGIC_HEADER.hex(), self.MAGIC_HEADER_V5C.hex(), self.MAGIC_HEADER_V5T.hex()):
+            return 5
+        if magic in (self.MAGIC_HEADER_V6.hex(), self.MAGIC_HEADER_V6C.hex(), self.MAGIC_HEADER_V6T.hex()):
+            return 6
+        return None
+    
+    def _header_codec(self, header):
+        """
+        Кодек сжатия тела по заголовку (None если неизвестен)
+        
+        Заголовки до появления поля codec знают только was_compressed (zlib).
+        """
+        codec = header.get('codec')
+        if codec is None:
+            return 'zlib' if header.get('was_compressed', False) else 'none'
+        return codec if codec in COMPRESSION_CODECS else None
+    
+    def _header_hash_algorithm(self, header):
+        """
+        Алгоритм original_hash по заголовку (None если неизвестен)
+        
+        Заголовки до появления поля hash_algorithm хэшировались SHA3-512.
+        """
+        algorithm = header.get('hash_algorithm', 'sha3_512')
+        return algorithm if algorithm in hashlib.algorithms_available else None
+    
+    def _decrypted_output_path(self, encrypted_file, header):
+        """Имя для дешифрованного файла рядом с контейнером"""
+        original_name = header.get('original_name', 'decrypted_file')
+        original_path = Path(encrypted_file)
+        
+        # Создание имени для дешифрованного файла
+        if 'ENCRYPTED_' in original_path.stem:
+            base_name = original_path.stem.replace('ENCRYPTED_', 'DECRYPTED_')
+        else:
+            base_name = f"DECRYPTED_{original_path.stem}"
+        
+        # Добавление расширения если нужно
+        if '.' not in base_name and '.' in original_name:
+            ext = original_name.split('.')[-1]
+            decrypted_filename = f"{base_name}.{ext}"
+        else:
+            decrypted_filename = base_name
+        
+        return original_path.parent / decrypted_filename
+    
+    def secure_delete_file(self, filepath, passes=7):
+        """
+        Безопасное удаление файла с перезаписью
+        
+        Файл перезаписывается на месте (r+b) одним буфером
+        SHRED_BUFFER_SIZE, память не зависит от размера файла.
+        Случайные проходы берутся из потока AES-256-CTR со случайным ключом.
+        
+        Args:
+            filepath: Путь к файлу
+            passes: Количество проходов перезаписи
+        
+        Returns:
+            True, если все проходы выполнены
+        """
+        if not os.path.exists(filepath):
+            return False
+        
+        file_size = os.path.getsize(filepath)
+        
+        # None - случайные данные
+        patterns = [
+            b'\x00',  # Нули
+            b'\xFF',  # Единицы
+            b'\xAA',  # 10101010
+            b'\x55',  # 01010101
+            None,     # Случайные данные
+            b'\x00',  # Еще нули
+            None,     # Еще случайные данные
+        ]
+        
+        buffer = bytearray(min(self.SHRED_BUFFER_SIZE, file_size) or 1)
+        view = memoryview(buffer)
+        zeros = memoryview(bytes(len(buffer)))
+        
+        try:
+            with open(filepath, 'r+b') as f:
+                for i in range(min(passes, len(patterns))):
+                    self.log(f"Проход безопасного удаления {i+1}/{passes}")
+                    
+                    pattern = patterns[i]
+                    keystream = None
+                    if pattern is not None:
+                        buffer[:] = pattern * len(buffer)
+                    elif CRYPTO_AVAILABLE:
+                        keystream = AES.new(secrets.token_bytes(32), AES.MODE_CTR,
+                                            nonce=secrets.token_bytes(8))
+                    
+                    f.seek(0)
+                    remaining = file_size
+                    while remaining > 0:
+                        size = min(remaining, len(buffer))
+                        if keystream is not None:
+                            # Шифрование нулей дает поток ключа, сразу в буфер
+                            keystream.encrypt(zeros[:size], output=view[:size])
+                        elif pattern is None:
+                            buffer[:size] = secrets.token_bytes(size)
+                        f.write(view[:size])
+                        remaining -= size
+                    
+                    f.flush()
+                    os.fsync(f.fileno())
+            
+            # Финальное удаление
+            os.remove(filepath)
+            self.log(f"Файл безопасно удален: {filepath}")
+            return True
+            
+        except Exception as e:
+            self.log(f"Ошибка безопасного удаления: {str(e)}", "WARNING")
+            # Пробуем обычное удаление
+            try:
+                os.remove(filepath)
+            except:
+                pass
+            return False
+    
+    @property
+    def shred_queue(self):
+        """Очередь фонового удаления; при первом обращении продолжает задания из журнала"""
+        with self._shred_queue_lock:
+            if self._shred_queue is None:
+                self._shred_queue = ShredQueue(self.SHRED_JOURNAL, self.secure_delete_file,
+                                               self.SHRED_WORKERS, log=self.log)
+            return self._shred_queue
+    
+    def wait_for_shredding(self, job_id=None, timeout=None):
+        """
+        Ожидание фонового удаления
+        
+        Args:
+            job_id: ID задания (None - все задания очереди)
+            timeout: Максимальное время ожидания в секундах
+        
+        Returns:
+            Словарь {ID задания: результат (None - не завершено)}
+        """
+        if job_id is not None:
+            return {job_id: self.shred_queue.wait(job_id, timeout)}
+        return self.shred_queue.drain(timeout)
+    
+    def encrypt_directory(self, directory_path, password_text, 
+                         include_subdirs=True, create_single_archive=True,
+                         workers=None):
+        """
+        Шифрование всей директории
+        
+        Args:
+            directory_path: Путь к директории
+            password_text: Мега-пароль (текст или PasswordHandle)
+            include_subdirs: Включать поддиректории
+            create_single_archive: Создать единый архив
+            workers: Файлов одновременно без единого архива
+                     (None - DIRECTORY_WORKERS, см. iter_encrypt_directory)
         
-        Args:
-            user_words: Список слов от пользователя
-            user_dates: Список дат от пользователя
-            personal_info: Словарь с персональной информацией
-            use_dictionaries: Использовать встроенные словари
-            add_timestamps: Добавлять временные метки
-            
         Returns:
-            Кортеж (пароль_текст, хэш_пароля, статистика)
+            Словарь с результатами
         """
-        self.log(f"Создание мега-пароля из {self.PASSWORD_LINES} строк...")
+        if not os.path.isdir(directory_path):
+            return {'success': False, 'error': 'Не является директорией'}
         
-        if not user_words or len(user_words) < self.MIN_USER_WORDS:
-            raise ValueError(f"Нужно минимум {self.MIN_USER_WORDS} слово от пользователя")
+        self.log(f"Шифрование директории: {directory_path}")
         
-        user_words = [str(w).strip() for w in user_words if str(w).strip()]
-        if user_dates:
-            user_dates = [str(d).strip() for d in user_dates if str(d).strip()]
+        # Пароль кодируется и хэшируется один раз на всю директорию
+        password_text = PasswordHandle.of(password_text)
         
-        password_lines = []
-        stats = {
-            "total_lines": self.PASSWORD_LINES,
-            "user_words": len(user_words),
-            "user_dates": len(user_dates) if user_dates else 0,
-            "dictionary_words_used": 0,
-            "special_chars_used": 0,
-            "timestamps_added": 0
-        }
+        # Создание архива если нужно
+        if create_single_archive:
+            try:
+                return self._encrypt_directory_archive(directory_path, password_text)
+            except Exception as e:
+                self.log(f"Ошибка создания архива: {str(e)}", "ERROR")
+                return {'success': False, 'error': str(e)}
         
-        # Генерация пароля
-        for i in range(self.PASSWORD_LINES):
-            line_parts = []
-            
-            # 1. Слово пользователя (циклически)
-            word_idx = i % len(user_words)
-            line_parts.append(user_words[word_idx])
-            
-            # 2. Дата пользователя (каждые 3 строки)
-            if user_dates and i % 3 == 0:
-                date_idx = i % len(user_dates)
-                line_parts.append(user_dates[date_idx])
-                stats["user_dates"] = len(user_dates)
-            
-            # 3. Слова из словарей (случайно)
-            if use_dictionaries:
-                for dict_name, words in self.DICTIONARIES.items():
-                    if random.random() > 0.6:  # 40% вероятность
-                        line_parts.append(random.choice(words))
-                        stats["dictionary_words_used"] += 1
-            
-            # 4. Персональная информация
-            if personal_info:
-                for key, value in personal_info.items():
-                    if random.random() > 0.8:  # 20% вероятность
-                        line_parts.append(f"{key}_{value}")
-            
-            # 5. Случайная строка (8-32 символа)
-            random_len = random.randint(12, 32)
-            random_part = ''.join(
-                random.choice(string.ascii_letters + string.digits + self.SPECIAL_CHARS)
-                for _ in range(random_len)
-            )
-            line_parts.append(random_part)
-            stats["special_chars_used"] += 1
-            
-            # 6. Математические выражения (иногда)
-            if random.random() > 0.7:
-                math_ops = ["+", "-", "*", "/", "=", "≈", "≠", ">", "<"]
-                num1 = random.randint(1, 9999)
-                num2 = random.randint(1, 9999)
-                op = random.choice(math_ops)
-                math_expr = f"{num1}{op}{num2}"
-                line_parts.append(math_expr)
-            
-            # 7. Шестнадцатеричные числа
-            if random.random() > 0.5:
-                hex_num = secrets.token_hex(random.randint(2, 8))
-                line_parts.append(f"0x{hex_num}")
-            
-            # Сборка строки
-            separator = random.choice(["_", "-", ".", "|", ":", "#", "~", "•", "→", "⇨"])
-            line = separator.join(line_parts)
+        else:
+            # Шифрование каждого файла отдельно (результаты - по мере готовности)
+            results = []
+            total_size = 0
             
-            # Добавление номера строки и временной метки
-            if add_timestamps:
-                timestamp = int(time.time() * 1000000) + i  # Микросекунды
-                nano_time = secrets.randbits(64)
-                full_line = f"L{i+1:06d}_T{timestamp}_N{nano_time}_{line}"
-                stats["timestamps_added"] += 1
-            else:
-                full_line = f"L{i+1:06d}_{line}"
+            for file_path, result in self.iter_encrypt_directory(directory_path, password_text,
+                                                                 workers=workers):
+                results.append(result)
+                
+                if result['success']:
+                    total_size += result.get('original_size', 0)
+                    self.log(f"Зашифрован: {os.path.basename(file_path)}")
+                else:
+                    self.log(f"Ошибка шифрования {os.path.basename(file_path)}: {result.get('error')}", "ERROR")
             
-            password_lines.append(full_line)
+            return {
+                'success': True,
+                'total_files': len(results),
+                'successful': sum(1 for r in results if r.get('success')),
+                'failed': sum(1 for r in results if not r.get('success')),
+                'total_size': total_size,
+                'individual_results': results
+            }
+    
+    def iter_encrypt_directory(self, directory_path, password_text, workers=None,
+                               **encrypt_options):
+        """
+        Пофайловое шифрование каталога пулом потоков или процессов
+        
+        Все файлы шифруются с одной солью, поэтому PBKDF2 выполняется
+        один раз (в режиме процессов - один раз в каждом процессе),
+        а SHA3 пароля считается один раз в PasswordHandle. Уникальность
+        шифротекстов обеспечивают случайные IV/nonce каждого файла.
+        
+        Args:
+            directory_path: Путь к директории
+            password_text: Мега-пароль (текст или PasswordHandle)
+            workers: Размер пула (None - DIRECTORY_WORKERS, 1 - последовательно).
+                     Потоки для ввода-вывода, процессы - при USE_PROCESS_POOL
+            encrypt_options: Дополнительные аргументы encrypt_file
             
-            # Прогресс
-            if (i + 1) % 1000 == 0:
-                self.log(f"Сгенерировано строк: {i + 1}/{self.PASSWORD_LINES}")
+        Yields:
+            Кортежи (путь_к_файлу, результат encrypt_file) в порядке готовности
+        """
+        password_text = PasswordHandle.of(password_text)
+        if workers is None:
+            workers = self.DIRECTORY_WORKERS
         
-        password_text = "\n".join(password_lines)
+        options = dict(encrypt_options)
+        options.setdefault('salt', secrets.token_bytes(32))
+        if workers > 1:
+            # Параллельность уже на уровне файлов
+            options.setdefault('workers', 1)
         
-        # Мульти-хэширование для безопасности
-        sha512_hash = hashlib.sha512(password_text.encode('utf-8')).hexdigest()
-        blake2b_hash = hashlib.blake2b(password_text.encode('utf-8')).hexdigest()
+        files = (os.path.join(root, file)
+                 for root, dirs, names in os.walk(directory_path)
+                 for file in names)
         
-        # Комбинированный хэш
-        combined_hash = hashlib.sha3_512(
-            (sha512_hash + blake2b_hash).encode('utf-8')
-        ).hexdigest()
+        if workers <= 1:
+            for file_path in files:
+                yield file_path, self._encrypt_directory_file(file_path, password_text, options)
+            return
         
-        self.log(f"Мега-пароль создан! Всего символов: {len(password_text):,}")
-        self.log(f"Статистика: {stats}")
+        if self.USE_PROCESS_POOL:
+            # Очередь удаления живет в родителе, процессы удаляют сами
+            options.setdefault('async_delete', False)
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_directory_worker,
+                initargs=(self._worker_settings(), password_text)
+            )
+            submit = lambda file_path: executor.submit(
+                _encrypt_directory_file_in_worker, file_path, options)
+        else:
+            # Ключ выводится здесь, потоки берут его из key_context
+            self.derive_key(password_text, options['salt'])
+            executor = ThreadPoolExecutor(max_workers=workers)
+            submit = lambda file_path: executor.submit(
+                self._encrypt_directory_file, file_path, password_text, options)
         
-        return password_text, combined_hash, stats
+        with executor:
+            pending = {}
+            for file_path in files:
+                # Ограничиваем число задач в очереди, а не всё дерево сразу
+                if len(pending) >= workers * 2:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        yield pending.pop(future), future.result()
+                pending[submit(file_path)] = file_path
+            
+            for future in as_completed(list(pending)):
+                yield pending.pop(future), future.result()
     
-    def read_password_from_file(self, password_file):
+    def _encrypt_directory_file(self, file_path, password_text, options):
+        """Один файл каталога: исключение превращается в результат с ошибкой"""
+        try:
+            result = self.encrypt_file(file_path, password_text, **options)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        result['source_file'] = file_path
+        return result
+    
+    def _worker_settings(self):
+        """Настройки (атрибуты и свойства в ВЕРХНЕМ регистре) для копии в процессе пула"""
+        settings = {name: value for name, value in vars(self).items() if name.isupper()}
+        settings['KEY_CACHE_SIZE'] = self.KEY_CACHE_SIZE
+        settings['KEY_CACHE_TTL'] = self.KEY_CACHE_TTL
+        return settings
+    
+    def _encrypt_directory_archive(self, directory_path, password_text):
         """
-        Чтение пароля из файла
+        Каталог → один .svx без временного ZIP на диске
+        
+        ZIP (без сжатия, ZIP_STORED) пишется прямо в конвейер
+        сжатие → шифрование → запись, поэтому нет ни промежуточного
+        файла, ни повторного сжатия уже сжатого архива, а память
+        ограничена буферами конвейера. После дешифрования получается
+        ARCHIVE_<имя>_<время>.zip, как и раньше.
         
-        Args:
-            password_file: Путь к файлу с паролем
-            
         Returns:
-            Текст пароля или None в случае ошибки
+            Словарь с результатами (как у encrypt_file) и archived_files
         """
+        if not CRYPTO_AVAILABLE:
+            return {
+                'success': False,
+                'error': 'Криптографические библиотеки не установлены. Установите: pip install pycryptodome'
+            }
+        
+        self.operation_start_time = time.time()
+        _begin_peak_rss()
+        
         try:
-            if not os.path.exists(password_file):
-                self.log(f"Файл пароля не существует: {password_file}", "ERROR")
-                return None
-            
-            with open(password_file, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            # Упрощенный парсинг
-            lines = content.split('\n')
-            
-            # Ищем маркер начала пароля
-            password_lines = []
-            found_marker = False
-            
-            for line in lines:
-                # Ищем маркер начала пароля
-                if "🚀 START OF PASSWORD" in line or "START OF PASSWORD" in line:
-                    found_marker = True
-                    continue
-                
-                # Если нашли маркер, собираем строки
-                if found_marker:
-                    # Пропускаем разделители и пустые строки в начале
-                    if line.strip() and not line.startswith("=" * 20):
-                        # Проверяем, не является ли это концом пароля
-                        if "END OF PASSWORD" in line:
-                            break
-                        password_lines.append(line)
-            
-            # Если не нашли маркер, пробуем другой подход
-            if not password_lines:
-                # Ищем строки, похожие на пароль (содержат L000001_T и т.д.)
-                for line in lines:
-                    if "L000001_" in line and len(line) > 20:
-                        password_lines.append(line)
-            
-            # Если все еще нет, берем все строки после определенной точки
-            if not password_lines:
-                # Ищем любые строки, которые выглядят как пароль
-                for i, line in enumerate(lines):
-                    if len(line) > 10 and not line.startswith("File:") and not line.startswith("Size:") and not line.startswith("Created:"):
-                        # Проверяем, содержит ли строка типичные элементы пароля
-                        if any(marker in line for marker in ["_T", "_N", "L0", "|", ":", "#"]):
-                            password_lines = lines[i:]
-                            break
-            
-            # Объединяем строки
-            password = '\n'.join(password_lines).strip()
-            
-            # Убираем конечные разделители
-            while password.endswith("=" * 80):
-                password = password[:-(80)].strip()
+            directory = Path(directory_path)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            archive_name = f"ARCHIVE_{directory.name}_{timestamp}"
+            archive_path = directory.parent / f"{archive_name}.zip"  # Только имя, файл не создается
+            encrypted_path = self._reserve_output_path(directory.parent / f"ENCRYPTED_{archive_name}_{timestamp}.svx")
             
-            if not password:
-                self.log("Не удалось найти пароль в файле", "ERROR")
-                return None
+            # Выборки по отдельным файлам нет - сжатие как для смешанных данных
+            codec, level = COMPRESSION_PROFILES[self.COMPRESSION_PROFILE]['mixed']
+            container_version = self.CONTAINER_VERSION
+            archived = []
             
-            # Проверяем количество строк
-            line_count = len(password.split('\n'))
-            self.log(f"Прочитан пароль из {line_count} строк")
+            def feed(sink):
+                with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as zipf:
+                    for root, dirs, files in os.walk(directory_path):
+                        for file in files:
+                            file_path = os.path.join(root, file)
+                            arcname = os.path.relpath(file_path, directory_path)
+                            self._write_archive_member(zipf, file_path, arcname)
+                            archived.append(arcname)
             
-            if line_count < 100:
-                self.log(f"Внимание: пароль содержит только {line_count} строк (ожидается 10000)", "WARNING")
+            self.log(f"Потоковый архив каталога: {codec} (уровень {level}), V{container_version}")
+            stream_result = self._encrypt_stream(
+                feed, archive_path, encrypted_path, password_text, 0,
+                codec, level, container_version, self.ENCRYPT_WORKERS, self.AEAD_ALGORITHM
+            )
             
-            return password
+            header = stream_result['header']
+            self.log(f"Файлов в архиве: {len(archived):,}, данных: {header['original_size']:,} байт")
             
-        except Exception as e:
-            self.log(f"Ошибка чтения пароля: {str(e)}", "ERROR")
-            return None
+            result = self._encryption_result(encrypted_path, header, stream_result['encrypted_size'],
+                                             True, container_version)
+            result['archived_files'] = len(archived)
+            return result
+        finally:
+            _end_peak_rss()
     
-    def save_password_to_file(self, password_text, original_filename, stats=None):
+    def _write_archive_member(self, zipf, file_path, arcname):
+        """Файл в ZIP без сжатия, кусками по STREAM_CHUNK_SIZE"""
+        info = zipfile.ZipInfo.from_file(file_path, arcname)
+        info.compress_type = zipfile.ZIP_STORED
+        
+        with open(file_path, 'rb') as src, zipf.open(info, 'w') as dst:
+            for chunk in iter(lambda: src.read(self.STREAM_CHUNK_SIZE), b''):
+                dst.write(chunk)
+    
+    def encrypt_directory_incremental(self, directory_path, password_text, vault_dir=None,
+                                      workers=None, prune_deleted=False):
         """
-        Сохранение пароля в файл
+        Инкрементальное шифрование каталога в хранилище по манифесту
+        
+        Хранилище повторяет дерево каталога: для каждого файла - свой
+        .svx. Манифест (путь, размер, mtime, хэш содержимого, объект)
+        хранится зашифрованным рядом с объектами. Повторный запуск
+        шифрует только новые и измененные файлы: совпадение размера и
+        mtime считается неизменностью, иначе сравнивается хэш. Удаленные
+        файлы отмечаются в манифесте. Оригиналы не удаляются.
         
         Args:
-            password_text: Текст пароля
-            original_filename: Исходный файл
-            stats: Статистика генерации
+            directory_path: Путь к директории
+            password_text: Мега-пароль (текст или PasswordHandle)
+            vault_dir: Каталог хранилища (None - VAULT_<имя> рядом с директорией)
+            workers: Потоков шифрования (None - DIRECTORY_WORKERS)
+            prune_deleted: Удалять объекты удаленных файлов (иначе остаются
+                           в хранилище и записываются в раздел deleted)
             
         Returns:
-            Путь к сохраненному файлу
+            Словарь с результатами
         """
-        original_path = Path(original_filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")  # С микросекундами
+        if not CRYPTO_AVAILABLE:
+            return {
+                'success': False,
+                'error': 'Криптографические библиотеки не установлены. Установите: pip install pycryptodome'
+            }
         
-        # Имя файла с паролем
-        password_filename = f"SUPER_PASSWORD_{original_path.stem}_{timestamp}.txt"
-        password_path = original_path.parent / password_filename
+        if not os.path.isdir(directory_path):
+            return {'success': False, 'error': 'Не является директорией'}
         
-        # Метаданные
-        file_size = os.path.getsize(original_filename) if os.path.exists(original_filename) else 0
+        start_time = time.time()
+        password_text = PasswordHandle.of(password_text)
+        directory = Path(directory_path).absolute()
+        if vault_dir is None:
+            vault_dir = directory.parent / f"VAULT_{directory.name}"
+        vault_dir = Path(vault_dir).absolute()
+        vault_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = vault_dir / self.MANIFEST_NAME
         
-        with open(password_path, 'w', encoding='utf-8') as f:
-            # Более простой формат без рамок, чтобы легче было читать
-            f.write("=" * 80 + "\n")
-            f.write("SUPER PASSWORD FILE\n")
-            f.write("=" * 80 + "\n")
-            f.write(f"File: {original_path.name}\n")
-            f.write(f"Size: {file_size:,} bytes\n")
-            f.write(f"Created: {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}\n")
-            f.write(f"Author: {self.AUTHOR} © {self.YEAR}\n")
-            f.write(f"Version: {self.VERSION}\n")
-            f.write("=" * 80 + "\n")
-            
-            # Предупреждения
-            f.write("\n⚠️ IMPORTANT WARNINGS:\n")
-            warnings = [
-                "1. SAVE THIS FILE IN A SECURE PLACE!",
-                "2. Without this file, recovery is IMPOSSIBLE!",
-                "3. Never store the password with the encrypted file!",
-                "4. Make multiple copies on different media!",
-                "5. Password consists of 10000 unique lines!",
-                "6. Each line contains a timestamp and unique ID!",
-                "",
-                "🚨 LOST PASSWORD = LOST DATA 🚨"
-            ]
-            
-            for warning in warnings:
-                f.write(f"{warning}\n")
-            
-            f.write("\n" + "=" * 80 + "\n")
-            
-            # Статистика
-            if stats:
-                f.write("\n📊 PASSWORD GENERATION STATISTICS:\n")
-                for key, value in stats.items():
-                    f.write(f"{key}: {value}\n")
-                f.write("\n" + "=" * 80 + "\n")
+        self.log(f"Инкрементальное шифрование: {directory} → {vault_dir}")
+        
+        # Соль хранилища постоянна: ключ выводится один раз на запуск
+        if manifest_path.exists():
+            try:
+                manifest, salt = self._load_manifest(manifest_path, password_text)
+            except ValueError as e:
+                return {'success': False, 'error': str(e)}
+        else:
+            salt = secrets.token_bytes(32)
+            manifest = {'version': 1, 'source': str(directory), 'files': {}, 'deleted': {}}
+        
+        entries = manifest['files']
+        summary = {'added': 0, 'modified': 0, 'unchanged': 0, 'touched': 0,
+                   'deleted': 0, 'failed': 0, 'bytes_encrypted': 0}
+        errors = []
+        seen = set()
+        jobs = []
+        superseded = []  # Прежние объекты: удаляются после записи манифеста
+        
+        for root, dirs, files in os.walk(directory):
+            # Хранилище внутри каталога не шифруем
+            dirs[:] = [d for d in dirs if (Path(root) / d).absolute() != vault_dir]
+            for file in files:
+                file_path = os.path.join(root, file)
+                relative = os.path.relpath(file_path, directory).replace(os.sep, '/')
+                seen.add(relative)
+                
+                try:
+                    stat = os.stat(file_path)
+                except OSError as e:
+                    # Битая ссылка или файл удален во время обхода: запись
+                    # манифеста остается как есть до следующего запуска
+                    summary['failed'] += 1
+                    errors.append({'path': relative, 'error': str(e)})
+                    self.log(f"Пропущен {relative}: {str(e)}", "WARNING")
+                    continue
+                
+                entry = entries.get(relative)
+                if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    summary['unchanged'] += 1
+                    continue
+                
+                if entry and entry.get('hash_algorithm', 'sha3_512') == self.FILE_HASH_ALGORITHM:
+                    # Размер или mtime изменились - решает хэш содержимого
+                    # (записи с другим алгоритмом хэша шифруются заново)
+                    content_hash = self.calculate_file_hash(file_path, self.FILE_HASH_ALGORITHM)
+                    if content_hash == entry['hash']:
+                        entry['mtime_ns'] = stat.st_mtime_ns
+                        summary['touched'] += 1
+                        continue
+                
+                jobs.append((relative, file_path, stat))
+        
+        def encrypt_job(job):
+            relative, file_path, stat = job
+            return self._encrypt_vault_object(file_path, vault_dir, relative, password_text, salt, stat)
+        
+        if workers is None:
+            workers = self.DIRECTORY_WORKERS
+        if jobs:
+            self.derive_key(password_text, salt)
+        
+        try:
+            executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+            results = executor.map(encrypt_job, jobs) if executor else map(encrypt_job, jobs)
+            try:
+                for (relative, file_path, stat), result in zip(jobs, results):
+                    if not result['success']:
+                        summary['failed'] += 1
+                        errors.append({'path': relative, 'error': result['error']})
+                        self.log(f"Ошибка шифрования {relative}: {result['error']}", "ERROR")
+                        continue
+                    
+                    old = entries.get(relative)
+                    summary['modified' if old else 'added'] += 1
+                    summary['bytes_encrypted'] += result['entry']['size']
+                    entries[relative] = result['entry']
+                    manifest['deleted'].pop(relative, None)
+                    if old and old.get('object'):
+                        superseded.append(old['object'])
+                    self.log(f"Зашифрован: {relative}")
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            
+            # Удаленные с прошлого запуска
+            for relative in [r for r in entries if r not in seen]:
+                entry = entries.pop(relative)
+                summary['deleted'] += 1
+                entry['deleted_at'] = datetime.now().isoformat()
+                manifest['deleted'][relative] = entry
+                self.log(f"Удален из каталога: {relative}")
+            
+            if prune_deleted:
+                for entry in manifest['deleted'].values():
+                    if entry.get('object'):
+                        superseded.append(entry['object'])
+                        entry['object'] = None
+        finally:
+            # Манифест сохраняется и после сбоя: готовые объекты не теряются
+            manifest['updated'] = datetime.now().isoformat()
+            self._save_manifest(manifest_path, manifest, password_text, salt)
+            for name in superseded:
+                self._remove_vault_object(vault_dir, name)
+        
+        elapsed_time = time.time() - start_time
+        self.log(f"Инкрементальное шифрование завершено за {elapsed_time:.2f} секунд: "
+                 f"новых {summary['added']}, измененных {summary['modified']}, "
+                 f"без изменений {summary['unchanged'] + summary['touched']}, удаленных {summary['deleted']}")
+        
+        result = {
+            'success': summary['failed'] == 0,
+            'vault_dir': str(vault_dir),
+            'manifest': str(manifest_path),
+            'total_files': len(seen),
+            'errors': errors,
+            'elapsed_time': elapsed_time
+        }
+        result.update(summary)
+        if errors:
+            result['error'] = f"Не удалось зашифровать файлов: {len(errors)}"
+        return result
+    
+    def _encrypt_vault_object(self, file_path, vault_dir, relative, password_text, salt, stat):
+        """
+        Файл → новый объект хранилища <путь>.<время>.svx
+        
+        Новый объект пишется под своим именем, старый удаляется только
+        после обновления манифеста, поэтому сбой не оставляет хранилище
+        без последней целой версии.
+        
+        Returns:
+            Словарь с success и записью манифеста (entry) или error
+        """
+        target = vault_dir / relative
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                 'hash': None, 'hash_algorithm': self.FILE_HASH_ALGORITHM,
+                 'object': None, 'encrypted': datetime.now().isoformat()}
+        
+        try:
+            if stat.st_size == 0:
+                # Пустой файл: хранить нечего, хватает записи в манифесте
+                entry['hash'] = hashlib.new(self.FILE_HASH_ALGORITHM).hexdigest()
+                return {'success': True, 'entry': entry}
             
-            # Маркер начала пароля
-            f.write("\n🚀 START OF PASSWORD 🚀\n")
-            f.write("=" * 80 + "\n\n")
+            codec, level = 'none', 0
+            if stat.st_size > 1024:
+                codec, level, _ = select_codec(file_path, self.COMPRESSION_PROFILE)
             
-            # Сам пароль - ВАЖНО: без дополнительных символов!
-            f.write(password_text)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            object_path = self._reserve_output_path(target.with_name(f"{target.name}.{timestamp}.svx"))
             
-            # Конец файла
-            f.write(f"\n\n{'=' * 80}\n")
-            f.write(f"🎯 END OF PASSWORD - {self.PASSWORD_LINES} LINES GENERATED 🎯\n")
-            f.write(f"{'=' * 80}\n")
+            try:
+                stream_result = self._encrypt_file_streaming(
+                    file_path, object_path, password_text, 0, codec, level,
+                    self.CONTAINER_VERSION, 1, self.AEAD_ALGORITHM, salt
+                )
+            except Exception:
+                self._release_output_path(object_path)
+                raise
+            if not stream_result['success']:
+                self._release_output_path(object_path)
+                return stream_result
+            
+            header = stream_result['header']
+            entry['size'] = header['original_size']
+            entry['hash'] = header['original_hash']
+            entry['hash_algorithm'] = header['hash_algorithm']
+            entry['object'] = object_path.relative_to(vault_dir).as_posix()
+            return {'success': True, 'entry': entry}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def _remove_vault_object(self, vault_dir, name):
+        """Удаление прежнего объекта хранилища"""
+        object_path = vault_dir / name
+        if os.path.exists(object_path):
+            os.remove(object_path)
+    
+    def _manifest_key(self, password_text, salt):
+        """Отдельный ключ манифеста (AES-GCM), выведенный из ключа хранилища"""
+        return hmac.new(self.derive_key(password_text, salt), b"SVX-MANIFEST", 'sha256').digest()
+    
+    def _save_manifest(self, manifest_path, manifest, password_text, salt):
+        """Запись манифеста хранилища (см. _write_sealed_json)"""
+        self._write_sealed_json(manifest_path, self.MAGIC_MANIFEST, salt,
+                                self._manifest_key(password_text, salt), manifest)
+    
+    def _load_manifest(self, manifest_path, password_text):
+        """
+        Чтение манифеста хранилища
         
-        self.log(f"Файл с паролем сохранен: {password_path}")
-        return str(password_path)
+        Returns:
+            Кортеж (манифест, соль хранилища)
+        
+        Raises:
+            ValueError: Не манифест, неверный пароль или повреждение
+        """
+        return self._read_sealed_json(manifest_path, self.MAGIC_MANIFEST,
+                                      lambda salt: self._manifest_key(password_text, salt))
     
-    def calculate_file_hash(self, filepath, algorithm='sha3_512'):
-        """Расчет хэша файла"""
-        if not os.path.exists(filepath):
-            return "FILE_NOT_FOUND"
+    def _write_sealed_json(self, path, magic, salt, key, data):
+        """
+        Зашифрованный JSON: MAGIC | соль | nonce | AES-GCM(zlib(JSON)) | тег
         
-        hasher = hashlib.new(algorithm)
+        Пишется во временный файл и атомарно заменяет прежний.
+        """
+        nonce = get_random_bytes(12)
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(magic + salt)
+        body = zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf-8'), 6)
+        ciphertext, tag = cipher.encrypt_and_digest(body)
+        
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(magic + salt + nonce)
+            f.write(ciphertext)
+            f.write(tag)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        _fsync_directory(os.path.dirname(os.path.abspath(path)))
+    
+    def _read_sealed_json(self, path, magic, key_for_salt):
+        """
+        Чтение файла _write_sealed_json
+        
+        Args:
+            key_for_salt: Функция соль → ключ
+        
+        Returns:
+            Кортеж (данные, соль)
+        
+        Raises:
+            ValueError: Другой формат, неверный пароль или повреждение
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        
+        magic_size = len(magic)
+        if len(data) < magic_size + 32 + 12 + 16 or not data.startswith(magic):
+            raise ValueError(f'Неверный формат файла: {os.path.basename(path)}')
+        
+        salt = data[magic_size:magic_size + 32]
+        nonce = data[magic_size + 32:magic_size + 44]
+        cipher = AES.new(key_for_salt(salt), AES.MODE_GCM, nonce=nonce)
+        cipher.update(magic + salt)
         try:
-            with open(filepath, 'rb') as f:
-                # Читаем большими блоками для больших файлов
-                for chunk in iter(lambda: f.read(65536), b''):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
-        except Exception as e:
-            return f"ERROR_{str(e)}"
+            body = cipher.decrypt_and_verify(data[magic_size + 44:-16], data[-16:])
+        except ValueError:
+            raise ValueError(f'Неверный пароль или файл поврежден: {os.path.basename(path)}')
+        
+        return json.loads(zlib.decompress(body).decode('utf-8')), salt
     
-    def encrypt_file(self, input_file, password_text, delete_original=True, 
-                    secure_delete_passes=7, compress_before_encrypt=True):
+    def open_chunk_store(self, store_dir, password_text, create=False):
         """
-        Шифрование файла
+        Открытие (или создание) хранилища кусков
+        
+        Файл STORE.svxs хранит соль хранилища и контрольное значение
+        ключа: пароль проверяется до чтения и записи кусков.
+        
+        Args:
+            create: Создать хранилище, если его нет (False - только
+                    открыть существующее, как при восстановлении)
+        
+        Returns:
+            Кортеж (ChunkStore, соль хранилища)
+        
+        Raises:
+            ValueError: Хранилища нет, неверный пароль или хранилище повреждено
+        """
+        store_dir = Path(store_dir)
+        config_path = store_dir / self.CHUNK_STORE_NAME
+        magic = self.MAGIC_CHUNK_STORE
+        
+        fd = None
+        if create:
+            store_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                # Создание с O_EXCL: два процесса не создадут разные соли
+                fd = os.open(config_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                pass
+        elif not config_path.exists():
+            raise ValueError(f'Хранилище кусков не найдено: {store_dir}')
+        
+        if fd is None:
+            with open(config_path, 'rb') as f:
+                data = f.read()
+            if len(data) != len(magic) + 64 or not data.startswith(magic):
+                raise ValueError('Файл хранилища кусков поврежден')
+            salt = data[len(magic):len(magic) + 32]
+            key = self.derive_key(password_text, salt)
+            check = hmac.new(key, b"SVX-STORE-CHECK", 'sha256').digest()
+            if not hmac.compare_digest(check, data[len(magic) + 32:]):
+                raise ValueError('Неверный пароль для хранилища кусков')
+        else:
+            salt = secrets.token_bytes(32)
+            key = self.derive_key(password_text, salt)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(magic + salt + hmac.new(key, b"SVX-STORE-CHECK", 'sha256').digest())
+                f.flush()
+                os.fsync(f.fileno())
+            _fsync_directory(store_dir)
+            self.log(f"Создано хранилище кусков: {store_dir}")
+        
+        return ChunkStore(store_dir, key), salt
+    
+    def _recipe_key(self, password_text, salt):
+        """Ключ рецептов, выведенный из ключа хранилища кусков"""
+        return hmac.new(self.derive_key(password_text, salt), b"SVX-RECIPE", 'sha256').digest()
+    
+    def encrypt_file_dedup(self, input_file, password_text, store_dir, delete_original=False,
+                           secure_delete_passes=7, workers=None):
+        """
+        Шифрование файла в хранилище кусков с дедупликацией
+        
+        Файл режется ContentDefinedChunker, каждый новый кусок
+        сохраняется в хранилище один раз, а рядом с файлом остается
+        маленький зашифрованный рецепт ENCRYPTED_<имя>_<время>.svxr
+        со списком кусков. Версии похожих файлов (образы, дампы,
+        редакции документов) делят общие куски.
         
         Args:
             input_file: Путь к файлу для шифрования
-            password_text: Мега-пароль (текст)
-            delete_original: Удалить оригинал после шифрования
+            password_text: Мега-пароль (текст или PasswordHandle)
+            store_dir: Каталог хранилища кусков
+            delete_original: Удалить оригинал (по умолчанию нет - режим
+                             для версионных копий)
             secure_delete_passes: Количество проходов безопасного удаления
-            compress_before_encrypt: Сжать перед шифрованием
+            workers: Потоков для сжатия и шифрования кусков (None - ENCRYPT_WORKERS)
             
         Returns:
             Словарь с результатами
         """
         self.operation_start_time = time.time()
-        self.log(f"НАЧАЛО ШИФРОВАНИЯ: {input_file}")
+        self.log(f"НАЧАЛО ШИФРОВАНИЯ С ДЕДУПЛИКАЦИЕЙ: {input_file}")
+        _begin_peak_rss()
+        password_text = PasswordHandle.of(password_text)
+        recipe_path = None
         
         try:
-            # Проверки
             if not CRYPTO_AVAILABLE:
                 return {
                     'success': False,
@@ -434,160 +5231,123 @@ class SuperVaultX:
             if not os.path.exists(input_file):
                 return {'success': False, 'error': 'Файл не существует'}
             
-            # Чтение исходного файла
-            with open(input_file, 'rb') as f:
-                original_data = f.read()
+            store, salt = self.open_chunk_store(store_dir, password_text, create=True)
+            if workers is None:
+                workers = self.ENCRYPT_WORKERS
             
-            original_size = len(original_data)
-            self.log(f"Размер файла: {original_size:,} байт")
+            original_path = Path(input_file)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            recipe_path = self._reserve_output_path(
+                original_path.parent / f"ENCRYPTED_{original_path.stem}_{timestamp}.svxr")
+            
+            chunker = ContentDefinedChunker(self.CHUNK_AVG_SIZE)
+            hasher = hashlib.new(self.FILE_HASH_ALGORITHM)
+            chunks = []
+            original_size = 0
+            stored_bytes = 0
+            new_chunks = 0
+            
+            def store_batch(batch):
+                nonlocal stored_bytes, new_chunks
+                results = executor.map(store.put, batch) if executor else map(store.put, batch)
+                for data, (chunk_id, written) in zip(batch, results):
+                    chunks.append([chunk_id, len(data)])
+                    if written:
+                        new_chunks += 1
+                        stored_bytes += written
+            
+            executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+            try:
+                with open(input_file, 'rb') as f:
+                    batch = []
+                    for chunk in chunker.chunks(f):
+                        hasher.update(chunk)
+                        original_size += len(chunk)
+                        batch.append(chunk)
+                        if len(batch) >= max(1, workers):
+                            store_batch(batch)
+                            batch = []
+                    if batch:
+                        store_batch(batch)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
             
             if original_size == 0:
+                self._release_output_path(recipe_path)
                 return {'success': False, 'error': 'Файл пустой'}
             
-            # Сжатие (опционально)
-            if compress_before_encrypt and original_size > 1024:
-                try:
-                    import zlib
-                    compressed_data = zlib.compress(original_data, level=9)
-                    compression_ratio = len(compressed_data) / original_size if original_size > 0 else 1
-                    self.log(f"Сжатие: {original_size:,} → {len(compressed_data):,} байт ({compression_ratio:.2%})")
-                    data_to_encrypt = compressed_data
-                    was_compressed = True
-                except:
-                    data_to_encrypt = original_data
-                    was_compressed = False
-                    compression_ratio = 1.0
-            else:
-                data_to_encrypt = original_data
-                was_compressed = False
-                compression_ratio = 1.0
-            
-            # Генерация криптографических параметров
-            salt = secrets.token_bytes(32)  # 256 бит соли
-            iv = get_random_bytes(16)       # 128 бит IV
-            
-            # Создание ключа через PBKDF2
-            key = hashlib.pbkdf2_hmac(
-                'sha512',
-                password_text.encode('utf-8'),
-                salt,
-                100000,  # Много итераций для безопасности
-                dklen=32  # 256 бит
-            )
-            
-            # Шифрование AES-256 CBC
-            cipher = AES.new(key, AES.MODE_CBC, iv)
-            padded_data = pad(data_to_encrypt, AES.block_size)
-            encrypted_data = cipher.encrypt(padded_data)
-            
-            # HMAC для аутентификации
-            hmac_tag = hashlib.sha256(
-                encrypted_data + salt + iv + key
-            ).digest()
-            
-            # Создание заголовка
-            header = {
-                'magic': self.MAGIC_HEADER.hex(),
-                'version': self.VERSION,
-                'algorithm': self.ENCRYPTION_ALGO,
+            recipe = {
+                'version': 1,
+                'algorithm': 'AES-256-GCM-CDC-DEDUP',
+                'store': str(Path(store_dir).absolute()),
+                'original_name': original_path.name,
+                'original_path': str(original_path.absolute()),
                 'original_size': original_size,
-                'encrypted_size': len(encrypted_data),
-                'salt': base64.b64encode(salt).decode('ascii'),
-                'iv': base64.b64encode(iv).decode('ascii'),
-                'hmac_tag': base64.b64encode(hmac_tag).decode('ascii'),
-                'password_hash': hashlib.sha3_512(password_text.encode('utf-8')).hexdigest(),
+                'original_hash': hasher.hexdigest(),
+                'hash_algorithm': self.FILE_HASH_ALGORITHM,
+                'codec': 'zlib' if store.level else 'none',
                 'timestamp': datetime.now().isoformat(),
-                'original_name': Path(input_file).name,
-                'original_path': str(Path(input_file).absolute()),
-                'original_hash': self.calculate_file_hash(input_file),
-                'was_compressed': was_compressed,
-                'compression_ratio': compression_ratio if was_compressed else 1.0,
-                'secure_delete_passes': secure_delete_passes,
+                'chunker': 'gear32',
+                'chunk_avg_size': chunker.avg_size,
+                'chunks': chunks,
                 'author': self.AUTHOR,
                 'year': self.YEAR
             }
+            self._write_sealed_json(recipe_path, self.MAGIC_RECIPE, salt,
+                                    self._recipe_key(password_text, salt), recipe)
+            recipe_size = os.path.getsize(recipe_path)
             
-            # Сериализация заголовка
-            header_json = json.dumps(header, ensure_ascii=False, indent=2)
-            header_encoded = header_json.encode('utf-8')
-            
-            # Проверка размера заголовка
-            if len(header_encoded) > self.HEADER_SIZE:
-                return {'success': False, 'error': 'Заголовок слишком большой'}
+            self.log(f"Кусков: {len(chunks):,}, новых: {new_chunks:,}, "
+                     f"записано в хранилище: {stored_bytes:,} байт из {original_size:,}")
             
-            # Дополнение заголовка
-            padded_header = header_encoded.ljust(self.HEADER_SIZE, b'\x00')
-            
-            # Сборка финального файла
-            final_data = padded_header + hmac_tag + encrypted_data
-            
-            # Сохранение зашифрованного файла
-            original_path = Path(input_file)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            encrypted_filename = f"ENCRYPTED_{original_path.stem}_{timestamp}.svx"
-            encrypted_path = original_path.parent / encrypted_filename
-            
-            with open(encrypted_path, 'wb') as f:
-                f.write(final_data)
-            
-            encrypted_size = len(final_data)
-            encryption_ratio = encrypted_size / original_size if original_size > 0 else 1
-            
-            self.log(f"Файл зашифрован: {encrypted_path}")
-            self.log(f"Итоговый размер: {encrypted_size:,} байт (x{encryption_ratio:.2f})")
-            
-            # Безопасное удаление оригинала
-            if delete_original:
-                self.log(f"Безопасное удаление оригинала ({secure_delete_passes} проходов)...")
+            shred_job_id = None
+            if delete_original and self.ASYNC_SHRED:
+                shred_job_id = self.shred_queue.submit(input_file, secure_delete_passes)
+            elif delete_original:
                 self.secure_delete_file(input_file, passes=secure_delete_passes)
             
-            # Расчет времени
             elapsed_time = time.time() - self.operation_start_time
-            
-            result = {
+            return {
                 'success': True,
-                'encrypted_file': str(encrypted_path),
-                'password_file': None,  # Будет заполнено позже
+                'recipe_file': str(recipe_path),
+                'store_dir': str(store_dir),
                 'original_size': original_size,
-                'encrypted_size': encrypted_size,
-                'compression_ratio': compression_ratio if was_compressed else 1.0,
-                'encryption_ratio': encryption_ratio,
-                'was_compressed': was_compressed,
+                'chunks': len(chunks),
+                'new_chunks': new_chunks,
+                'stored_bytes': stored_bytes,
+                'recipe_size': recipe_size,
+                'dedup_ratio': original_size / (stored_bytes + recipe_size),
+                'shred_job_id': shred_job_id,
+                'peak_rss_bytes': _end_peak_rss(),
                 'elapsed_time': elapsed_time,
-                'speed_mbps': (original_size / elapsed_time / 1024 / 1024) if elapsed_time > 0 else 0,
-                'header_info': {
-                    'algorithm': header['algorithm'],
-                    'timestamp': header['timestamp'],
-                    'hash': header['password_hash'][:32] + '...'
-                }
+                'speed_mbps': (original_size / elapsed_time / 1024 / 1024) if elapsed_time > 0 else 0
             }
             
-            self.log(f"Шифрование завершено за {elapsed_time:.2f} секунд")
-            return result
-            
         except Exception as e:
             self.log(f"Ошибка шифрования: {str(e)}", "ERROR")
-            import traceback
-            traceback.print_exc()
-            return {
-                'success': False,
-                'error': f'Ошибка шифрования: {str(e)}'
-            }
+            if recipe_path is not None:
+                self._release_output_path(recipe_path)
+            return {'success': False, 'error': f'Ошибка шифрования: {str(e)}'}
+        finally:
+            _end_peak_rss()
     
-    def decrypt_file(self, encrypted_file, password_text, verify_integrity=True):
+    def decrypt_file_dedup(self, recipe_file, password_text, store_dir=None):
         """
-        Дешифрование файла
+        Восстановление файла по рецепту из хранилища кусков
         
         Args:
-            encrypted_file: Зашифрованный файл (.svx)
-            password_text: Мега-пароль
-            verify_integrity: Проверять целостность
+            recipe_file: Рецепт (.svxr)
+            password_text: Мега-пароль (текст или PasswordHandle)
+            store_dir: Каталог хранилища (None - путь, записанный в рецепте)
             
         Returns:
             Словарь с результатами
         """
         self.operation_start_time = time.time()
-        self.log(f"НАЧАЛО ДЕШИФРОВАНИЯ: {encrypted_file}")
+        self.log(f"НАЧАЛО ДЕШИФРОВАНИЯ ПО РЕЦЕПТУ: {recipe_file}")
+        _begin_peak_rss()
+        password_text = PasswordHandle.of(password_text)
         
         try:
             if not CRYPTO_AVAILABLE:
@@ -596,362 +5356,605 @@ class SuperVaultX:
                     'error': 'Криптографические библиотеки не установлены'
                 }
             
-            if not os.path.exists(encrypted_file):
+            if not os.path.exists(recipe_file):
                 return {'success': False, 'error': 'Файл не существует'}
             
-            # Чтение зашифрованного файла
-            with open(encrypted_file, 'rb') as f:
-                file_data = f.read()
+            try:
+                recipe, salt = self._read_sealed_json(
+                    recipe_file, self.MAGIC_RECIPE,
+                    lambda salt: self._recipe_key(password_text, salt))
+                store, store_salt = self.open_chunk_store(store_dir or recipe['store'], password_text)
+            except ValueError as e:
+                return {'success': False, 'error': str(e)}
             
-            if len(file_data) < self.HEADER_SIZE + 32 + 16:
-                return {'success': False, 'error': 'Файл поврежден или не является .svx файлом'}
+            if store_salt != salt:
+                return {'success': False, 'error': 'Рецепт относится к другому хранилищу кусков'}
             
-            # Извлечение заголовка
-            header_data = file_data[:self.HEADER_SIZE]
-            null_pos = header_data.find(b'\x00')
-            if null_pos == -1:
-                null_pos = len(header_data)
+            hash_algorithm = self._header_hash_algorithm(recipe)
+            if hash_algorithm is None:
+                return {'success': False, 'error': f"Неизвестный алгоритм хэша: {recipe.get('hash_algorithm')}"}
             
-            header_json = header_data[:null_pos]
+            decrypted_path = self._decrypted_output_path(recipe_file, recipe)
+            partial_path = decrypted_path.with_name(decrypted_path.name + '.part')
+            hasher = hashlib.new(hash_algorithm)
+            written = 0
             
             try:
-                header = json.loads(header_json.decode('utf-8'))
-            except json.JSONDecodeError as e:
-                return {'success': False, 'error': f'Неверный формат заголовка: {str(e)}'}
+                with open(partial_path, 'wb') as out:
+                    for chunk_id, size in recipe['chunks']:
+                        data = store.get(chunk_id)
+                        if len(data) != size:
+                            raise ValueError(f"Кусок {chunk_id}: размер {len(data)} вместо {size}")
+                        hasher.update(data)
+                        out.write(data)
+                        written += size
+            except ValueError as e:
+                os.remove(partial_path)
+                return {'success': False, 'error': f'Нарушена целостность: {str(e)}'}
+            except Exception:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
             
-            # Проверка магического числа
-            if 'magic' not in header or header.get('magic') != self.MAGIC_HEADER.hex():
-                return {'success': False, 'error': 'Неверный формат файла .svx'}
+            os.replace(partial_path, decrypted_path)
+            self.log(f"Собрано из {len(recipe['chunks']):,} кусков: {written:,} байт")
             
-            # Проверка хэша пароля
-            password_hash = hashlib.sha3_512(password_text.encode('utf-8')).hexdigest()
-            if header.get('password_hash') != password_hash:
-                return {'success': False, 'error': 'Неверный пароль'}
+            return self._finish_decrypt(decrypted_path, recipe, written, streaming=True,
+                                        decrypted_hash=hasher.hexdigest())
             
-            # Извлечение параметров
-            salt = base64.b64decode(header['salt'])
-            iv = base64.b64decode(header['iv'])
-            stored_hmac = base64.b64decode(header['hmac_tag'])
-            original_size = header['original_size']
-            was_compressed = header.get('was_compressed', False)
+        except Exception as e:
+            self.log(f"Ошибка дешифрования: {str(e)}", "ERROR")
+            return {'success': False, 'error': f'Ошибка дешифрования: {str(e)}'}
+        finally:
+            _end_peak_rss()
+    
+    def verify_integrity(self, encrypted_file, password_text, use_mmap=False, chunk_size=None,
+                         workers=None):
+        """
+        Проверка целостности зашифрованного файла
+        
+        Файл открывается один раз и читается кусками фиксированного
+        размера (или через mmap), память не зависит от размера архива.
+        
+        Args:
+            encrypted_file: Зашифрованный файл
+            password_text: Пароль (текст или PasswordHandle)
+            use_mmap: Читать шифротекст через mmap
+            chunk_size: Размер куска чтения (None - STREAM_CHUNK_SIZE)
+            workers: Потоков проверки сегментов V6 (None - DECRYPT_WORKERS)
+        
+        Returns:
+            Словарь с результатами проверки
+        """
+        try:
+            if not os.path.exists(encrypted_file):
+                return {'valid': False, 'error': 'Файл не существует'}
             
-            # Извлечение зашифрованных данных
-            encrypted_data = file_data[self.HEADER_SIZE + 32:]  # Пропускаем HMAC
+            password_text = PasswordHandle.of(password_text)
+            chunk_size = chunk_size or self.STREAM_CHUNK_SIZE
             
-            # Проверка HMAC
-            if verify_integrity:
-                # Создание ключа для проверки
-                key = hashlib.pbkdf2_hmac(
-                    'sha512',
-                    password_text.encode('utf-8'),
-                    salt,
-                    100000,
-                    dklen=32
-                )
+            with open(encrypted_file, 'rb') as f:
+                header_data = f.read(self.HEADER_SIZE)
                 
-                calculated_hmac = hashlib.sha256(
-                    encrypted_data + salt + iv + key
-                ).digest()
+                null_pos = header_data.find(b'\x00')
+                if null_pos == -1:
+                    return {'valid': False, 'error': 'Неверный заголовок'}
                 
-                if stored_hmac != calculated_hmac:
-                    return {'success': False, 'error': 'Нарушена целостность файла'}
-            
-            # Дешифрование
-            key = hashlib.pbkdf2_hmac(
-                'sha512',
-                password_text.encode('utf-8'),
-                salt,
-                100000,
-                dklen=32
-            )
-            
-            cipher = AES.new(key, AES.MODE_CBC, iv)
-            decrypted_padded = cipher.decrypt(encrypted_data)
-            
-            try:
-                decrypted_data = unpad(decrypted_padded, AES.block_size)
-            except ValueError as e:
-                return {'success': False, 'error': f'Ошибка удаления padding: {str(e)}'}
-            
-            # Распаковка если нужно
-            if was_compressed:
                 try:
-                    import zlib
-                    decompressed_data = zlib.decompress(decrypted_data)
-                    self.log(f"Данные распакованы: {len(decrypted_data):,} → {len(decompressed_data):,} байт")
-                    decrypted_data = decompressed_data
-                except Exception as e:
-                    self.log(f"Ошибка распаковки: {str(e)}", "WARNING")
-            
-            # Проверка размера
-            if len(decrypted_data) != original_size:
-                self.log(f"Предупреждение: размер не совпадает ({len(decrypted_data)} != {original_size})", "WARNING")
-            
-            # Восстановление имени файла
-            original_name = header.get('original_name', 'decrypted_file')
-            original_path = Path(encrypted_file)
-            
-            # Создание имени для дешифрованного файла
-            if 'ENCRYPTED_' in original_path.stem:
-                base_name = original_path.stem.replace('ENCRYPTED_', 'DECRYPTED_')
-            else:
-                base_name = f"DECRYPTED_{original_path.stem}"
-            
-            # Добавление расширения если нужно
-            if '.' not in base_name and '.' in original_name:
-                ext = original_name.split('.')[-1]
-                decrypted_filename = f"{base_name}.{ext}"
-            else:
-                decrypted_filename = base_name
-            
-            decrypted_path = original_path.parent / decrypted_filename
-            
-            # Сохранение дешифрованного файла
-            with open(decrypted_path, 'wb') as f:
-                f.write(decrypted_data)
-            
-            # Проверка хэша
-            decrypted_hash = self.calculate_file_hash(str(decrypted_path))
-            original_hash = header.get('original_hash', '')
-            
-            if original_hash and decrypted_hash != original_hash:
-                self.log(f"Внимание: хэши не совпадают! Файл может быть поврежден.", "WARNING")
-            
-            elapsed_time = time.time() - self.operation_start_time
+                    header = json.loads(header_data[:null_pos].decode('utf-8'))
+                except:
+                    return {'valid': False, 'error': 'Неверный формат заголовка'}
+                
+                # Проверка магического числа
+                container_version = self._container_version(header)
+                is_v6 = container_version == 6
+                if container_version is None:
+                    return {'valid': False, 'error': 'Неверный формат файла'}
+                
+                # Проверка хэша пароля
+                password_hash = password_text.sha3_512_hex
+                if header.get('password_hash') != password_hash:
+                    return {'valid': False, 'error': 'Неверный пароль'}
+                
+                salt = base64.b64decode(header['salt'])
+                
+                # Создание ключа для проверки
+                key = self.derive_key(password_text, salt)
+                
+                # Время считается только для прохода по данным
+                started = time.time()
+                
+                if is_v6:
+                    # Проверка тегов всех сегментов
+                    hmac_valid, bytes_verified = self._verify_v6_segments(
+                        f, header, key, workers=workers, use_mmap=use_mmap
+                    )
+                else:
+                    # Проверка HMAC потоком, без копии шифротекста в памяти
+                    iv = base64.b64decode(header['iv'])
+                    stored_hmac = base64.b64decode(header['hmac_tag'])
+                    
+                    authenticator = V5TagAuthenticator()
+                    body_end = self._body_end(header, os.fstat(f.fileno()).st_size)
+                    for chunk in _iter_file_chunks(f, self.HEADER_SIZE + 32, chunk_size, use_mmap,
+                                                   end=body_end):
+                        authenticator.update(chunk)
+                    
+                    hmac_valid = authenticator.verify(stored_hmac, salt, iv, key)
+                    bytes_verified = authenticator.bytes_hashed
+                
+                elapsed_time = time.time() - started
             
-            result = {
-                'success': True,
-                'decrypted_file': str(decrypted_path),
-                'original_size': original_size,
-                'decrypted_size': len(decrypted_data),
-                'hash_match': decrypted_hash == original_hash if original_hash else None,
-                'original_hash': original_hash,
-                'decrypted_hash': decrypted_hash,
+            return {
+                'valid': hmac_valid,
+                'integrity_check': 'PASSED' if hmac_valid else 'FAILED',
+                'bytes_verified': bytes_verified,
                 'elapsed_time': elapsed_time,
-                'was_compressed': was_compressed,
-                'header_info': {
+                'bytes_per_sec': bytes_verified / elapsed_time if elapsed_time > 0 else 0,
+                'file_info': {
                     'original_name': header.get('original_name'),
+                    'original_size': header.get('original_size'),
+                    'encrypted_size': os.path.getsize(encrypted_file),
+                    'algorithm': header.get('algorithm'),
                     'timestamp': header.get('timestamp'),
-                    'algorithm': header.get('algorithm')
-                }
+                    'was_compressed': self._header_codec(header) != 'none',
+                    'codec': self._header_codec(header)
+                },
+                'password_hash_match': True
             }
             
-            self.log(f"Дешифрование завершено за {elapsed_time:.2f} секунд")
-            return result
-            
         except Exception as e:
-            self.log(f"Ошибка дешифрования: {str(e)}", "ERROR")
-            import traceback
-            traceback.print_exc()
             return {
-                'success': False,
-                'error': f'Ошибка дешифрования: {str(e)}'
+                'valid': False,
+                'error': f'Ошибка проверки: {str(e)}'
             }
     
-    def secure_delete_file(self, filepath, passes=7):
+    def _verify_v6_segments(self, f, header, key, workers=None, use_mmap=False):
         """
-        Безопасное удаление файла с перезаписью
+        Проверка тегов всех сегментов V6 без получения открытых данных
         
         Args:
-            filepath: Путь к файлу
-            passes: Количество проходов перезаписи
+            f: Открытый контейнер
+            header: Заголовок контейнера
+            key: Ключ
+            workers: Потоков проверки (None - DECRYPT_WORKERS)
+            use_mmap: Читать через mmap
+        
+        Returns:
+            Кортеж (все сегменты подлинные, прочитано байт)
         """
-        if not os.path.exists(filepath):
-            return
+        if workers is None:
+            workers = self.DECRYPT_WORKERS
         
-        file_size = os.path.getsize(filepath)
+        aead = self._v6_aead(header)
+        if aead is None:
+            return False, 0
         
-        patterns = [
-            b'\x00' * file_size,  # Нули
-            b'\xFF' * file_size,  # Единицы
-            b'\xAA' * file_size,  # 10101010
-            b'\x55' * file_size,  # 01010101
-            secrets.token_bytes(file_size),  # Случайные данные
-            b'\x00' * file_size,  # Еще нули
-            secrets.token_bytes(file_size),  # Еще случайные данные
-        ]
+        salt = base64.b64decode(header['salt'])
+        nonce_prefix = base64.b64decode(header['nonce_prefix'])
+        segment_size = int(header['segment_size'])
+        read_size = (segment_size + V6_TAG_SIZE) * max(1, workers)
+        executor = self._make_executor(workers)
         
+        checker = SVXSegmentDecryptor(
+            None, key, nonce_prefix, self.MAGIC_HEADER_V6 + salt,
+            segment_size=segment_size,
+            executor=executor,
+            batch=workers,
+            aead=aead
+        )
         try:
-            for i in range(min(passes, len(patterns))):
-                self.log(f"Проход безопасного удаления {i+1}/{passes}")
-                
-                with open(filepath, 'wb') as f:
-                    if i < len(patterns):
-                        f.write(patterns[i])
+            body_end = self._body_end(header, os.fstat(f.fileno()).st_size)
+            for chunk in _iter_file_chunks(f, self.HEADER_SIZE, read_size, use_mmap, end=body_end):
+                checker.write(chunk)
+            checker.close()
+            return True, checker.bytes_in
+        except ValueError:
+            return False, checker.bytes_in
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    
+    def verify_merkle(self, encrypted_file, sample=None, workers=None):
+        """
+        Проверка тела архива по дереву хэшей, без пароля
+        
+        Ловит порчу носителя; подлинность проверяет verify_integrity.
+        
+        Args:
+            encrypted_file: Зашифрованный файл
+            sample: Сколько случайных кусков проверить (None - все)
+            workers: Потоков хэширования (None - DECRYPT_WORKERS)
+        
+        Returns:
+            Словарь с результатами проверки
+        """
+        try:
+            if not os.path.exists(encrypted_file):
+                return {'valid': False, 'error': 'Файл не существует'}
+            
+            header, error = self._read_header(encrypted_file)
+            if error:
+                return {'valid': False, 'error': error}
+            
+            container_version = self._container_version(header)
+            if container_version == 6:
+                body_offset = self.HEADER_SIZE
+            elif container_version == 5:
+                body_offset = self.HEADER_SIZE + 32
+            else:
+                return {'valid': False, 'error': 'Неверный формат файла'}
+            
+            merkle = header.get('merkle')
+            if not merkle:
+                return {'valid': False, 'error': 'В архиве нет дерева хэшей'}
+            
+            algorithm = merkle['algorithm']
+            chunk_size = int(merkle['chunk_size'])
+            chunks_total = int(merkle['chunks'])
+            root = bytes.fromhex(merkle['root'])
+            if algorithm not in MERKLE_ALGORITHMS or chunk_size <= 0:
+                return {'valid': False, 'error': 'Неверные параметры дерева хэшей'}
+            
+            body_end = self._body_end(header, os.path.getsize(encrypted_file))
+            body_size = body_end - body_offset
+            if -(-body_size // chunk_size) != chunks_total:
+                return {'valid': False, 'integrity_check': 'FAILED',
+                        'error': 'Размер архива не совпадает с деревом хэшей'}
+            
+            leaves = self._load_merkle_leaves(encrypted_file, merkle)
+            if leaves is not None and merkle_root(algorithm, leaves) != root:
+                return {'valid': False, 'integrity_check': 'FAILED',
+                        'error': 'Листья дерева не совпадают с корнем'}
+            if leaves is None and sample is not None:
+                return {'valid': False, 'error': 'Для выборочной проверки нужны листья дерева'}
+            
+            if workers is None:
+                workers = self.DECRYPT_WORKERS
+            executor = self._make_executor(workers)
+            started = time.time()
+            
+            try:
+                with open(encrypted_file, 'rb') as f:
+                    if sample is None:
+                        indices = range(chunks_total)
+                        chunks = (
+                            piece
+                            for block in _iter_file_chunks(f, body_offset, chunk_size * max(1, workers),
+                                                           end=body_end)
+                            for piece in _split(block, chunk_size)
+                        )
                     else:
-                        f.write(secrets.token_bytes(file_size))
-                
-                f.flush()
-                os.fsync(f.fileno())
+                        indices = sorted(random.SystemRandom().sample(
+                            range(chunks_total), min(int(sample), chunks_total)
+                        ))
+                        chunks = (self._read_chunk(f, body_offset + i * chunk_size, chunk_size)
+                                  for i in indices)
+                    
+                    computed = []
+                    batch = []
+                    bytes_verified = 0
+                    for chunk in chunks:
+                        bytes_verified += len(chunk)
+                        batch.append(bytes(chunk))
+                        if len(batch) >= max(1, workers):
+                            computed.extend(self._hash_leaves(executor, algorithm, batch))
+                            batch = []
+                    computed.extend(self._hash_leaves(executor, algorithm, batch))
+            finally:
+                if executor is not None:
+                    executor.shutdown()
             
-            # Финальное удаление
-            os.remove(filepath)
-            self.log(f"Файл безопасно удален: {filepath}")
+            elapsed_time = time.time() - started
+            indices = list(indices)
+            
+            if leaves is not None:
+                bad_chunks = [i for i, leaf in zip(indices, computed) if leaf != leaves[i]]
+                valid = not bad_chunks and len(computed) == len(indices)
+            else:
+                bad_chunks = []
+                valid = merkle_root(algorithm, computed) == root
+            
+            return {
+                'valid': valid,
+                'integrity_check': 'PASSED' if valid else 'FAILED',
+                'mode': 'full' if sample is None else 'sample',
+                'chunks_checked': len(computed),
+                'chunks_total': chunks_total,
+                'bad_chunks': bad_chunks,
+                'bytes_verified': bytes_verified,
+                'elapsed_time': elapsed_time,
+                'bytes_per_sec': bytes_verified / elapsed_time if elapsed_time > 0 else 0
+            }
             
         except Exception as e:
-            self.log(f"Ошибка безопасного удаления: {str(e)}", "WARNING")
-            # Пробуем обычное удаление
-            try:
-                os.remove(filepath)
-            except:
-                pass
+            return {'valid': False, 'error': f'Ошибка проверки: {str(e)}'}
     
-    def encrypt_directory(self, directory_path, password_text, 
-                         include_subdirs=True, create_single_archive=True):
+    def _load_merkle_leaves(self, encrypted_file, merkle):
+        """Листья дерева из заголовка или хвоста контейнера (None если их нет)"""
+        if 'leaves' in merkle:
+            data = base64.b64decode(merkle['leaves'])
+        elif 'leaves_offset' in merkle:
+            with open(encrypted_file, 'rb') as f:
+                f.seek(int(merkle['leaves_offset']))
+                data = f.read(int(merkle['chunks']) * MERKLE_DIGEST_SIZE)
+        else:
+            return None
+        
+        if len(data) != int(merkle['chunks']) * MERKLE_DIGEST_SIZE:
+            return None
+        return [data[i:i + MERKLE_DIGEST_SIZE] for i in range(0, len(data), MERKLE_DIGEST_SIZE)]
+    
+    def _read_chunk(self, f, offset, size):
+        f.seek(offset)
+        return f.read(size)
+    
+    def _hash_leaves(self, executor, algorithm, chunks):
+        """Хэши листьев пачки кусков (параллельно, если есть пул)"""
+        algorithms = [algorithm] * len(chunks)
+        if executor is not None and len(chunks) > 1:
+            return list(executor.map(_merkle_leaf, algorithms, chunks))
+        return list(map(_merkle_leaf, algorithms, chunks))
+    
+    def _v6_aead(self, header):
+        """Короткое имя AEAD по полю algorithm заголовка V6 (None если неизвестен)"""
+        for aead, name in self.AEAD_ALGORITHMS.items():
+            if header.get('algorithm') == name:
+                return aead
+        return None
+    
+    def inspect_file(self, encrypted_file):
         """
-        Шифрование всей директории
+        Сведения об архиве только по заголовку, без пароля и чтения данных
         
         Args:
-            directory_path: Путь к директории
-            password_text: Мега-пароль
-            include_subdirs: Включать поддиректории
-            create_single_archive: Создать единый архив
+            encrypted_file: Зашифрованный файл
         
         Returns:
-            Словарь с результатами
+            Словарь с открытыми полями заголовка
         """
-        if not os.path.isdir(directory_path):
-            return {'success': False, 'error': 'Не является директорией'}
-        
-        self.log(f"Шифрование директории: {directory_path}")
-        
-        # Создание архива если нужно
-        if create_single_archive:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            archive_name = f"ARCHIVE_{Path(directory_path).name}_{timestamp}"
-            archive_path = Path(directory_path).parent / f"{archive_name}.zip"
-            
-            try:
-                # Создание ZIP архива
-                with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(directory_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, directory_path)
-                            zipf.write(file_path, arcname)
-                
-                # Шифрование архива
-                result = self.encrypt_file(str(archive_path), password_text)
-                
-                # Удаление временного архива
-                if os.path.exists(archive_path):
-                    os.remove(archive_path)
-                
-                return result
-                
-            except Exception as e:
-                self.log(f"Ошибка создания архива: {str(e)}", "ERROR")
-                return {'success': False, 'error': str(e)}
-        
-        else:
-            # Шифрование каждого файла отдельно
-            results = []
-            total_size = 0
-            
-            for root, dirs, files in os.walk(directory_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    
-                    try:
-                        result = self.encrypt_file(file_path, password_text)
-                        results.append(result)
-                        
-                        if result['success']:
-                            total_size += result.get('original_size', 0)
-                        
-                        self.log(f"Зашифрован: {file}")
-                        
-                    except Exception as e:
-                        self.log(f"Ошибка шифрования {file}: {str(e)}", "ERROR")
+        try:
+            if not os.path.exists(encrypted_file):
+                return {'success': False, 'error': 'Файл не существует'}
+            
+            header, error = self._read_header(encrypted_file)
+            if error:
+                return {'success': False, 'error': error}
+            
+            container_version = self._container_version(header)
+            if container_version is None:
+                return {'success': False, 'error': 'Неверный формат файла'}
             
             return {
                 'success': True,
-                'total_files': len(results),
-                'successful': sum(1 for r in results if r.get('success')),
-                'failed': sum(1 for r in results if not r.get('success')),
-                'total_size': total_size,
-                'individual_results': results
+                'file_info': {
+                    'original_name': header.get('original_name'),
+                    'original_path': header.get('original_path'),
+                    'original_size': header.get('original_size'),
+                    'encrypted_size': os.path.getsize(encrypted_file),
+                    'algorithm': header.get('algorithm'),
+                    'timestamp': header.get('timestamp'),
+                    'was_compressed': self._header_codec(header) != 'none',
+                    'codec': self._header_codec(header),
+                    'compression_ratio': header.get('compression_ratio', 1.0),
+                    'version': header.get('version'),
+                    'container_version': container_version
+                }
             }
+            
+        except Exception as e:
+            return {'success': False, 'error': f'Ошибка чтения заголовка: {str(e)}'}
     
-    def verify_integrity(self, encrypted_file, password_text):
+    def update_catalog(self, root_dir, catalog_file):
         """
-        Проверка целостности зашифрованного файла
+        Инкрементальное обновление каталога архивов каталога root_dir
         
         Args:
-            encrypted_file: Зашифрованный файл
-            password_text: Пароль
+            root_dir: Корневой каталог с архивами
+            catalog_file: Файл базы SQLite
         
         Returns:
-            Словарь с результатами проверки
+            Словарь с результатами обновления
         """
         try:
-            if not os.path.exists(encrypted_file):
-                return {'valid': False, 'error': 'Файл не существует'}
+            if not os.path.isdir(root_dir):
+                return {'success': False, 'error': 'Каталог не существует'}
             
-            with open(encrypted_file, 'rb') as f:
-                header_data = f.read(self.HEADER_SIZE)
+            start_time = time.time()
             
-            null_pos = header_data.find(b'\x00')
-            if null_pos == -1:
-                return {'valid': False, 'error': 'Неверный заголовок'}
+            def inspect(path):
+                result = self.inspect_file(path)
+                return result.get('file_info'), result.get('error')
             
-            try:
-                header = json.loads(header_data[:null_pos].decode('utf-8'))
-            except:
-                return {'valid': False, 'error': 'Неверный формат заголовка'}
+            paths = (os.path.abspath(path) for path in self._iter_vault_files(root_dir))
+            with VaultCatalog(catalog_file) as catalog:
+                stats = catalog.update(os.path.abspath(root_dir), paths, inspect)
+                stats['total'] = len(catalog)
             
-            # Проверка магического числа
-            if header.get('magic') != self.MAGIC_HEADER.hex():
-                return {'valid': False, 'error': 'Неверный формат файла'}
+            stats.update({
+                'success': True,
+                'catalog_file': catalog_file,
+                'elapsed_time': time.time() - start_time
+            })
+            self.log(f"Каталог обновлен: +{stats['added']} ~{stats['updated']} -{stats['removed']}")
+            return stats
             
-            # Проверка хэша пароля
-            password_hash = hashlib.sha3_512(password_text.encode('utf-8')).hexdigest()
-            if header.get('password_hash') != password_hash:
-                return {'valid': False, 'error': 'Неверный пароль'}
+        except Exception as e:
+            self.log(f"Ошибка обновления каталога: {str(e)}", "ERROR")
+            return {'success': False, 'error': str(e)}
+    
+    def search_catalog(self, catalog_file, name=None, date_from=None, date_to=None, limit=None):
+        """
+        Поиск архивов в каталоге (см. VaultCatalog.search)
+        
+        Returns:
+            Словарь со списком найденных архивов
+        """
+        try:
+            if not os.path.exists(catalog_file):
+                return {'success': False, 'error': 'Каталог не существует'}
             
-            # Проверка HMAC
-            salt = base64.b64decode(header['salt'])
-            iv = base64.b64decode(header['iv'])
-            stored_hmac = base64.b64decode(header['hmac_tag'])
+            with VaultCatalog(catalog_file) as catalog:
+                matches = catalog.search(name, date_from, date_to, limit)
             
-            with open(encrypted_file, 'rb') as f:
-                f.seek(self.HEADER_SIZE + 32)  # Пропускаем HMAC
-                encrypted_data = f.read()
-            
-            # Создание ключа для проверки
-            key = hashlib.pbkdf2_hmac(
-                'sha512',
-                password_text.encode('utf-8'),
-                salt,
-                100000,
-                dklen=32
-            )
+            return {'success': True, 'matches': matches}
             
-            calculated_hmac = hashlib.sha256(
-                encrypted_data + salt + iv + key
-            ).digest()
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def verify_all(self, root_dir, password_map, results_file, workers=None, use_mmap=False):
+        """
+        Проверка целостности всех .svx файлов в дереве каталогов
+        
+        Файл результатов (JSONL) одновременно служит контрольной точкой:
+        при повторном запуске пропускаются файлы, для которых уже есть
+        запись с тем же путем, размером и временем изменения.
+        
+        Args:
+            root_dir: Корневой каталог с архивами
+            password_map: Словарь {путь или шаблон .svx: файл пароля};
+                пути относительно root_dir, шаблоны в стиле fnmatch ('*' - по умолчанию)
+            results_file: Файл результатов JSONL (дописывается)
+            workers: Количество параллельных проверок (None - DECRYPT_WORKERS)
+            use_mmap: Читать архивы через mmap
+        
+        Returns:
+            Словарь со сводкой проверки
+        """
+        try:
+            if not os.path.isdir(root_dir):
+                return {'success': False, 'error': 'Каталог не существует'}
             
-            hmac_valid = calculated_hmac == stored_hmac
+            workers = max(1, workers or self.DECRYPT_WORKERS)
+            start_time = time.time()
             
-            return {
-                'valid': hmac_valid,
-                'integrity_check': 'PASSED' if hmac_valid else 'FAILED',
-                'file_info': {
-                    'original_name': header.get('original_name'),
-                    'original_size': header.get('original_size'),
-                    'encrypted_size': os.path.getsize(encrypted_file),
-                    'algorithm': header.get('algorithm'),
-                    'timestamp': header.get('timestamp'),
-                    'was_compressed': header.get('was_compressed', False)
-                },
-                'password_hash_match': True
-            }
+            done = self._load_verify_checkpoint(results_file)
+            passwords = {}
+            summary = {'total': 0, 'passed': 0, 'failed': 0, 'skipped': 0}
+            
+            def verify_one(path, password):
+                result = self.verify_integrity(path, password, use_mmap=use_mmap, workers=1)
+                result.pop('file_info', None)
+                result.pop('password_hash_match', None)
+                return result
+            
+            def record(f, entry, result):
+                entry.update(result)
+                entry['verified_at'] = datetime.now().isoformat()
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                summary['passed' if result.get('valid') else 'failed'] += 1
+            
+            with open(results_file, 'a', encoding='utf-8') as f, \
+                    ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = {}
+                
+                for path in self._iter_vault_files(root_dir):
+                    summary['total'] += 1
+                    try:
+                        stat = os.stat(path)
+                    except OSError as e:
+                        # Файл удален или недоступен во время проверки - отмечаем и идем дальше
+                        record(f, {'path': path}, {'valid': False, 'error': str(e)})
+                        continue
+                    entry = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+                    
+                    if (path, stat.st_size, stat.st_mtime) in done:
+                        summary['skipped'] += 1
+                        continue
+                    
+                    password_file = self._match_password_file(root_dir, path, password_map)
+                    if password_file is None:
+                        record(f, entry, {'valid': False, 'error': 'Нет файла пароля'})
+                        continue
+                    
+                    if password_file not in passwords:
+                        passwords[password_file] = self.load_password(password_file)
+                    if passwords[password_file] is None:
+                        record(f, entry, {'valid': False, 'error': 'Не удалось прочитать пароль'})
+                        continue
+                    
+                    # Ограничиваем число задач в очереди, а не всё дерево сразу
+                    if len(pending) >= workers * 2:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            record(f, pending.pop(future), future.result())
+                    
+                    pending[executor.submit(verify_one, path, passwords[password_file])] = entry
+                
+                for future in as_completed(pending):
+                    record(f, pending[future], future.result())
+            
+            for password in passwords.values():
+                if password is not None:
+                    password.wipe()
+            self.clear_password_cache()
+            
+            summary.update({
+                'success': True,
+                'results_file': results_file,
+                'elapsed_time': time.time() - start_time
+            })
+            self.log(f"Проверено {summary['passed'] + summary['failed']} файлов, "
+                     f"ошибок: {summary['failed']}, пропущено: {summary['skipped']}")
+            return summary
             
         except Exception as e:
-            return {
-                'valid': False,
-                'error': f'Ошибка проверки: {str(e)}'
-            }
+            self.clear_password_cache()
+            self.log(f"Ошибка массовой проверки: {str(e)}", "ERROR")
+            return {'success': False, 'error': str(e)}
+    
+    def _iter_vault_files(self, root_dir):
+        """Все .svx файлы дерева в стабильном порядке"""
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith('.svx'):
+                    yield os.path.join(dirpath, filename)
+    
+    def _match_password_file(self, root_dir, path, password_map):
+        """Файл пароля для архива: точный путь, затем шаблоны в порядке словаря"""
+        relative = os.path.relpath(path, root_dir)
+        for key in (path, relative, relative.replace(os.sep, '/')):
+            if key in password_map:
+                return password_map[key]
+        for pattern, password_file in password_map.items():
+            if fnmatch.fnmatch(relative.replace(os.sep, '/'), pattern):
+                return password_file
+        return None
+    
+    def _load_verify_checkpoint(self, results_file):
+        """Множество (путь, размер, mtime) файлов с готовым результатом проверки"""
+        done = set()
+        if not os.path.exists(results_file):
+            return done
+        with open(results_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после прерывания
+                    continue
+                # Файлы без результата проверки (нет пароля, ошибка чтения) повторяются
+                if 'integrity_check' in entry:
+                    done.add((entry['path'], entry['size'], entry['mtime']))
+        return done
+
+# Процесс пула iter_encrypt_directory: свой SuperVaultX и пароль на весь процесс
+_directory_worker = None
+
+
+def _init_directory_worker(settings, password_text):
+    global _directory_worker
+    vault = SuperVaultX()
+    for name, value in settings.items():
+        setattr(vault, name, value)  # Через setattr - свойства вроде KEY_CACHE_SIZE
+    _directory_worker = (vault, password_text)
+
+
+def _encrypt_directory_file_in_worker(file_path, options):
+    vault, password_text = _directory_worker
+    return vault._encrypt_directory_file(file_path, password_text, options)
 
 # ============================================================================
 # ГРАФИЧЕСКИЙ ИНТЕРФЕЙС
@@ -1571,7 +6574,8 @@ if GUI_AVAILABLE:
                         password,
                         delete_original=True,
                         secure_delete_passes=7,
-                        compress_before_encrypt=True
+                        compress_before_encrypt=True,
+                        async_delete=True
                     )
                 else:
                     self.log("📁 Начинаю шифрование папки...", "info")
@@ -1603,11 +6607,17 @@ if GUI_AVAILABLE:
                         self.log(f"📊 Размер: {result['original_size']:,} → {result['encrypted_size']:,} байт", "info")
                         self.log(f"⏱️  Время: {result['elapsed_time']:.2f} секунд", "info")
                         self.log(f"📈 Коэффициент: {result.get('encryption_ratio', 1):.2f}x", "info")
+                        if result.get('shred_job_id'):
+                            self.log(f"🗑️  Оригинал удаляется в фоне (задание {result['shred_job_id']})", "info")
                     else:
                         self.log(f"📁 Зашифрованный архив создан", "success")
                         self.log(f"🔑 Файл с паролем: {os.path.basename(password_file)}", "success")
                     
                     # Сообщение пользователю
+                    if result.get('shred_job_id'):
+                        shred_note = "3. Оригинал безопасно удаляется в фоне."
+                    else:
+                        shred_note = "3. Оригинал был безопасно удален."
                     messagebox.showinfo(
                         "✅ УСПЕХ!",
                         f"Шифрование завершено успешно!\n\n"
@@ -1616,7 +6626,7 @@ if GUI_AVAILABLE:
                         f"⚠️ ⚠️ ⚠️ ВАЖНО ⚠️ ⚠️ ⚠️\n"
                         f"1. Сохраните файл с паролем в БЕЗОПАСНОМ месте!\n"
                         f"2. Без этого файла восстановление НЕВОЗМОЖНО!\n"
-                        f"3. Оригинал был безопасно удален.\n\n"
+                        f"{shred_note}\n\n"
                         f"⏱️  Время: {result.get('elapsed_time', 0):.2f} сек"
                     )
                     
@@ -1677,9 +6687,9 @@ if GUI_AVAILABLE:
             
             # Выбор файла с паролем
             password_file = filedialog.askopenfilename(
-                title="Выберите файл с паролем (.txt)",
+                title="Выберите файл с паролем (.txt или .svxkey)",
                 filetypes=[
-                    ("Текстовые файлы", "*.txt"),
+                    ("Файлы пароля", "*.txt *.svxkey"),
                     ("Все файлы", "*.*")
                 ]
             )
@@ -1696,7 +6706,7 @@ if GUI_AVAILABLE:
             
             # Используем новую функцию для чтения пароля
             self.log("📖 Читаю пароль из файла...", "info")
-            password = self.vault.read_password_from_file(password_file)
+            password = self.vault.load_password(password_file)
             
             if not password:
                 messagebox.showerror(
@@ -1706,7 +6716,7 @@ if GUI_AVAILABLE:
                 return
             
             # Проверка длины
-            line_count = len(password.split('\n'))
+            line_count = password.data.count(b'\n') + 1
             if line_count < 100:
                 response = messagebox.askyesno(
                     "Предупреждение",
@@ -1736,7 +6746,8 @@ if GUI_AVAILABLE:
                 self.log("=" * 70, "info")
                 
                 self.log(f"Файл: {os.path.basename(encrypted_file)}", "info")
-                self.log(f"Длина пароля: {len(password.split(chr(10)))} строк", "info")
+                line_count = password.data.count(b'\n') + 1
+                self.log(f"Длина пароля: {line_count} строк", "info")
                 
                 self.log("🔓 Начинаю дешифрование...", "info")
                 result = self.vault.decrypt_file(
@@ -1992,15 +7003,35 @@ if GUI_AVAILABLE:
 def cmd_encrypt():
     """Шифрование через командную строку"""
     if len(sys.argv) < 3:
-        print("Использование: python app.py encrypt <путь_к_файлу>")
+        print("Использование: python app.py encrypt <путь_к_файлу> [--profile fast|balanced|compact|max] [--lines N]")
         return
     
     file_path = sys.argv[2]
+    options = sys.argv[3:]
     
     if not os.path.exists(file_path):
         print(f"❌ Ошибка: Файл не найден: {file_path}")
         return
     
+    profile = None
+    if '--profile' in options:
+        index = options.index('--profile') + 1
+        profile = options[index] if index < len(options) else None
+        if profile not in COMPRESSION_PROFILES:
+            print(f"❌ Ошибка: Профиль сжатия: {', '.join(COMPRESSION_PROFILES)}")
+            return
+    
+    lines = 10000
+    if '--lines' in options:
+        index = options.index('--lines') + 1
+        try:
+            lines = int(options[index])
+        except (IndexError, ValueError):
+            lines = 0
+        if lines < 1:
+            print("❌ Ошибка: --lines должно быть положительным числом")
+            return
+    
     print(f"\n{'='*70}")
     print(f"🚀 SUPER VAULT X - Шифрование")
     print(f"{'='*70}")
@@ -2043,20 +7074,31 @@ def cmd_encrypt():
             print("\n❌ Прервано пользователем")
             return
     
-    print(f"\n⚡ Создаю мега-пароль из 10000 строк...")
-    vault = SuperVaultX()
+    print(f"\n⚡ Создаю мега-пароль из {lines} строк...")
+    vault = SuperVaultX(lines)
     
+    # Большой пароль пишется сразу на диск и в память не загружается
+    password_file = None
     try:
-        password, _, stats = vault.create_mega_password(words, dates, {})
+        if lines >= vault.PASSWORD_STREAM_LINES:
+            password_file, password, _, stats = vault.create_mega_password_file(file_path, words, dates, {})
+        else:
+            password, _, stats = vault.create_mega_password(words, dates, {})
     except Exception as e:
         print(f"❌ Ошибка создания пароля: {str(e)}")
         return
     
     print("🔒 Шифрую файл...")
-    result = vault.encrypt_file(file_path, password, delete_original=True)
+    result = vault.encrypt_file(file_path, password, delete_original=True,
+                                compression_profile=profile)
+    
+    if not result['success'] and password_file:
+        # Файл так и не зашифрован - пароль к нему не нужен
+        os.remove(password_file)
     
     if result['success']:
-        password_file = vault.save_password_to_file(password, file_path, stats)
+        if password_file is None:
+            password_file = vault.save_password_to_file(password, file_path, stats)
         elapsed = result.get('elapsed_time', 0)
         
         print(f"\n{'='*70}")
@@ -2065,6 +7107,7 @@ def cmd_encrypt():
         print(f"📁 Зашифрованный файл: {os.path.basename(result['encrypted_file'])}")
         print(f"🔑 Файл с паролем: {os.path.basename(password_file)}")
         print(f"📊 Размер: {result['original_size']:,} → {result['encrypted_size']:,} байт")
+        print(f"🗜️  Сжатие: {result['codec']}")
         print(f"⏱️  Время: {elapsed:.2f} секунд")
         print(f"📈 Коэффициент: {result.get('encryption_ratio', 1):.2f}x")
         print(f"\n⚠️  СОХРАНИТЕ ФАЙЛ С ПАРОЛЕМ!")
@@ -2075,7 +7118,7 @@ def cmd_encrypt():
 def cmd_decrypt():
     """Дешифрование через командную строку"""
     if len(sys.argv) < 4:
-        print("Использование: python app.py decrypt <зашифрованный.svx> <пароль.txt>")
+        print("Использование: python app.py decrypt <зашифрованный.svx> <пароль.txt|ключ.svxkey>")
         return
     
     encrypted_file = sys.argv[2]
@@ -2099,13 +7142,13 @@ def cmd_decrypt():
     
     # Используем новую функцию для чтения пароля
     vault = SuperVaultX()
-    password = vault.read_password_from_file(password_file)
+    password = vault.load_password(password_file)
     
     if not password:
         print("❌ Ошибка: Не удалось прочитать пароль из файла!")
         return
     
-    line_count = len(password.split('\n'))
+    line_count = password.data.count(b'\n') + 1
     print(f"📊 Найден пароль из {line_count} строк")
     
     if line_count < 100:
@@ -2151,10 +7194,13 @@ def cmd_help():
    Или просто запустите файл
 
 2. Шифрование файла:
-   python app.py encrypt <путь_к_файлу>
+   python app.py encrypt <путь_к_файлу> [--profile fast|balanced|compact|max] [--lines N]
    
    Пример:
    python app.py encrypt C:\\Users\\Name\\secret.pdf
+   
+   Пароль от 100000 строк пишется сразу на диск:
+   python app.py encrypt backup.tar --lines 1000000
 
 3. Дешифрование файла:
    python app.py decrypt <файл.svx> <пароль.txt>
@@ -2163,7 +7209,34 @@ def cmd_help():
    python app.py decrypt ENCRYPTED_secret_20251221_120000.svx SUPER_PASSWORD_secret_20251221_120000.txt
 
 4. Проверка целостности:
-   python app.py verify <файл.svx>
+   python app.py verify <файл.svx> [--mmap]
+
+   Без пароля по дереву хэшей (все куски или выборка из N):
+   python app.py spot-check <файл.svx> [N]
+
+5. Проверка всех архивов каталога (с продолжением после прерывания):
+   python app.py verify-all <каталог> <карта.json|пароль.txt> <результаты.jsonl> [--workers N]
+
+6. Дождаться фонового удаления оригиналов (и продолжить прерванное):
+   python app.py shred-drain [ID_задания]
+
+7. Сведения об архиве без пароля (только заголовок):
+   python app.py inspect <файл.svx>
+
+8. Каталог архивов и поиск:
+   python app.py catalog <каталог> <каталог.db>
+   python app.py find <каталог.db> report.pdf --from 2025-03 --to 2025-03
+
+9. Двоичный файл ключа (быстрая загрузка) и обратно в текст:
+   python app.py keyfile <пароль.txt> [ключ.svxkey]
+   python app.py keyfile <ключ.svxkey> [пароль.txt]
+
+10. Инкрементальное хранилище каталога (шифруются только изменения):
+   python app.py vault <каталог> <пароль.txt|ключ.svxkey> [--to DIR] [--workers N] [--prune]
+
+11. Хранилище кусков с дедупликацией (версии похожих файлов):
+   python app.py store <файл> <пароль.txt|ключ.svxkey> <хранилище>
+   python app.py restore <рецепт.svxr> <пароль.txt|ключ.svxkey> [хранилище]
 
 ⚙️ ОСОБЕННОСТИ:
 
@@ -2194,10 +7267,11 @@ def cmd_help():
 def cmd_verify():
     """Проверка целостности"""
     if len(sys.argv) < 3:
-        print("Использование: python app.py verify <файл.svx>")
+        print("Использование: python app.py verify <файл.svx> [--mmap]")
         return
     
     encrypted_file = sys.argv[2]
+    use_mmap = '--mmap' in sys.argv[3:]
     
     if not os.path.exists(encrypted_file):
         print(f"❌ Ошибка: Файл не найден: {encrypted_file}")
@@ -2226,7 +7300,7 @@ def cmd_verify():
         return
     
     vault = SuperVaultX()
-    result = vault.verify_integrity(encrypted_file, password)
+    result = vault.verify_integrity(encrypted_file, password, use_mmap=use_mmap)
     
     if result['valid']:
         print(f"\n✅ ЦЕЛОСТНОСТЬ ПОДТВЕРЖДЕНА!")
@@ -2235,10 +7309,303 @@ def cmd_verify():
         print(f"🔒 Алгоритм: {result['file_info']['algorithm']}")
         print(f"📅 Дата создания: {result['file_info']['timestamp']}")
         print(f"✅ HMAC проверка: {result['integrity_check']}")
+        print(f"⚡ Скорость: {result['bytes_per_sec'] / (1024 * 1024):.1f} МБ/с "
+              f"({result['bytes_verified']:,} байт за {result['elapsed_time']:.2f} сек)")
     else:
         print(f"\n❌ НАРУШЕНА ЦЕЛОСТНОСТЬ!")
         print(f"Ошибка: {result.get('error')}")
 
+def cmd_keyfile():
+    """Преобразование файла пароля в двоичный файл ключа и обратно"""
+    if len(sys.argv) < 3:
+        print("Использование: python app.py keyfile <пароль.txt|ключ.svxkey> [выходной_файл]")
+        return
+    
+    source = sys.argv[2]
+    target = sys.argv[3] if len(sys.argv) > 3 else None
+    
+    if not os.path.exists(source):
+        print(f"❌ Ошибка: Файл не найден: {source}")
+        return
+    
+    vault = SuperVaultX()
+    if is_keyfile(source):
+        result = vault.convert_keyfile_to_password(source, target)
+        kind = "Файл с паролем"
+    else:
+        result = vault.convert_password_to_keyfile(source, target)
+        kind = "Файл ключа"
+    
+    if result:
+        print(f"\n✅ {kind}: {result}")
+    else:
+        print(f"\n❌ Ошибка: Не удалось преобразовать {source}")
+
+def cmd_vault():
+    """Инкрементальное шифрование каталога в хранилище"""
+    if len(sys.argv) < 4:
+        print("Использование: python app.py vault <каталог> <пароль.txt|ключ.svxkey> [--to DIR] [--workers N] [--prune]")
+        return
+    
+    directory = sys.argv[2]
+    password_file = sys.argv[3]
+    options = sys.argv[4:]
+    
+    if not os.path.isdir(directory):
+        print(f"❌ Ошибка: Каталог не найден: {directory}")
+        return
+    
+    vault_dir = None
+    if '--to' in options:
+        index = options.index('--to') + 1
+        vault_dir = options[index] if index < len(options) else None
+    
+    workers = None
+    if '--workers' in options:
+        try:
+            workers = int(options[options.index('--workers') + 1])
+        except (IndexError, ValueError):
+            print("❌ Ошибка: --workers должно быть числом")
+            return
+    
+    vault = SuperVaultX()
+    password = vault.load_password(password_file)
+    if not password:
+        print("❌ Ошибка: Не удалось прочитать пароль из файла!")
+        return
+    
+    result = vault.encrypt_directory_incremental(directory, password, vault_dir,
+                                                 workers=workers, prune_deleted='--prune' in options)
+    
+    if 'vault_dir' not in result:
+        print(f"\n❌ Ошибка: {result.get('error')}")
+        return
+    
+    print(f"\n{'='*70}")
+    print(f"🗄️  Хранилище: {result['vault_dir']}")
+    print(f"📁 Файлов в каталоге: {result['total_files']:,}")
+    print(f"➕ Новых: {result['added']:,}   ✏️  Измененных: {result['modified']:,}")
+    print(f"⏸️  Без изменений: {result['unchanged'] + result['touched']:,}   🗑️  Удаленных: {result['deleted']:,}")
+    print(f"📊 Зашифровано: {result['bytes_encrypted']:,} байт за {result['elapsed_time']:.2f} сек")
+    for error in result['errors']:
+        print(f"❌ {error['path']}: {error['error']}")
+
+def cmd_store():
+    """Шифрование файла в хранилище кусков с дедупликацией"""
+    if len(sys.argv) < 5:
+        print("Использование: python app.py store <файл> <пароль.txt|ключ.svxkey> <хранилище>")
+        return
+    
+    file_path, password_file, store_dir = sys.argv[2:5]
+    if not os.path.exists(file_path):
+        print(f"❌ Ошибка: Файл не найден: {file_path}")
+        return
+    
+    vault = SuperVaultX()
+    password = vault.load_password(password_file)
+    if not password:
+        print("❌ Ошибка: Не удалось прочитать пароль из файла!")
+        return
+    
+    result = vault.encrypt_file_dedup(file_path, password, store_dir)
+    
+    if result['success']:
+        print(f"\n✅ Рецепт: {os.path.basename(result['recipe_file'])}")
+        print(f"🧩 Кусков: {result['chunks']:,} (новых: {result['new_chunks']:,})")
+        print(f"📊 Записано: {result['stored_bytes'] + result['recipe_size']:,} байт "
+              f"из {result['original_size']:,} (x{result['dedup_ratio']:.1f})")
+        print(f"⏱️  Время: {result['elapsed_time']:.2f} секунд")
+    else:
+        print(f"\n❌ Ошибка: {result.get('error')}")
+
+def cmd_restore():
+    """Восстановление файла по рецепту из хранилища кусков"""
+    if len(sys.argv) < 4:
+        print("Использование: python app.py restore <рецепт.svxr> <пароль.txt|ключ.svxkey> [хранилище]")
+        return
+    
+    recipe_file, password_file = sys.argv[2:4]
+    store_dir = sys.argv[4] if len(sys.argv) > 4 else None
+    
+    vault = SuperVaultX()
+    password = vault.load_password(password_file)
+    if not password:
+        print("❌ Ошибка: Не удалось прочитать пароль из файла!")
+        return
+    
+    result = vault.decrypt_file_dedup(recipe_file, password, store_dir)
+    
+    if result['success']:
+        print(f"\n✅ Восстановлен: {os.path.basename(result['decrypted_file'])}")
+        print(f"🔐 Хэш совпадает: {'Да' if result['hash_match'] else 'Нет'}")
+    else:
+        print(f"\n❌ Ошибка: {result.get('error')}")
+
+def cmd_inspect():
+    """Сведения об архиве по заголовку"""
+    if len(sys.argv) < 3:
+        print("Использование: python app.py inspect <файл.svx>")
+        return
+    
+    vault = SuperVaultX()
+    result = vault.inspect_file(sys.argv[2])
+    
+    if result['success']:
+        info = result['file_info']
+        print(f"\n📁 Файл: {os.path.basename(sys.argv[2])}")
+        print(f"📄 Оригинал: {info['original_name']}")
+        print(f"📊 Оригинальный размер: {info['original_size']:,} байт")
+        print(f"📦 Размер архива: {info['encrypted_size']:,} байт")
+        print(f"🔒 Алгоритм: {info['algorithm']} (контейнер V{info['container_version']})")
+        print(f"📅 Дата создания: {info['timestamp']}")
+        print(f"🗜️  Сжатие: {info['codec'] if info['was_compressed'] else 'нет'}")
+    else:
+        print(f"\n❌ Ошибка: {result.get('error')}")
+
+def cmd_catalog():
+    """Обновление каталога архивов"""
+    if len(sys.argv) < 4:
+        print("Использование: python app.py catalog <каталог> <каталог.db>")
+        return
+    
+    vault = SuperVaultX()
+    result = vault.update_catalog(sys.argv[2], sys.argv[3])
+    
+    if result['success']:
+        print(f"\n✅ КАТАЛОГ ОБНОВЛЕН!")
+        print(f"➕ Добавлено: {result['added']:,}")
+        print(f"🔄 Обновлено: {result['updated']:,}")
+        print(f"➖ Удалено: {result['removed']:,}")
+        print(f"📁 Всего в каталоге: {result['total']:,}")
+        print(f"⏱️  Время: {result['elapsed_time']:.2f} секунд")
+    else:
+        print(f"\n❌ Ошибка: {result.get('error')}")
+
+def cmd_find():
+    """Поиск архивов в каталоге"""
+    if len(sys.argv) < 4:
+        print("Использование: python app.py find <каталог.db> <имя> [--from ДАТА] [--to ДАТА]")
+        return
+    
+    options = sys.argv[4:]
+    
+    def option(name):
+        if name in options and options.index(name) + 1 < len(options):
+            return options[options.index(name) + 1]
+        return None
+    
+    vault = SuperVaultX()
+    result = vault.search_catalog(sys.argv[2], sys.argv[3],
+                                  date_from=option('--from'), date_to=option('--to'))
+    
+    if not result['success']:
+        print(f"\n❌ Ошибка: {result.get('error')}")
+        return
+    
+    for match in result['matches']:
+        print(f"{match['timestamp']}  {match['original_name']}  "
+              f"({match['original_size']:,} байт)  →  {match['path']}")
+    print(f"\n🔍 Найдено: {len(result['matches'])}")
+
+def cmd_spot_check():
+    """Проверка тела архива по дереву хэшей без пароля"""
+    if len(sys.argv) < 3:
+        print("Использование: python app.py spot-check <файл.svx> [число_кусков]")
+        return
+    
+    encrypted_file = sys.argv[2]
+    sample = None
+    if len(sys.argv) >= 4:
+        try:
+            sample = int(sys.argv[3])
+        except ValueError:
+            print("❌ Ошибка: число кусков должно быть целым")
+            return
+    
+    vault = SuperVaultX()
+    result = vault.verify_merkle(encrypted_file, sample=sample)
+    
+    if result['valid']:
+        print(f"\n✅ ДЕРЕВО ХЭШЕЙ СОВПАДАЕТ!")
+        print(f"📁 Файл: {os.path.basename(encrypted_file)}")
+        print(f"🔍 Проверено кусков: {result['chunks_checked']:,} из {result['chunks_total']:,}")
+        print(f"⚡ Скорость: {result['bytes_per_sec'] / (1024 * 1024):.1f} МБ/с")
+    else:
+        print(f"\n❌ НАРУШЕНА ЦЕЛОСТНОСТЬ!")
+        if result.get('bad_chunks'):
+            print(f"Поврежденные куски: {result['bad_chunks'][:20]}")
+        print(f"Ошибка: {result.get('error', result.get('integrity_check'))}")
+
+def cmd_shred_drain():
+    """Ожидание фонового удаления (в том числе заданий, прерванных сбоем)"""
+    job_id = sys.argv[2] if len(sys.argv) >= 3 else None
+    
+    vault = SuperVaultX()
+    pending = vault.shred_queue.pending()
+    print(f"\n🗑️  Заданий в очереди удаления: {len(pending)}")
+    
+    results = vault.wait_for_shredding(job_id)
+    
+    for shred_id, ok in results.items():
+        if ok is None:
+            print(f"❓ {shred_id}: задание не найдено")
+        else:
+            print(f"{'✅' if ok else '❌'} {shred_id}")
+    print(f"\n✅ Готово: {sum(1 for ok in results.values() if ok)} из {len(results)}")
+
+def cmd_verify_all():
+    """Массовая проверка целостности каталога"""
+    if len(sys.argv) < 5:
+        print("Использование: python app.py verify-all <каталог> <карта.json|пароль.txt> "
+              "<результаты.jsonl> [--workers N] [--mmap]")
+        return
+    
+    root_dir, map_file, results_file = sys.argv[2], sys.argv[3], sys.argv[4]
+    options = sys.argv[5:]
+    
+    if not os.path.isdir(root_dir):
+        print(f"❌ Ошибка: Каталог не найден: {root_dir}")
+        return
+    
+    if not os.path.exists(map_file):
+        print(f"❌ Ошибка: Файл не найден: {map_file}")
+        return
+    
+    # Карта JSON {путь/шаблон: файл пароля} или один пароль для всех архивов
+    if map_file.lower().endswith('.json'):
+        try:
+            with open(map_file, 'r', encoding='utf-8') as f:
+                password_map = json.load(f)
+        except ValueError as e:
+            print(f"❌ Ошибка: Неверный формат карты паролей: {e}")
+            return
+    else:
+        password_map = {'*': map_file}
+    
+    workers = None
+    if '--workers' in options:
+        try:
+            workers = int(options[options.index('--workers') + 1])
+        except (IndexError, ValueError):
+            print("❌ Ошибка: --workers требует число")
+            return
+    
+    print(f"\n🔍 Проверяю архивы в {root_dir}...")
+    vault = SuperVaultX()
+    result = vault.verify_all(root_dir, password_map, results_file,
+                              workers=workers, use_mmap='--mmap' in options)
+    
+    if result['success']:
+        print(f"\n✅ ПРОВЕРКА ЗАВЕРШЕНА!")
+        print(f"📁 Найдено архивов: {result['total']:,}")
+        print(f"✅ Целостность подтверждена: {result['passed']:,}")
+        print(f"❌ Ошибок: {result['failed']:,}")
+        print(f"⏭️  Пропущено (уже проверены): {result['skipped']:,}")
+        print(f"📄 Результаты: {result['results_file']}")
+        print(f"⏱️  Время: {result['elapsed_time']:.2f} секунд")
+    else:
+        print(f"\n❌ Ошибка: {result.get('error')}")
+
 # ============================================================================
 # ГЛАВНАЯ ФУНКЦИЯ
 # ============================================================================
@@ -2273,6 +7640,36 @@ def main():
     elif sys.argv[1] == "verify" and len(sys.argv) >= 3:
         cmd_verify()
     
+    elif sys.argv[1] == "spot-check" and len(sys.argv) >= 3:
+        cmd_spot_check()
+    
+    elif sys.argv[1] == "shred-drain":
+        cmd_shred_drain()
+    
+    elif sys.argv[1] == "verify-all" and len(sys.argv) >= 5:
+        cmd_verify_all()
+    
+    elif sys.argv[1] == "store" and len(sys.argv) >= 5:
+        cmd_store()
+    
+    elif sys.argv[1] == "restore" and len(sys.argv) >= 4:
+        cmd_restore()
+    
+    elif sys.argv[1] == "vault" and len(sys.argv) >= 4:
+        cmd_vault()
+    
+    elif sys.argv[1] == "keyfile" and len(sys.argv) >= 3:
+        cmd_keyfile()
+    
+    elif sys.argv[1] == "inspect" and len(sys.argv) >= 3:
+        cmd_inspect()
+    
+    elif sys.argv[1] == "catalog" and len(sys.argv) >= 4:
+        cmd_catalog()
+    
+    elif sys.argv[1] == "find" and len(sys.argv) >= 4:
+        cmd_find()
+    
     elif sys.argv[1] in ["--help", "-h", "help"]:
         cmd_help()
     